@@ -1,8 +1,25 @@
 import re
-import bcrypt
 import datetime
 import pymysql
+import os
+from auth import password_pool
+from auth.rate_limiter import SlidingWindowLimiter
 from utils.db_connection import get_connection
+from utils import sql_registry
+from utils.metrics_rollup import record_metrics
+ 
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "900"))
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_MAX_CLIENT_FAILURES = int(os.getenv("LOGIN_MAX_CLIENT_FAILURES", "50"))
+ 
+_email_limiter = SlidingWindowLimiter(LOGIN_MAX_FAILURES, LOGIN_WINDOW_SECONDS)
+_client_limiter = SlidingWindowLimiter(LOGIN_MAX_CLIENT_FAILURES, LOGIN_WINDOW_SECONDS)
+ 
+class LoginThrottled(Exception):
+    pass
+ 
+class LoginBusy(Exception):
+    pass
  
 def get_cursor():
     conn = get_connection()
@@ -11,15 +28,10 @@ def get_cursor():
     return conn, conn.cursor(pymysql.cursors.DictCursor)
  
 def hash_password(password: str) -> str:
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    return password_pool.hash_password(password)
  
 def check_password(password: str, hashed: str) -> bool:
-    try:
-        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-    except ValueError:
-        return False
+    return password_pool.check_password(password, hashed)
  
 def is_valid_email(email: str) -> bool:
     pattern = r'^[\w\.-]+@[\w\.-]+\.\w+$'
@@ -29,15 +41,6 @@ def is_valid_password(password: str) -> bool:
     pattern = r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d).{8,}$'
     return re.match(pattern, password) is not None
  
-def load_users() -> dict:
-    conn, cursor = get_cursor()
-    if not conn or not cursor:
-        return {}
-    cursor.execute("SELECT user_id, name, email, password, role, is_active FROM users")
-    users = {row["email"]: row for row in cursor.fetchall()}
-    conn.close()
-    return users
- 
 def save_user(name: str, email: str, password: str, role: str) -> bool:
     if not is_valid_email(email):
         raise ValueError("Invalid email address")
@@ -53,20 +56,19 @@ def save_user(name: str, email: str, password: str, role: str) -> bool:
     hashed_pw = hash_password(password)
     now = datetime.datetime.now()
     try:
-        cursor.execute("""
-            INSERT INTO users (name, email, password, role, created_at, updated_at, is_active)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (name, email, hashed_pw, role, now, now, True))
+        conn.begin()
+        sql_registry.execute(cursor, "auth.insert_user", (name, email, hashed_pw, role, now, now, True))
         user_id = cursor.lastrowid
  
         if role == "driver":
-            cursor.execute("INSERT INTO drivers (user_id, avg_rating, total_rides) VALUES (%s, 0, 0)", (user_id,))
+            sql_registry.execute(cursor, "auth.insert_driver", (user_id,))
         elif role == "passenger":
-            cursor.execute("INSERT INTO passengers (user_id, avg_rating, total_rides) VALUES (%s, 0, 0)", (user_id,))
+            sql_registry.execute(cursor, "auth.insert_passenger", (user_id,))
         elif role == "both":
-            cursor.execute("INSERT INTO drivers (user_id, avg_rating, total_rides) VALUES (%s, 0, 0)", (user_id,))
-            cursor.execute("INSERT INTO passengers (user_id, avg_rating, total_rides) VALUES (%s, 0, 0)", (user_id,))
+            sql_registry.execute(cursor, "auth.insert_driver", (user_id,))
+            sql_registry.execute(cursor, "auth.insert_passenger", (user_id,))
  
+        record_metrics(cursor, [("users", "", 1), ("signups", role, 1)], at=now)
         conn.commit()
         return True
     except pymysql.IntegrityError:
@@ -75,23 +77,65 @@ def save_user(name: str, email: str, password: str, role: str) -> bool:
     finally:
         conn.close()
  
-def authenticate_user(email: str, password: str):
+def _login_keys(email: str, client: str):
+    email = (email or "").strip().lower()
+    return f"{email}|{client}", client
+ 
+def is_login_throttled(email: str, client: str = "unknown") -> bool:
+    pair_key, client_key = _login_keys(email, client)
+    return _email_limiter.is_limited(pair_key) or _client_limiter.is_limited(client_key)
+ 
+def authenticate_user(email: str, password: str, client: str = "unknown"):
+    """
+    Verify credentials and stamp the last login on one connection.
+    Throttled (email, client) pairs and clients are rejected with LoginThrottled
+    before any DB or bcrypt work; only failed attempts count towards the limits.
+    A saturated password pool raises LoginBusy and counts as no attempt at all.
+    """
+    if is_login_throttled(email, client):
+        raise LoginThrottled("Too many failed login attempts")
+    pair_key, client_key = _login_keys(email, client)
+ 
     conn, cursor = get_cursor()
     if not conn or not cursor:
         return None
-    cursor.execute("SELECT * FROM users WHERE email = %s AND is_active = TRUE", (email,))
-    user = cursor.fetchone()
-    conn.close()
-    if user and check_password(password, user["password"]):
-        update_last_login(user["user_id"])
+    try:
+        # driver/passenger ids come along so the session Identity needs no extra query
+        sql_registry.execute(cursor, "auth.login_lookup", (email,))
+        user = cursor.fetchone()
+        try:
+            valid = bool(user) and check_password(password, user["password"])
+        except password_pool.AuthPoolBusy:
+            raise LoginBusy("Password checks are busy, try again shortly") from None
+        if not valid:
+            _email_limiter.hit(pair_key)
+            _client_limiter.hit(client_key)
+            return None
+ 
+        stored_hash = user.pop("password")
+        new_hash = None
+        if password_pool.needs_rehash(stored_hash):
+            try:
+                new_hash = hash_password(password)
+            except password_pool.AuthPoolBusy:
+                new_hash = None
+ 
+        now = datetime.datetime.now()
+        if new_hash:
+            sql_registry.execute(cursor, "auth.stamp_login_rehash", (now, new_hash, user["user_id"]))
+        else:
+            sql_registry.execute(cursor, "auth.stamp_login", (now, user["user_id"]))
+        conn.commit()
+        _email_limiter.reset(pair_key)
         return user
-    return None
+    finally:
+        conn.close()
  
 def update_last_login(user_id: int):
     conn, cursor = get_cursor()
     if not conn or not cursor:
         return
     now = datetime.datetime.now()
-    cursor.execute("UPDATE users SET updated_at = %s WHERE user_id = %s", (now, user_id))
+    sql_registry.execute(cursor, "auth.stamp_login", (now, user_id))
     conn.commit()
     conn.close()
\ No newline at end of file
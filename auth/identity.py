@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from typing import Optional
+import streamlit as st
+from auth import user_repository
+from utils.query_cache import invalidate
+
+SESSION_KEY = "identity"
+
+
+@dataclass(frozen=True)
+class Identity:
+    """Who the logged-in user is in each role, resolved once per login."""
+    user_id: int
+    name: str
+    email: str
+    role: str
+    driver_id: Optional[int] = None
+    passenger_id: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            user_id=int(row["user_id"]),
+            name=row.get("name", ""),
+            email=row.get("email", ""),
+            role=str(row.get("role", "")).lower(),
+            driver_id=row.get("driver_id"),
+            passenger_id=row.get("passenger_id"),
+        )
+
+    @property
+    def is_driver(self) -> bool:
+        return self.driver_id is not None
+
+    @property
+    def is_passenger(self) -> bool:
+        return self.passenger_id is not None
+
+    @property
+    def roles(self) -> frozenset:
+        """Effective roles: the profiles that actually exist, plus admin from users.role."""
+        roles = set()
+        if self.is_driver:
+            roles.add("driver")
+        if self.is_passenger:
+            roles.add("passenger")
+        if self.role == "admin":
+            roles.add("admin")
+        return frozenset(roles)
+
+
+def resolve_identity(user_id: int):
+    """The user's profile with driver/passenger ids, from the user repository (one query on a cache miss)."""
+    row = user_repository.get_by_id(user_id)
+    return Identity.from_row(row) if row else None
+
+
+def remember_identity(identity: Identity, session=None):
+    session = st.session_state if session is None else session
+    session[SESSION_KEY] = identity
+    return identity
+
+
+def current_identity(session=None):
+    """
+    The session's Identity. Reuses the one stored at login; it is only
+    re-resolved when the session user changed or their role no longer matches.
+    """
+    session = st.session_state if session is None else session
+    user = session.get("user")
+    if not user:
+        return None
+    identity = session.get(SESSION_KEY)
+    if identity and identity.user_id == user["user_id"] and identity.role == str(user["role"]).lower():
+        return identity
+    return refresh_identity(session)
+
+
+def refresh_identity(session=None):
+    """Re-resolve after a role change (driver/passenger profile added or removed)."""
+    session = st.session_state if session is None else session
+    user = session.get("user")
+    if not user:
+        return None
+    user_repository.invalidate(user["user_id"])
+    invalidate(f"user:{user['user_id']}")
+    identity = resolve_identity(user["user_id"])
+    if identity:
+        session["user"] = dict(user, role=identity.role)
+        remember_identity(identity, session)
+    else:
+        session.pop(SESSION_KEY, None)
+    return identity
\ No newline at end of file
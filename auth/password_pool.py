@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_POOL_SIZE = int(os.getenv("AUTH_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+AUTH_POOL_QUEUE_LIMIT = int(os.getenv("AUTH_POOL_QUEUE_LIMIT", "64"))
+AUTH_POOL_TIMEOUT = float(os.getenv("AUTH_POOL_TIMEOUT", "10"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(AUTH_POOL_QUEUE_LIMIT)
+
+
+class AuthPoolBusy(RuntimeError):
+    """Raised when the auth pool is saturated: no free slot, or no result within AUTH_POOL_TIMEOUT."""
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(password, hashed)
+    except ValueError:
+        return False
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=AUTH_POOL_SIZE)
+    return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _run(fn, *args):
+    """
+    Run fn(*args) in the auth process pool and wait for the result.
+    AUTH_POOL_SIZE=0 runs inline on the calling thread (tests, one-off scripts).
+    Callers beyond AUTH_POOL_QUEUE_LIMIT, or still waiting after AUTH_POOL_TIMEOUT,
+    get AuthPoolBusy instead of queueing without bound.
+    """
+    if AUTH_POOL_SIZE <= 0:
+        return fn(*args)
+
+    if not _slots.acquire(timeout=AUTH_POOL_TIMEOUT):
+        raise AuthPoolBusy("Too many password operations in flight")
+    try:
+        future = _get_pool().submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _f: _slots.release())
+    try:
+        return future.result(timeout=AUTH_POOL_TIMEOUT)
+    except FutureTimeout:
+        future.cancel()  # drops it if still queued; a running hash finishes and frees its slot
+        raise AuthPoolBusy("Password operation timed out") from None
+
+
+def hash_password(password: str, rounds: int = None) -> str:
+    hashed = _run(_hash, password.encode("utf-8"), rounds or BCRYPT_ROUNDS)
+    return hashed.decode("utf-8")
+
+
+def check_password(password: str, hashed: str) -> bool:
+    return _run(_check, password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def get_rounds(hashed: str):
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12), or None if unparseable."""
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed: str, rounds: int = None) -> bool:
+    return get_rounds(hashed) != (rounds or BCRYPT_ROUNDS)
+
+
+def benchmark_rounds(target_ms: float = 250.0, min_rounds: int = 10, max_rounds: int = 16, samples: int = 3):
+    """
+    Time bcrypt on this machine and return (best_rounds, {rounds: median_ms}).
+    best_rounds is the highest cost whose median hash time stays under target_ms.
+    """
+    timings = {}
+    best = min_rounds
+    password = b"benchmark-Password1"
+    for rounds in range(min_rounds, max_rounds + 1):
+        runs = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            _hash(password, rounds)
+            runs.append((time.perf_counter() - start) * 1000)
+        runs.sort()
+        timings[rounds] = runs[len(runs) // 2]
+        if timings[rounds] > target_ms:
+            break
+        best = rounds
+    return best, timings
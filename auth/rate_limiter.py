@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class SlidingWindowLimiter:
+    """
+    In-memory sliding-window counter: a key is limited once it has `limit` hits
+    within the last `window_s` seconds. At most `max_keys` keys are tracked; the
+    least recently touched key is evicted first, so memory stays bounded under
+    attack traffic with random emails or clients.
+    """
+
+    def __init__(self, limit: int, window_s: float, max_keys: int = 10000, clock=time.monotonic):
+        self.limit = limit
+        self.window_s = window_s
+        self.max_keys = max_keys
+        self._clock = clock
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, key, now):
+        hits = self._hits.get(key)
+        if hits is None:
+            return None
+        cutoff = now - self.window_s
+        while hits and hits[0] <= cutoff:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+            return None
+        return hits
+
+    def is_limited(self, key) -> bool:
+        with self._lock:
+            hits = self._prune(key, self._clock())
+            return hits is not None and len(hits) >= self.limit
+
+    def hit(self, key):
+        with self._lock:
+            now = self._clock()
+            hits = self._prune(key, now)
+            if hits is None:
+                hits = self._hits[key] = deque(maxlen=self.limit)
+            hits.append(now)
+            self._hits.move_to_end(key)
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def __len__(self):
+        return len(self._hits)
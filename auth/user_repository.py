@@ -0,0 +1,124 @@
+import threading
+import pymysql
+from cachetools import LRUCache
+from utils import sql_registry
+from utils.db_connection import get_connection
+
+IN_CLAUSE_CHUNK = 500
+
+_cache = LRUCache(maxsize=2048)
+_email_index = LRUCache(maxsize=2048)
+_lock = threading.Lock()
+
+
+def _remember(user):
+    with _lock:
+        _cache[user["user_id"]] = user
+        _email_index[user["email"].lower()] = user["user_id"]
+
+
+def _cached(user_id):
+    with _lock:
+        user = _cache.get(user_id)
+    return dict(user) if user is not None else None
+
+
+def invalidate(user_id=None):
+    """Drop one cached profile (after an update to that user or their roles) or the whole cache."""
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+            _email_index.clear()
+            return
+        user = _cache.pop(user_id, None)
+        if user:
+            _email_index.pop(user["email"].lower(), None)
+
+
+def _fetch_one(name, params):
+    conn = get_connection()
+    if not conn:
+        return None
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        sql_registry.execute(cursor, name, params)
+        return cursor.fetchone()
+    except Exception as e:
+        print("Error fetching user:", e)
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_by_id(user_id: int):
+    user = _cached(user_id)
+    if user is not None:
+        return user
+    user = _fetch_one("user.by_id", (user_id,))
+    if user:
+        _remember(dict(user))
+    return user
+
+
+def get_by_email(email: str):
+    with _lock:
+        user_id = _email_index.get(email.lower())
+    if user_id is not None:
+        user = _cached(user_id)
+        if user is not None:
+            return user
+    user = _fetch_one("user.by_email", (email,))
+    if user:
+        _remember(dict(user))
+    return user
+
+
+def get_many(user_ids) -> dict:
+    """Profiles for a list page keyed by user_id; cache misses are fetched with one IN query per chunk."""
+    found = {}
+    missing = []
+    for user_id in dict.fromkeys(user_ids):
+        user = _cached(user_id)
+        if user is not None:
+            found[user_id] = user
+        else:
+            missing.append(user_id)
+    if not missing:
+        return found
+
+    conn = get_connection()
+    if not conn:
+        return found
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        for i in range(0, len(missing), IN_CLAUSE_CHUNK):
+            sql_registry.execute(cursor, "user.many_by_id", (missing[i:i + IN_CLAUSE_CHUNK],))
+            for user in cursor.fetchall():
+                _remember(dict(user))
+                found[user["user_id"]] = user
+    finally:
+        cursor.close()
+        conn.close()
+    return found
+
+
+def iter_users(batch_size: int = 1000, active_only: bool = False):
+    """
+    Stream every user profile with a server-side cursor for admin bulk jobs.
+    Rows are fetched batch_size at a time and bypass the LRU cache.
+    """
+    conn = get_connection()
+    if not conn:
+        return
+    cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+    try:
+        sql_registry.execute(cursor, "user.all_active" if active_only else "user.all")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+        conn.close()
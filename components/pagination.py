@@ -0,0 +1,56 @@
+import streamlit as st
+from utils.ride_utils import ride_page_cursor
+
+RIDE_STATUSES = ["All", "booked", "active", "completed", "cancelled"]
+
+
+def ride_history_filters(key: str):
+    """
+    Status and date-range filters for a ride history list. Returns the keyword
+    arguments for the ride history loaders and resets the pager when they change.
+    """
+    col1, col2 = st.columns(2)
+    status = col1.selectbox("Status", RIDE_STATUSES, key=f"{key}_status")
+    dates = col2.date_input("Date range", value=(), key=f"{key}_dates")
+
+    date_from = dates[0] if len(dates) > 0 else None
+    date_to = dates[1] if len(dates) > 1 else date_from
+    filters = {
+        "status": None if status == "All" else status,
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+    if st.session_state.get(f"{key}_filters") != filters:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[f"{key}_cursors"] = [None]
+    return filters
+
+
+def page_cursor(key: str):
+    """`after` cursor for the page currently shown under this key."""
+    cursors = st.session_state.setdefault(f"{key}_cursors", [None])
+    return cursors[-1]
+
+
+def page_controls(key: str, next_cursor, has_more: bool):
+    cursors = st.session_state.setdefault(f"{key}_cursors", [None])
+    col1, col2, col3 = st.columns([1, 2, 1])
+    if len(cursors) > 1 and col1.button("← Newer", key=f"{key}_newer"):
+        cursors.pop()
+        st.rerun()
+    col2.caption(f"Page {len(cursors)}")
+    if has_more and col3.button("Older →", key=f"{key}_older"):
+        cursors.append(next_cursor)
+        st.rerun()
+
+
+def fetch_page(key: str, loader, page_size: int, **kwargs):
+    """
+    Call loader(limit=page_size + 1, after=<cursor>, **kwargs) and return
+    (rows, next_cursor, has_more); the extra row only signals that an older page exists.
+    Works the same for loaders returning a list of dicts or a pyarrow Table.
+    """
+    rows = loader(limit=page_size + 1, after=page_cursor(key), **kwargs)
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return rows, ride_page_cursor(rows), has_more
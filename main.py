@@ -1,10 +1,18 @@
 import streamlit as st
 from pages.home import home
 from pages.auth import show_auth_page
+from utils import instrumentation, profiler, query_budget
 
 st.set_page_config(page_title="CarPoolConnect", page_icon="🚖", layout="wide")
+instrumentation.start()
 
 if "authenticated" in st.session_state and st.session_state["authenticated"]:
-    home()
+    page = st.session_state.get("page", "Home")
+    profiler.show_report()
+    query_budget.show_rerun_report()
+    with instrumentation.timed("page_render_seconds", page=page), profiler.profile_rerun(page), \
+            query_budget.watch_rerun(page):
+        home()
 else:
-    show_auth_page()
\ No newline at end of file
+    with instrumentation.timed("page_render_seconds", page="Auth"):
+        show_auth_page()
\ No newline at end of file
@@ -0,0 +1,102 @@
+import datetime
+from typing import NamedTuple, Optional
+from utils.db_connection import STREAM_BATCH_SIZE, iter_query
+
+
+class Route(NamedTuple):
+    route_id: int
+    from_city: str
+    to_city: str
+    distance_km: float
+    duration_min: float
+
+
+class Ride(NamedTuple):
+    ride_id: int
+    offer_id: int
+    passenger_id: int
+    driver_id: int
+    start_time: Optional[datetime.datetime]
+    end_time: Optional[datetime.datetime]
+    current_position_index: int
+    status: str
+    from_city: Optional[str]
+    to_city: Optional[str]
+    passenger_name: Optional[str]
+    driver_name: Optional[str]
+    driver_user_id: Optional[int]
+    passenger_user_id: Optional[int]
+
+
+class RideOffer(NamedTuple):
+    offer_id: int
+    driver_id: int
+    vehicle_no: str
+    available_seats: int
+    price_per_km: float
+    estimated_fare: Optional[float]
+    status: str
+    from_city: str
+    to_city: str
+
+
+class RideRequest(NamedTuple):
+    request_id: int
+    passenger_id: int
+    from_city: str
+    to_city: str
+    date_time: datetime.datetime
+    passengers_count: int
+    preferences: Optional[str]
+    status: str
+    created_at: datetime.datetime
+
+
+class Notification(NamedTuple):
+    notification_id: int
+    user_id: int
+    message: str
+    is_read: int
+    created_at: datetime.datetime
+
+
+def columns(record, alias=None):
+    """SELECT list for `record` in field order, so tuple rows map onto it by position."""
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + name for name in record._fields)
+
+
+class RecordBatch:
+    """
+    Columnar form of a list endpoint's result: one tuple per column instead of
+    one object per row. Iterating or indexing builds records on demand.
+    """
+
+    __slots__ = ("record", "columns")
+
+    def __init__(self, record, columns):
+        self.record = record
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, record, rows):
+        rows = list(rows)
+        cols = tuple(zip(*rows)) if rows else ((),) * len(record._fields)
+        return cls(record, dict(zip(record._fields, cols)))
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def __iter__(self):
+        return map(self.record._make, zip(*self.columns.values()))
+
+    def __getitem__(self, i):
+        return self.record._make(col[i] for col in self.columns.values())
+
+    def column(self, name):
+        return self.columns[name]
+
+
+def iter_records(record, query, params=None, batch_size=STREAM_BATCH_SIZE, read_only=None):
+    """Stream `record`s through a server-side tuple cursor (see db_connection.iter_query)."""
+    return iter_query(query, params, batch_size, adapter=record._make, dict_rows=False, read_only=read_only)
\ No newline at end of file
@@ -1,5 +1,7 @@
+import time
 import streamlit as st
-from auth.auth_util import authenticate_user, save_user
+from auth.auth_util import LoginBusy, LoginThrottled, authenticate_user, save_user
+from auth.identity import Identity, remember_identity
 from scripts.logger import log_user_action
 from utils.setBackground import add_bg_from_local
  
@@ -14,20 +16,35 @@ def show_auth_page():
         password = st.text_input("Password", type="password", key="login_password")
  
         if st.button("Login"):
+            client = st.context.ip_address or "unknown"
+            started = time.perf_counter()
+            elapsed_ms = lambda: (time.perf_counter() - started) * 1000
             try:
-                user = authenticate_user(email, password)
+                user = authenticate_user(email, password, client=client)
                 if user:
                     st.session_state["authenticated"] = True
                     st.session_state["user"] = user
+                    remember_identity(Identity.from_row(user))
                     st.success(f"Welcome back, {user['name']}!")
-                    log_user_action("login", email, user["role"], success=True)
+                    log_user_action("login", email, user["role"], success=True,
+                                    user_id=user["user_id"], latency_ms=elapsed_ms())
                     st.rerun()
                 else:
                     st.error("Invalid credentials or inactive account.")
-                    log_user_action("login", email, "", success=False, message="Invalid credentials or inactive user")
+                    log_user_action("login", email, "", success=False, message="Invalid credentials or inactive user",
+                                    latency_ms=elapsed_ms())
+            except LoginThrottled:
+                st.error("Too many failed attempts. Please wait a few minutes and try again.")
+                log_user_action("login", email, "", success=False, message=f"Throttled client {client}",
+                                latency_ms=elapsed_ms())
+            except LoginBusy:
+                st.warning("The server is busy right now. Please try again in a moment.")
+                log_user_action("login", email, "", success=False, message="Password pool busy",
+                                latency_ms=elapsed_ms())
             except Exception as e:
                 st.error("Login failed due to a system error.")
-                log_user_action("login", email, "", success=False, message=f"Exception: {e}")
+                log_user_action("login", email, "", success=False, message=f"Exception: {e}",
+                                latency_ms=elapsed_ms())
  
     with tab2:
         st.markdown("### Create a New Account")
@@ -61,6 +78,6 @@ def show_auth_page():
         user = st.session_state["user"]
         st.info(f"Logged in as **{user['name']} ({user['role']})**")
         if st.button("Logout"):
-            log_user_action("logout", user["email"], user["role"], success=True)
+            log_user_action("logout", user["email"], user["role"], success=True, user_id=user["user_id"])
             st.session_state.clear()
             st.success("You’ve been logged out.")
@@ -1,17 +1,18 @@
 import streamlit as st
 import pydeck as pdk
 import time
+from auth.identity import current_identity
 from utils.ride_utils import get_active_ride, update_ride_position, get_route_coordinates
  
 def show():
     st.title("Live Ride Tracking")
  
-    user = st.session_state.get("user")
-    if not user:
+    identity = current_identity()
+    if not identity:
         st.warning("Please log in.")
         return
  
-    ride = get_active_ride(user["user_id"])
+    ride = get_active_ride(identity)
     if not ride:
         st.info("No active rides right now.")
         return
@@ -21,7 +22,7 @@ def show():
  
     map_placeholder = st.empty()
  
-    is_driver = (user["role"] == "driver")
+    is_driver = (identity.role == "driver")
  
     while index < len(coords):
         point = coords[index]
@@ -52,7 +53,7 @@ def show():
                 st.rerun()
  
         time.sleep(1.2)
-        ride = get_active_ride(user["user_id"])
+        ride = get_active_ride(identity)
         index = ride["current_position_index"]
  
 if __name__ == "__main__":
@@ -1,6 +1,9 @@
 import streamlit as st
 import time
+from utils import sql_registry
 from utils.db_connection import get_connection
+from utils.ride_utils import get_notifications
+from utils.query_cache import invalidate
  
  
 POLL_EVERY_SEC = 5
@@ -19,29 +22,23 @@ def show():
         st.warning("Please log in.")
         return
  
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT notification_id, message, created_at, is_read
-        FROM notifications
-        WHERE user_id=%s
-        ORDER BY created_at DESC
-    """, (user["user_id"],))
-    rows = cursor.fetchall()
+    notifications = get_notifications(user["user_id"])
  
-    if not rows:
+    if not notifications:
         st.info("No notifications yet.")
         return
     
-    for n_id, msg, created_at, is_read in rows:
-        style = "**" if is_read == 0 else ""
-        st.write(f"{style}{msg}{style}")
-        st.caption(created_at.strftime('%d %b %Y %I:%M %p'))
+    for n in notifications:
+        style = "**" if n.is_read == 0 else ""
+        st.write(f"{style}{n.message}{style}")
+        st.caption(n.created_at.strftime('%d %b %Y %I:%M %p'))
  
     if st.button("Mark all as read"):
-        cursor.execute("UPDATE notifications SET is_read=1 WHERE user_id=%s", (user["user_id"],))
+        conn = get_connection()
+        cursor = conn.cursor()
+        sql_registry.execute(cursor, "notification.mark_all_read", (user["user_id"],))
         conn.commit()
-        st.rerun()
- 
-    cursor.close()
-    conn.close()
\ No newline at end of file
+        cursor.close()
+        conn.close()
+        invalidate(f"notifications:{user['user_id']}")
+        st.rerun()
\ No newline at end of file
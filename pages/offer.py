@@ -9,9 +9,9 @@ from utils.ride_utils import (
     fetch_routes,
     get_driver_assigned_rides,
     get_open_ride_requests,
-    get_driver_id,
     update_ride_status,
 )
+from auth.identity import current_identity
  
  
 def show():
@@ -19,36 +19,36 @@ def show():
     st.title("Offer a Ride")
     st.write("Drivers can create ride offers and accept passenger requests here.")
  
-    user = st.session_state.get("user")
-    if not user:
+    identity = current_identity()
+    if not identity:
         st.warning("Please log in to create or manage ride offers.")
         st.stop()
  
-    driver_id = get_driver_id(user["user_id"])
+    driver_id = identity.driver_id
     if not driver_id:
         st.warning("Driver profile not found. Please register as a driver.")
         st.stop()
  
     st.header("Passenger Ride Requests")
+    # fetched in full first: Accept reruns the script, which must not happen mid-stream
     requests = get_open_ride_requests()
-    if requests:
-        for req in requests:
-            with st.expander(f"Request #{req['request_id']} — {req['from_city']} → {req['to_city']}"):
-                st.markdown(f"**From:** {req['from_city']}")
-                st.markdown(f"**To:** {req['to_city']}")
-                st.markdown(f"**Date & Time:** {req['date_time']}")
-                st.markdown(f"**Passengers:** {req['passengers_count']}")
-                st.markdown(f"**Preferences:** {req['preferences']}")
-                st.markdown(f"**Status:** {req['status']}")
- 
-                if st.button(f"Accept Request #{req['request_id']}", key=f"accept_{req['request_id']}"):
-                    success = accept_ride_request(driver_id, req["request_id"])
-                    if success:
-                        st.success("Ride request accepted successfully!")
-                        st.rerun()
-                    else:
-                        st.error("Failed to accept ride request.")
-    else:
+    for req in requests:
+        with st.expander(f"Request #{req.request_id} — {req.from_city} → {req.to_city}"):
+            st.markdown(f"**From:** {req.from_city}")
+            st.markdown(f"**To:** {req.to_city}")
+            st.markdown(f"**Date & Time:** {req.date_time}")
+            st.markdown(f"**Passengers:** {req.passengers_count}")
+            st.markdown(f"**Preferences:** {req.preferences}")
+            st.markdown(f"**Status:** {req.status}")
+ 
+            if st.button(f"Accept Request #{req.request_id}", key=f"accept_{req.request_id}"):
+                success = accept_ride_request(driver_id, req.request_id)
+                if success:
+                    st.success("Ride request accepted successfully!")
+                    st.rerun()
+                else:
+                    st.error("Failed to accept ride request.")
+    if not requests:
         st.info("No active ride requests available right now.")
  
     st.markdown("---")
@@ -61,7 +61,7 @@ def show():
  
     with st.form("ride_offer_form"):
         st.subheader("Enter Ride Details")
-        route_options = [f"{r['from_city']} → {r['to_city']} ({r['distance_km']} km)" for r in routes]
+        route_options = [f"{r.from_city} → {r.to_city} ({r.distance_km} km)" for r in routes]
         route_choice = st.selectbox("Select Route", route_options)
         vehicle_no = st.text_input("Vehicle Number", placeholder="e.g. MH12AB1234")
         available_seats = st.slider("Available Seats", 1, 6, 3)
@@ -70,8 +70,8 @@ def show():
  
         if submitted:
             selected_route = routes[route_options.index(route_choice)]
-            route_id = selected_route["route_id"]
-            distance_km = selected_route["distance_km"]
+            route_id = selected_route.route_id
+            distance_km = selected_route.distance_km
             estimated_fare = distance_km * price_per_km
  
             success = create_ride_offer(
@@ -97,25 +97,25 @@ def show():
         return
  
     for ride in assigned_rides:
-        with st.expander(f"Ride #{ride['ride_id']} — {ride['from_city']} → {ride['to_city']} ({ride['status']})"):
-            st.markdown(f"**Passenger:** {ride['passenger_name']}")
-            st.markdown(f"**From:** {ride['from_city']}")
-            st.markdown(f"**To:** {ride['to_city']}")
-            st.markdown(f"**Status:** {ride['status'].capitalize()}")
+        with st.expander(f"Ride #{ride.ride_id} — {ride.from_city} → {ride.to_city} ({ride.status})"):
+            st.markdown(f"**Passenger:** {ride.passenger_name}")
+            st.markdown(f"**From:** {ride.from_city}")
+            st.markdown(f"**To:** {ride.to_city}")
+            st.markdown(f"**Status:** {ride.status.capitalize()}")
  
             col1, col2, col3 = st.columns(3)
-            if ride["status"] == "booked":
-                if col1.button("Start Ride", key=f"start_{ride['ride_id']}"):
-                    if update_ride_status(ride["ride_id"], "active"):
+            if ride.status == "booked":
+                if col1.button("Start Ride", key=f"start_{ride.ride_id}"):
+                    if update_ride_status(ride.ride_id, "active", notify={"passenger": "Ride {ride_id} has started."}):
                         st.success("Ride started successfully!")
                         st.rerun()
-            elif ride["status"] == "active":
-                if col2.button("Complete Ride", key=f"complete_{ride['ride_id']}"):
-                    if update_ride_status(ride["ride_id"], "completed"):
+            elif ride.status == "active":
+                if col2.button("Complete Ride", key=f"complete_{ride.ride_id}"):
+                    if update_ride_status(ride.ride_id, "completed", notify={"passenger": "Ride {ride_id} completed by driver."}):
                         st.success("Ride completed successfully!")
                         st.rerun()
-            if col3.button("Cancel Ride", key=f"cancel_{ride['ride_id']}"):
-                if update_ride_status(ride["ride_id"], "cancelled"):
+            if col3.button("Cancel Ride", key=f"cancel_{ride.ride_id}"):
+                if update_ride_status(ride.ride_id, "cancelled", notify={"passenger": "Driver cancelled Ride {ride_id}."}):
                     st.warning("Ride cancelled.")
                     st.rerun()
  
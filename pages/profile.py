@@ -1,9 +1,66 @@
 import streamlit as st
 import pandas as pd
+from auth import user_repository
 from datetime import datetime
-from utils.db_connection import run_query
+from utils.db_connection import get_connection, replica_status
+from utils.profiler import PROFILE_DIR, request_profile
+from utils import sql_registry
+from utils.sql_registry import query_stats
+from components.pagination import fetch_page, page_controls, ride_history_filters
+from utils.ride_utils import RIDE_HISTORY_PAGE_SIZE, fetch_routes, get_ride_history_table
+from utils.metrics_rollup import (
+    DRIVER_STAT_COLUMNS,
+    get_driver_daily_stats,
+    get_driver_leaderboard,
+    get_driver_stats,
+    get_series,
+    get_totals,
+)
+from utils.query_cache import cache_stats
+from utils.job_queue import enqueue, queue_stats
  
+HISTORY_COLUMNS = ["ride_id", "from_city", "to_city", "start_time", "status", "total_fare"]
+HISTORY_COLUMN_CONFIG = {
+    "start_time": st.column_config.DatetimeColumn("start_time", format="YYYY-MM-DD HH:mm"),
+    "total_fare": st.column_config.NumberColumn("total_fare", format="₹%.0f"),
+}
+ 
+LEADERBOARD_LABELS = {
+    "earnings": "Earnings",
+    "completed_rides": "Completed",
+    "cancelled_rides": "Cancelled",
+    "seats_filled": "Seats Filled",
+    "km_driven": "Km Driven",
+}
+
+
+def _profile_row(name, user_id):
+    conn = get_connection(read_only=True)
+    cursor = conn.cursor()
+    try:
+        sql_registry.execute(cursor, name, (user_id,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
 
+def show_driver_leaderboard():
+    st.subheader("Driver Leaderboard")
+    col1, col2 = st.columns(2)
+    order_by = col1.selectbox("Rank by", DRIVER_STAT_COLUMNS, format_func=LEADERBOARD_LABELS.get,
+                              key="leaderboard_order")
+    days = col2.selectbox("Period", [7, 30, 90, 0], index=1, key="leaderboard_days",
+                          format_func=lambda d: f"Last {d} days" if d else "All time")
+    leaders = get_driver_leaderboard(order_by=order_by, days=days)
+    if not leaders:
+        st.info("No completed or cancelled rides in this period.")
+        return
+    df = pd.DataFrame(leaders).rename(columns=LEADERBOARD_LABELS | {"driver_name": "Driver", "avg_rating": "Rating"})
+    df.insert(0, "Rank", range(1, len(df) + 1))
+    st.dataframe(df.drop(columns=["driver_id"]), hide_index=True, use_container_width=True)
+
+ 
 def show():
 
     st.set_page_config(page_title="Profile & Ride History", layout="wide")
@@ -16,15 +73,18 @@ def show():
     user_id = user["user_id"]
     role = user["role"].lower()
     
+    # the stored profile, not the login-time copy in the session
+    account = user_repository.get_by_id(user_id) or user
+
     st.title("Profile & Ride History")
-    st.caption(f"Welcome, {user['name']} ({role.title()})")
+    st.caption(f"Welcome, {account['name']} ({role.title()}) · {account['email']}")
 
     if role == "passenger" or role == "both":
-        passenger = run_query("SELECT * FROM passengers WHERE user_id = %s", (user_id,))
+        passenger = _profile_row("passenger.profile_by_user", user_id)
         if not passenger:
             st.warning("No passenger profile found.")
         else:
-            p = passenger[0]
+            p = passenger
             st.subheader("Passenger Profile")
             col1, col2 = st.columns(2)
             col1.metric("Avg Rating", f"{p['avg_rating']:.1f}/5.0")
@@ -33,27 +93,26 @@ def show():
             st.divider()
             st.subheader("📅 Ride History")
     
-            rides = run_query("""
-                SELECT r.ride_id, rt.from_city, rt.to_city, r.start_time, r.status, r.total_fare
-                FROM rides r
-                JOIN routes rt ON r.offer_id = rt.route_id
-                WHERE r.passenger_id = %s
-                ORDER BY r.start_time DESC
-            """, (p["passenger_id"],))
+            filters = ride_history_filters("profile_passenger")
+            rides, next_cursor, has_more = fetch_page(
+                "profile_passenger",
+                lambda **page: get_ride_history_table(user_id, "passenger", HISTORY_COLUMNS, **page),
+                RIDE_HISTORY_PAGE_SIZE,
+                **filters,
+            )
     
             if rides:
-                df = pd.DataFrame(rides)
-                df["start_time"] = pd.to_datetime(df["start_time"]).dt.strftime("%Y-%m-%d %H:%M")
-                st.dataframe(df, use_container_width=True)
+                st.dataframe(rides, column_config=HISTORY_COLUMN_CONFIG, hide_index=True, use_container_width=True)
+                page_controls("profile_passenger", next_cursor, has_more)
             else:
                 st.info("No rides found yet.")
 
     if role == "driver" or role == "both":
-        driver = run_query("SELECT * FROM drivers WHERE user_id = %s", (user_id,))
+        driver = _profile_row("driver.profile_by_user", user_id)
         if not driver:
             st.warning("No driver profile found.")
         else:
-            d = driver[0]
+            d = driver
             st.subheader("Driver Profile")
             col1, col2, col3 = st.columns(3)
             col1.metric("Avg Rating", f"{d['avg_rating']:.1f}/5.0")
@@ -63,59 +122,119 @@ def show():
             st.divider()
             st.subheader("Performance Overview")
     
-            stats = run_query("""
-                SELECT
-                    COUNT(*) AS total_rides,
-                    SUM(total_fare) AS total_earnings,
-                    SUM(CASE WHEN status='completed' THEN 1 ELSE 0 END) AS completed_rides,
-                    SUM(CASE WHEN status='cancelled' THEN 1 ELSE 0 END) AS cancelled_rides
-                FROM rides
-                WHERE driver_id = %s
-            """, (d["driver_id"],))[0]
+            stats = get_driver_stats(d["driver_id"])
     
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Completed", stats["completed_rides"] or 0)
-            col2.metric("Cancelled", stats["cancelled_rides"] or 0)
-            col3.metric("Earnings", f"₹{stats['total_earnings'] or 0:,.0f}")
-            col4.metric("Total Rides", stats["total_rides"])
+            col1, col2, col3, col4, col5 = st.columns(5)
+            col1.metric("Completed", int(stats["completed_rides"]))
+            col2.metric("Cancelled", int(stats["cancelled_rides"]))
+            col3.metric("Earnings", f"₹{stats['earnings']:,.0f}")
+            col4.metric("Seats Filled", int(stats["seats_filled"]))
+            col5.metric("Km Driven", f"{stats['km_driven']:,.0f}")
+
+            daily = get_driver_daily_stats(d["driver_id"], days=30)
+            if daily.num_rows:
+                st.caption("Earnings, last 30 days")
+                st.bar_chart(daily, x="day", y="earnings")
     
             st.divider()
             st.subheader("Ride History")
     
-            rides = run_query("""
-                SELECT r.ride_id, rt.from_city, rt.to_city, r.start_time, r.status, r.total_fare
-                FROM rides r
-                JOIN routes rt ON r.offer_id = rt.route_id
-                WHERE r.driver_id = %s
-                ORDER BY r.start_time DESC
-            """, (d["driver_id"],))
+            filters = ride_history_filters("profile_driver")
+            rides, next_cursor, has_more = fetch_page(
+                "profile_driver",
+                lambda **page: get_ride_history_table(user_id, "driver", HISTORY_COLUMNS, **page),
+                RIDE_HISTORY_PAGE_SIZE,
+                **filters,
+            )
     
             if rides:
-                df = pd.DataFrame(rides)
-                df["start_time"] = pd.to_datetime(df["start_time"]).dt.strftime("%Y-%m-%d %H:%M")
-                st.dataframe(df, use_container_width=True)
+                st.dataframe(rides, column_config=HISTORY_COLUMN_CONFIG, hide_index=True, use_container_width=True)
+                page_controls("profile_driver", next_cursor, has_more)
             else:
                 st.info("No rides found yet.")
+
+            st.divider()
+            show_driver_leaderboard()
     
 
     if role == "admin":
         st.subheader("🛠 System Overview")
     
-        total_users = run_query("SELECT COUNT(*) AS cnt FROM users")[0]["cnt"]
-        total_rides = run_query("SELECT COUNT(*) AS cnt FROM rides")[0]["cnt"]
-        completed = run_query("SELECT COUNT(*) AS cnt FROM rides WHERE status='completed'")[0]["cnt"]
-        total_revenue = run_query("SELECT SUM(total_fare) AS rev FROM rides WHERE status='completed'")[0]["rev"]
-    
+        totals = get_totals()
+        rides_by_status = totals.get("rides_by_status", {})
+
         col1, col2, col3, col4 = st.columns(4)
-        col1.metric("Total Users", total_users)
-        col2.metric("Total Rides", total_rides)
-        col3.metric("Completed Rides", completed)
-        col4.metric("Total Revenue", f"₹{total_revenue or 0:,.0f}")
+        col1.metric("Total Users", int(totals.get("users", {}).get("", 0)))
+        col2.metric("Total Rides", int(totals.get("rides", {}).get("", 0)))
+        col3.metric("Completed Rides", int(rides_by_status.get("completed", 0)))
+        col4.metric("Total Revenue", f"₹{totals.get('revenue', {}).get('', 0):,.0f}")
     
         st.divider()
         st.subheader("Analytics")
-        data = run_query("SELECT status, COUNT(*) AS count FROM rides GROUP BY status")
-        st.bar_chart(pd.DataFrame(data).set_index("status"))
+        if rides_by_status:
+            st.bar_chart(pd.Series(rides_by_status, name="count").rename_axis("status"))
+
+        days = st.selectbox("Period", [7, 30, 90], index=1, format_func=lambda d: f"Last {d} days")
+        series = pd.DataFrame(get_series(["rides", "revenue", "signups"], days=days))
+        if not series.empty:
+            daily = series.pivot_table(index="bucket", columns="metric", values="value", aggfunc="sum").fillna(0)
+            col1, col2 = st.columns(2)
+            if "rides" in daily:
+                col1.caption("Rides per day")
+                col1.line_chart(daily["rides"])
+            if "revenue" in daily:
+                col2.caption("Revenue per day")
+                col2.line_chart(daily["revenue"])
+            if "signups" in daily:
+                st.caption("Signups per day")
+                st.bar_chart(daily["signups"])
+
+        route_volume = totals.get("route_volume", {})
+        if route_volume:
+            st.caption("Busiest routes")
+            names = {str(r.route_id): f"{r.from_city} → {r.to_city}" for r in fetch_routes()}
+            top_routes = sorted(route_volume.items(), key=lambda kv: kv[1], reverse=True)[:10]
+            st.dataframe(pd.DataFrame([(names.get(route_id, route_id), int(n)) for route_id, n in top_routes],
+                                      columns=["Route", "Rides"]), hide_index=True)
+
+        st.divider()
+        show_driver_leaderboard()
+
+        with st.expander("Query cache"):
+            st.dataframe(pd.DataFrame.from_dict(cache_stats(), orient="index"), use_container_width=True)
+
+        replicas = replica_status()
+        if replicas:
+            with st.expander("Read replicas"):
+                st.dataframe(pd.DataFrame(replicas).drop(columns="checked", errors="ignore"), use_container_width=True)
+
+        with st.expander("Background jobs"):
+            stats = queue_stats()
+            if stats:
+                st.dataframe(pd.DataFrame(stats).set_index("job_type"), use_container_width=True)
+            else:
+                st.caption("No jobs queued yet. Start `python scripts/worker.py` to process them.")
+            col1, col2 = st.columns(2)
+            if col1.button("Queue metrics rebuild"):
+                enqueue("rebuild_metrics", priority=5)
+                st.success("Metrics rebuild queued.")
+            if col2.button("Queue rating reconciliation"):
+                enqueue("rebuild_ratings", priority=5)
+                st.success("Rating reconciliation queued.")
+
+        with st.expander("Profiling"):
+            st.caption(f"Profiles one rerun of your session with cProfile; stats are saved under `{PROFILE_DIR}/` "
+                       "and summarised in the sidebar. `?profile=1` in the URL does the same for any admin rerun.")
+            if st.button("Profile my next rerun"):
+                request_profile()
+                st.success("The next page you open will be profiled.")
+
+        with st.expander("SQL statements"):
+            stats = query_stats()
+            if stats:
+                st.dataframe(pd.DataFrame(stats).set_index("name"), use_container_width=True)
+            else:
+                st.caption("No registered statements have run in this process yet.")
 
 if __name__ == "__main__":
     show()
\ No newline at end of file
@@ -2,7 +2,9 @@ import streamlit as st
 from datetime import datetime
 import time
 import pymysql
+from utils import sql_registry
 from utils.db_connection import get_connection
+from auth.identity import current_identity
 from utils.ride_utils import create_ride_request, fetch_route_cities, get_matched_ride_details
 from streamlit_autorefresh import st_autorefresh
  
@@ -12,8 +14,8 @@ def show():
  
     st_autorefresh(interval=5000, key="live_match_poll")
  
-    user = st.session_state.get("user")
-    if not user:
+    identity = current_identity()
+    if not identity:
         st.warning("Please log in first.")
         return
  
@@ -46,7 +48,9 @@ def show():
  
         submitted = st.form_submit_button("Request Ride")
  
-    if submitted:
+    if submitted and not identity.is_passenger:
+        st.error("Only passengers can request rides.")
+    elif submitted:
         preferences = {
             "family": pref_family,
             "women": pref_women,
@@ -56,7 +60,7 @@ def show():
         }
  
         success = create_ride_request(
-            passenger_id=user["user_id"],
+            passenger_id=identity.passenger_id,
             from_city=from_city,
             to_city=to_city,
             date_time=datetime.combine(date, time_input),
@@ -72,14 +76,11 @@ def show():
             st.error("Failed to create request. Try again.")
  
     # 🔍 Live Match Check
+    if not identity.is_passenger:
+        return
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
-    cursor.execute("""
-        SELECT request_id, status
-        FROM ride_requests
-        WHERE passenger_id=%s
-        ORDER BY created_at DESC LIMIT 1
-    """, (user["user_id"],))
+    sql_registry.execute(cursor, "ride_request.latest_for_passenger", (identity.passenger_id,))
     req = cursor.fetchone()
     cursor.close()
     conn.close()
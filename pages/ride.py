@@ -1,8 +1,8 @@
 import time
 import pydeck as pdk
 import streamlit as st
-from utils.db_connection import get_connection
-from utils.ride_utils import create_notification, create_user_report, get_route_coordinates_for_ride, log_incident, update_ride_position_index
+from auth.identity import current_identity
+from utils.ride_utils import create_notification, create_user_report, get_route_coordinates_for_ride, iter_active_rides, update_ride_position_index, update_ride_status
  
 st.set_page_config(page_title="Ride Tracking", layout="wide")
 
@@ -12,41 +12,22 @@ def show():
     st.header("Ride Tracking")
     
     try:
-        import pymysql
-        conn = get_connection()
-        cur = conn.cursor(pymysql.cursors.DictCursor)
-        cur.execute("""
-            SELECT r.ride_id, r.offer_id, r.passenger_id, r.driver_id, r.start_time, r.end_time,
-                r.current_position_index, r.status,
-                rr.from_city, rr.to_city, u.name AS passenger_name, du.name AS driver_name
-            FROM rides r
-            LEFT JOIN ride_offers ro ON r.offer_id = ro.offer_id
-            LEFT JOIN ride_requests rr ON ro.request_id = rr.request_id
-            LEFT JOIN passengers p ON r.passenger_id = p.passenger_id
-            LEFT JOIN users u ON p.user_id = u.user_id
-            LEFT JOIN drivers dr ON r.driver_id = dr.driver_id
-            LEFT JOIN users du ON dr.user_id = du.user_id
-            WHERE r.status IN ('booked','active')
-            ORDER BY r.start_time DESC
-        """)
-        active_rides = cur.fetchall()
-        cur.close()
-        conn.close()
+        ride_map = {f"{r.ride_id} — {r.from_city} ➜ {r.to_city} ({r.driver_name or 'Unknown driver'})": r
+                    for r in iter_active_rides()}
     except Exception as e:
         st.error("Error fetching active rides: " + str(e))
-        active_rides = []
+        ride_map = {}
     
-    if not active_rides:
+    if not ride_map:
         st.info("No active rides to track (rides with status 'booked' or 'active').")
         st.write("You can start a ride from the Offer / Driver page to test simulation.")
         st.stop()
     
-    ride_map = {f"{r['ride_id']} — {r['from_city']} ➜ {r['to_city']} ({r.get('driver_name') or 'Unknown driver'})": r for r in active_rides}
     choice = st.selectbox("Select an active ride to track", options=list(ride_map.keys()))
     ride = ride_map[choice]
     
-    st.markdown(f"**Ride ID:** {ride['ride_id']}  •  **Status:** {ride['status']}  •  **Driver:** {ride.get('driver_name') or '—'}  •  **Passenger:** {ride.get('passenger_name') or '—'}")
-    st.write("Start time:", ride.get('start_time'))
+    st.markdown(f"**Ride ID:** {ride.ride_id}  •  **Status:** {ride.status}  •  **Driver:** {ride.driver_name or '—'}  •  **Passenger:** {ride.passenger_name or '—'}")
+    st.write("Start time:", ride.start_time)
     
     coords = get_route_coordinates_for_ride(ride)
     if not coords:
@@ -57,12 +38,12 @@ def show():
     center_lon = sum(p[0] for p in positions) / len(positions)
     center_lat = sum(p[1] for p in positions) / len(positions)
     
-    sim_key = f"sim_{ride['ride_id']}"
+    sim_key = f"sim_{ride.ride_id}"
     if sim_key not in st.session_state:
         st.session_state[sim_key] = {
             "running": False,
             "paused": False,
-            "index": int(ride.get('current_position_index') or 0),
+            "index": int(ride.current_position_index or 0),
             "speed": 1.0  
         }
     
@@ -74,7 +55,7 @@ def show():
             if st.button("Start Simulation"):
                 state["running"] = True
                 state["paused"] = False
-                state["index"] = int(ride.get('current_position_index') or 0)
+                state["index"] = int(ride.current_position_index or 0)
         else:
             if state["paused"]:
                 if st.button("Resume"):
@@ -86,35 +67,18 @@ def show():
         if st.button("Step +1"):
             new_idx = min(len(positions) - 1, state["index"] + 1)
             state["index"] = new_idx
-            update_ride_position_index(ride['ride_id'], new_idx)
+            update_ride_position_index(ride.ride_id, new_idx)
     with col3:
         if st.button("Stop Simulation"):
             state["running"] = False
             state["paused"] = False
     with col4:
         if st.button("Emergency (stop & notify)"):
-            conn = get_connection()
-            cur = conn.cursor()
-            try:
-                cur.execute("UPDATE rides SET status='cancelled' WHERE ride_id=%s", (ride['ride_id'],))
-                conn.commit()
+            message = "Ride {ride_id} cancelled due to emergency."
+            if update_ride_status(ride.ride_id, "cancelled", notify={"driver": message, "passenger": message}):
                 st.warning("Ride marked as cancelled (emergency). Notifications created.")
-                cur.execute("SELECT d.user_id AS driver_user_id, p.user_id AS passenger_user_id FROM rides r JOIN drivers d ON r.driver_id = d.driver_id JOIN passengers p ON r.passenger_id = p.passenger_id WHERE r.ride_id=%s", (ride['ride_id'],))
-                uu = cur.fetchone()
-                if uu:
-                    try:
-                        driver_uid = uu[0]
-                        passenger_uid = uu[1]
-                        create_notification(driver_uid, f"Ride {ride['ride_id']} cancelled due to emergency.")
-                        create_notification(passenger_uid, f"Ride {ride['ride_id']} cancelled due to emergency.")
-                    except Exception:
-                        pass
-            except Exception as e:
-                conn.rollback()
-                st.error("Error cancelling ride: " + str(e))
-            finally:
-                cur.close()
-                conn.close()
+            else:
+                st.error("Error cancelling ride.")
             state["running"] = False
             state["paused"] = False
     
@@ -178,13 +142,15 @@ def show():
             while state["running"] and not state["paused"]:
                 if state["index"] < len(positions) - 1:
                     state["index"] += 1
-                    update_ride_position_index(ride['ride_id'], state["index"])
+                    update_ride_position_index(ride.ride_id, state["index"])
                     render_deck(state["index"])
                     # st.caption(f"Position index: {state['index']} / {len(positions)-1}  — updated {datetime.now().strftime('%H:%M:%S')}")
                     time.sleep(state["speed"])
                 else:
-                    st.success("Simulation reached the end of the route.")
-                    conn = get_connection(); cur = conn.cursor(); cur.execute("UPDATE rides SET status='completed' WHERE ride_id=%s", (ride['ride_id'],)); conn.commit(); cur.close(); conn.close()
+                    if update_ride_status(ride.ride_id, "completed"):
+                        st.success("Simulation reached the end of the route.")
+                    else:
+                        st.error("Reached the end of the route, but the ride could not be marked completed.")
                     state["running"] = False
                     break
         except Exception as e:
@@ -195,47 +161,24 @@ def show():
     with col5:
         if st.button("Reset position to start"):
             state["index"] = 0
-            update_ride_position_index(ride['ride_id'], 0)
+            update_ride_position_index(ride.ride_id, 0)
             render_deck(0)
     with col6:
         if st.button("Set position to end"):
             state["index"] = len(positions) - 1
-            update_ride_position_index(ride['ride_id'], state["index"])
+            update_ride_position_index(ride.ride_id, state["index"])
             render_deck(state["index"])
     
-    user = st.session_state.get("user")
+    identity = current_identity()
     
-    if not user:
+    if not identity:
         st.warning("You must be logged in to control a ride.")
     else:
-        uid = user["user_id"]
-        role = user["role"].lower()
-    
-        is_driver = False
-        is_passenger = False
-    
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT d.user_id AS driver_uid,
-                p.user_id AS passenger_uid
-            FROM rides r
-            JOIN drivers d ON r.driver_id = d.driver_id
-            JOIN passengers p ON r.passenger_id = p.passenger_id
-            WHERE r.ride_id = %s
-        """, (ride["ride_id"],))
-        up = cur.fetchone()
-        cur.close()
-        conn.close()
-    
-        if up:
-            driver_uid = up["driver_uid"]
-            passenger_uid = up["passenger_uid"]
-    
-            if uid == driver_uid:
-                is_driver = True
-            if uid == passenger_uid:
-                is_passenger = True
+        # the Identity and the ride row already carry both parties' ids
+        is_driver = identity.is_driver and identity.driver_id == ride.driver_id
+        is_passenger = identity.is_passenger and identity.passenger_id == ride.passenger_id
+        driver_uid = ride.driver_user_id
+        passenger_uid = ride.passenger_user_id
 
         st.subheader("Ride Controls")
  
@@ -244,52 +187,45 @@ def show():
         
             with c1:
                 if st.button("Complete Ride"):
-                    conn = get_connection()
-                    cur = conn.cursor()
-                    cur.execute("UPDATE rides SET status='completed', end_time=NOW() WHERE ride_id=%s", (ride["ride_id"],))
-                    conn.commit()
-                    cur.close()
-                    conn.close()
-        
-                    create_notification(passenger_uid, f"Ride {ride['ride_id']} completed by driver.")
-                    st.success("Ride marked as completed.")
-                    st.rerun()
+                    if update_ride_status(ride.ride_id, "completed",
+                                          notify={"passenger": "Ride {ride_id} completed by driver."}):
+                        st.success("Ride marked as completed.")
+                        st.rerun()
+                    else:
+                        st.error("Could not complete the ride; it may already have ended.")
         
             with c2:
                 if st.button("⚠ Report Passenger"):
                     create_user_report(
                         reported_by=driver_uid,
                         reported_user=passenger_uid,
-                        ride_id=ride["ride_id"],
+                        ride_id=ride.ride_id,
                         category="passenger_misconduct",
                         description="Driver reported an issue during the ride."
                     )
         
-                    create_notification(passenger_uid, f"Driver filed a report for Ride {ride['ride_id']}.")
+                    create_notification(passenger_uid, f"Driver filed a report for Ride {ride.ride_id}.")
                     st.warning("Passenger reported.")
         
             with c3:
                 if st.button("Emergency Stop"):
-                    log_incident(
-                        ride_id=ride["ride_id"],
-                        user_id=driver_uid,
-                        incident_type="emergency",
-                        description="Driver triggered emergency stop.",
-                        severity="high"
-                    )
-        
-                    conn = get_connection()
-                    cur = conn.cursor()
-                    cur.execute("UPDATE rides SET status='cancelled' WHERE ride_id=%s", (ride["ride_id"],))
-                    conn.commit()
-                    cur.close()
-                    conn.close()
-        
-                    create_notification(driver_uid, f"You triggered an emergency stop for Ride {ride['ride_id']}.")
-                    create_notification(passenger_uid, f"Driver triggered emergency stop for Ride {ride['ride_id']}.")
-        
-                    st.error("Emergency stop activated.")
-                    st.rerun()
+                    if update_ride_status(
+                            ride.ride_id, "cancelled",
+                            notify={
+                                "driver": "You triggered an emergency stop for Ride {ride_id}.",
+                                "passenger": "Driver triggered emergency stop for Ride {ride_id}.",
+                            },
+                            incident={
+                                "reported_by": "driver",
+                                "incident_type": "emergency",
+                                "description": "Driver triggered emergency stop.",
+                                "severity": "high",
+                            },
+                    ):
+                        st.error("Emergency stop activated.")
+                        st.rerun()
+                    else:
+                        st.error("Could not cancel the ride; it may already have ended.")
         
         
         if is_passenger:
@@ -297,59 +233,52 @@ def show():
         
             with c1:
                 if st.button("Cancel Ride"):
-                    log_incident(
-                        ride_id=ride["ride_id"],
-                        user_id=passenger_uid,
-                        incident_type="panic_stop",
-                        description="Passenger cancelled the ride abruptly.",
-                        severity="medium"
-                    )
-        
-                    conn = get_connection()
-                    cur = conn.cursor()
-                    cur.execute("UPDATE rides SET status='cancelled' WHERE ride_id=%s", (ride["ride_id"],))
-                    conn.commit()
-                    cur.close()
-                    conn.close()
-        
-                    create_notification(driver_uid, f"Passenger cancelled Ride {ride['ride_id']}.")
-                    st.error("Ride cancelled.")
-                    st.rerun()
+                    if update_ride_status(
+                            ride.ride_id, "cancelled",
+                            notify={"driver": "Passenger cancelled Ride {ride_id}."},
+                            incident={
+                                "reported_by": "passenger",
+                                "incident_type": "panic_stop",
+                                "description": "Passenger cancelled the ride abruptly.",
+                                "severity": "medium",
+                            },
+                    ):
+                        st.error("Ride cancelled.")
+                        st.rerun()
+                    else:
+                        st.error("Could not cancel the ride; it may already have ended.")
         
             with c2:
                 if st.button("⚠ Report Driver"):
                     create_user_report(
                         reported_by=passenger_uid,
                         reported_user=driver_uid,
-                        ride_id=ride["ride_id"],
+                        ride_id=ride.ride_id,
                         category="driver_misconduct",
                         description="Passenger reported a driver issue during the ride."
                     )
-                    create_notification(driver_uid, f"Passenger filed a report for Ride {ride['ride_id']}.")
+                    create_notification(driver_uid, f"Passenger filed a report for Ride {ride.ride_id}.")
                     st.warning("Driver reported.")
         
             with c3:
                 if st.button("Emergency Stop"):
-                    log_incident(
-                        ride_id=ride["ride_id"],
-                        user_id=passenger_uid,
-                        incident_type="emergency",
-                        description="Passenger triggered emergency stop.",
-                        severity="high"
-                    )
-        
-                    conn = get_connection()
-                    cur = conn.cursor()
-                    cur.execute("UPDATE rides SET status='cancelled' WHERE ride_id=%s", (ride["ride_id"],))
-                    conn.commit()
-                    cur.close()
-                    conn.close()
-        
-                    create_notification(driver_uid, f"Passenger triggered emergency stop for Ride {ride['ride_id']}.")
-                    create_notification(passenger_uid, f"You triggered emergency stop for Ride {ride['ride_id']}.")
-        
-                    st.error("Emergency triggered.")
-                    st.rerun()
+                    if update_ride_status(
+                            ride.ride_id, "cancelled",
+                            notify={
+                                "driver": "Passenger triggered emergency stop for Ride {ride_id}.",
+                                "passenger": "You triggered emergency stop for Ride {ride_id}.",
+                            },
+                            incident={
+                                "reported_by": "passenger",
+                                "incident_type": "emergency",
+                                "description": "Passenger triggered emergency stop.",
+                                "severity": "high",
+                            },
+                    ):
+                        st.error("Emergency triggered.")
+                        st.rerun()
+                    else:
+                        st.error("Could not cancel the ride; it may already have ended.")
     
     st.write("---")
     st.info("Note: This is a client-side simulation. The DB's `rides.current_position_index` is updated during simulation so other pages can read it for the active ride. To simulate 'real' tracking in production you'd push position updates from the driver's device via websocket / API.")
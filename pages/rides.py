@@ -1,11 +1,10 @@
 import streamlit as st
 from components.navbar import navbar
+from components.pagination import fetch_page, page_controls, ride_history_filters
+from auth.identity import current_identity
 from utils.ride_utils import (
-    get_driver_id as _get_driver_id,
-    get_passenger_id_by_user,
-    get_rides_for_driver,
-    get_rides_for_passenger,
-    has_user_already_rated,
+    RIDE_HISTORY_PAGE_SIZE,
+    get_ride_history,
     save_rating_and_update_averages
 )
  
@@ -13,29 +12,33 @@ def show():
     st.title("My Rides")
     st.write("Track your ride history, see upcoming trips, and rate completed rides.")
  
-    user = st.session_state.get("user")
-    if not user:
+    identity = current_identity()
+    if not identity:
         st.warning("Please log in to view your rides.")
         st.stop()
  
-    user_id = int(user["user_id"])
-    role = str(user["role"]).lower()
+    user_id = identity.user_id
+    role = identity.role
  
     if role == "driver":
-        driver_id = _get_driver_id(user_id)
-        if not driver_id:
+        if not identity.is_driver:
             st.warning("Driver profile not found. Please register as a driver.")
             st.stop()
-        rides = get_rides_for_driver(driver_id)
         st.subheader("Rides You've Offered")
     else:
-        passenger_id = get_passenger_id_by_user(user_id)
-        if not passenger_id:
+        if not identity.is_passenger:
             st.warning("Passenger profile not found. Please register as a passenger.")
             st.stop()
-        rides = get_rides_for_passenger(passenger_id)
         st.subheader("Your Ride Bookings")
  
+    filters = ride_history_filters("my_rides")
+    rides, next_cursor, has_more = fetch_page(
+        "my_rides",
+        lambda **page: get_ride_history(user_id, role, **page),
+        RIDE_HISTORY_PAGE_SIZE,
+        **filters,
+    )
+ 
     if not rides:
         st.info("You have no rides yet. Book or offer a ride to get started.")
         return
@@ -57,17 +60,11 @@ def show():
                 unsafe_allow_html=True
             )
  
-        if role == "driver":
-            st.markdown(f"**Passenger:** {ride['passenger_name']}")
-            rated_user_id = int(ride["passenger_user_id"])
-        else:
-            st.markdown(f"**Driver:** {ride['driver_name']}")
-            rated_user_id = int(ride["driver_user_id"])
+        st.markdown(f"**{'Passenger' if role == 'driver' else 'Driver'}:** {ride['counterpart_name']}")
+        rated_user_id = int(ride["counterpart_user_id"])
  
         if ride["status"] == "completed":
-            already = has_user_already_rated(ride_id=int(ride["ride_id"]), rated_by_user_id=user_id)
- 
-            if not already:
+            if not ride["already_rated"]:
                 uniq = f"{ride['ride_id']}_{user_id}_{idx}"
                 form_key = f"rate_form_{uniq}"
                 rating_key = f"rating_{uniq}"
@@ -109,6 +106,8 @@ def show():
  
         st.markdown("---")
  
+    page_controls("my_rides", next_cursor, has_more)
+ 
  
 if __name__ == "__main__":
     show()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import os
+import sys
+import argparse
+import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.analytics import (
+    EXPORT_BATCH_SIZE,
+    SNAPSHOT_DIR,
+    SNAPSHOT_TABLES,
+    demand_report,
+    export_snapshot,
+    incident_report,
+    revenue_report,
+)
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value)
+
+
+parser = argparse.ArgumentParser(description="Export OLTP tables to Parquet snapshots and run offline reports on them.")
+parser.add_argument("--dir", default=SNAPSHOT_DIR)
+sub = parser.add_subparsers(dest="command", required=True)
+
+export = sub.add_parser("export", help="append rows past each table's primary-key watermark")
+export.add_argument("tables", nargs="*", help=f"subset of {', '.join(SNAPSHOT_TABLES)} (default: all)")
+export.add_argument("--full", action="store_true", help="drop and re-export, picking up updated rows")
+export.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+
+for name in ("demand", "revenue", "incidents"):
+    report = sub.add_parser(name)
+    report.add_argument("--from", dest="date_from", type=_date)
+    report.add_argument("--to", dest="date_to", type=_date)
+    if name == "revenue":
+        report.add_argument("--by", choices=["day", "month", "driver_id"], default="day")
+    if name == "incidents":
+        report.add_argument("--severity", nargs="+")
+
+args = parser.parse_args()
+
+if args.command == "export":
+    unknown = set(args.tables) - set(SNAPSHOT_TABLES)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+    exported = export_snapshot(args.tables or None, args.dir, args.full, args.batch_size)
+    for table, rows in exported.items():
+        print(f"{table:<16} {rows} rows")
+else:
+    if args.command == "demand":
+        result = demand_report(args.date_from, args.date_to, snapshot_dir=args.dir)
+    elif args.command == "revenue":
+        result = revenue_report(args.date_from, args.date_to, args.by, snapshot_dir=args.dir)
+    else:
+        result = incident_report(args.date_from, args.date_to, args.severity, snapshot_dir=args.dir)
+    print(result.to_pandas().to_string(index=False))
\ No newline at end of file
@@ -0,0 +1,259 @@
+import os
+import re
+import glob
+import gzip
+import json
+import hashlib
+import argparse
+from collections import Counter, defaultdict
+
+LOG_DIR = os.getenv("ACTIVITY_LOG_DIR", "logs")
+LOG_FILE = os.path.join(LOG_DIR, "auth_activity.jsonl")
+LEGACY_LOG = "auth_activity.log"
+INDEX_VERSION = 1
+CHUNK_LINES = 65536
+
+# 2025-10-31 02:40:40,395 - INFO - LOGIN - SUCCESS - Email: a@b.com - Role: driver - msg
+LEGACY_LINE = re.compile(
+    rb"^(\d{4}-\d{2}-\d{2}) (\d{2}):(\d{2}):\d{2},\d{3} - \w+ - (\w+) - (SUCCESS|FAILURE) - Email: (.*?) - Role: "
+)
+# JSONL records are parsed with json.loads, so key order and spacing do not matter;
+# lines without this substring cannot be logins and are skipped before parsing
+LOGIN_MARKER = b'"login"'
+
+
+def _parse_json(line):
+    """(day, hour, minute, action, outcome, email) from one JSONL record, or None."""
+    try:
+        entry = json.loads(line)
+        ts = entry["ts"]
+        return ts[:10], ts[11:13], ts[14:16], entry["action"], entry["outcome"], entry.get("email") or ""
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _parse_legacy(line):
+    m = LEGACY_LINE.match(line)
+    return tuple(group.decode("utf-8", "replace") for group in m.groups()) if m else None
+
+
+def _parse(line):
+    return _parse_json(line) if line.startswith(b"{") else _parse_legacy(line)
+
+
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _fingerprint(path):
+    """
+    Files are identified by a hash of their first line, not their name, so a
+    segment that was indexed while active is recognised after rotation + gzip
+    and only its unindexed tail is read.
+    """
+    with _open(path) as f:
+        first = f.readline()
+    return hashlib.sha1(first).hexdigest() if first else None
+
+
+def _new_entry(path):
+    return {"path": path, "offset": 0, "complete": False, "days": {},
+            "hourly": {}, "failed_minutes": {}, "users": {}}
+
+
+def _index_file(path, entry):
+    hourly = defaultdict(lambda: [0, 0], entry["hourly"])
+    failed_minutes = Counter(entry["failed_minutes"])
+    users = defaultdict(lambda: [0, 0, ""], entry["users"])
+    days = entry["days"]
+    offset = entry["offset"]
+
+    with _open(path) as f:
+        f.seek(offset)
+        while True:
+            lines = f.readlines(CHUNK_LINES * 128)
+            if not lines:
+                break
+            for line in lines:
+                if not line.endswith(b"\n"):
+                    # partially written tail of the active file; pick it up next run
+                    break
+                line_offset = offset
+                offset += len(line)
+                if line.startswith(b"{"):
+                    record = _parse_json(line) if LOGIN_MARKER in line else None
+                else:
+                    record = _parse_legacy(line)
+                if not record:
+                    continue
+                day, hour, minute, action, outcome, email = record
+                if action.lower() != "login":
+                    continue
+                if day not in days:
+                    days[day] = line_offset
+                failed = outcome.lower() == "failure"
+                hour_key = f"{day}T{hour}"
+                hourly[hour_key][failed] += 1
+                if failed:
+                    failed_minutes[f"{hour_key}:{minute}"] += 1
+                stats = users[email]
+                stats[failed] += 1
+                stats[2] = hour_key
+            else:
+                continue
+            break
+
+    entry.update(path=path, offset=offset, complete=path.endswith(".gz"),
+                 hourly=dict(hourly), failed_minutes=dict(failed_minutes), users=dict(users))
+    return entry
+
+
+def log_files(log_dir=LOG_DIR, legacy=LEGACY_LOG):
+    base = os.path.join(log_dir, os.path.basename(LOG_FILE))
+    files = sorted(glob.glob(glob.escape(base) + ".*.gz"))
+    files += [p for p in (base, legacy) if p and os.path.exists(p)]
+    return files
+
+
+def load_index(index_path):
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION:
+            return index
+    return {"version": INDEX_VERSION, "entries": {}}
+
+
+def update_index(index, files):
+    """Single pass over every file's unindexed bytes; returns the number of files read."""
+    touched = 0
+    for path in files:
+        fp = _fingerprint(path)
+        if fp is None:
+            continue
+        entry = index["entries"].get(fp)
+        if entry and entry["complete"]:
+            continue
+        if entry and not path.endswith(".gz") and os.path.getsize(path) == entry["offset"]:
+            continue
+        index["entries"][fp] = _index_file(path, entry or _new_entry(path))
+        touched += 1
+    return touched
+
+
+def save_index(index, index_path):
+    tmp = index_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp, index_path)
+
+
+def merged(index):
+    hourly = defaultdict(lambda: [0, 0])
+    failed_minutes = Counter()
+    users = defaultdict(lambda: [0, 0, ""])
+    for entry in index["entries"].values():
+        for key, (ok, failed) in entry["hourly"].items():
+            hourly[key][0] += ok
+            hourly[key][1] += failed
+        failed_minutes.update(entry["failed_minutes"])
+        for email, (ok, failed, last) in entry["users"].items():
+            stats = users[email]
+            stats[0] += ok
+            stats[1] += failed
+            stats[2] = max(stats[2], last)
+    return hourly, failed_minutes, users
+
+
+def logins_per_hour(index, day=None):
+    hourly, _, _ = merged(index)
+    return sorted((k, v[0], v[1]) for k, v in hourly.items() if not day or k.startswith(day))
+
+
+def top_users(index, n=10, by_failures=False):
+    _, _, users = merged(index)
+    col = 1 if by_failures else 0
+    ranked = sorted(users.items(), key=lambda kv: kv[1][col], reverse=True)
+    return [(email, ok, failed, last) for email, (ok, failed, last) in ranked[:n] if (failed if by_failures else ok)]
+
+
+def failed_login_spikes(index, threshold=None, top=20):
+    """
+    Minutes whose failed-login count is at least `threshold`
+    (default: mean + 3 standard deviations of all minutes with failures).
+    """
+    _, failed_minutes, _ = merged(index)
+    if not failed_minutes:
+        return []
+    if threshold is None:
+        counts = list(failed_minutes.values())
+        mean = sum(counts) / len(counts)
+        std = (sum((c - mean) ** 2 for c in counts) / len(counts)) ** 0.5
+        threshold = max(2, mean + 3 * std)
+    spikes = [(minute, n) for minute, n in failed_minutes.items() if n >= threshold]
+    return sorted(spikes, key=lambda kv: kv[1], reverse=True)[:top]
+
+
+def lines_for_day(index, day):
+    """Raw lines for one day, read by seeking to each file's indexed per-day offset."""
+    for entry in index["entries"].values():
+        start = entry["days"].get(day)
+        if start is None or not os.path.exists(entry["path"]):
+            continue
+        with _open(entry["path"]) as f:
+            f.seek(start)
+            for line in f:
+                record = _parse(line)
+                if not record:
+                    continue
+                line_day = record[0]
+                if line_day > day:
+                    break
+                if line_day == day:
+                    yield line.decode("utf-8", "replace").rstrip("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index auth activity logs and answer login analytics queries.")
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    parser.add_argument("--legacy", default=LEGACY_LOG, help="plaintext log written before JSONL logging")
+    parser.add_argument("--index", default=None, help="index file (default: <log-dir>/.auth_log_index.json)")
+    parser.add_argument("--no-update", action="store_true", help="query the existing index without reading logs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("update")
+    per_hour = sub.add_parser("per-hour")
+    per_hour.add_argument("--day")
+    top = sub.add_parser("top-users")
+    top.add_argument("-n", type=int, default=10)
+    top.add_argument("--failures", action="store_true")
+    spikes = sub.add_parser("failed-spikes")
+    spikes.add_argument("--threshold", type=int)
+    day = sub.add_parser("day")
+    day.add_argument("day")
+    args = parser.parse_args()
+
+    os.makedirs(args.log_dir, exist_ok=True)
+    index_path = args.index or os.path.join(args.log_dir, ".auth_log_index.json")
+    index = load_index(index_path)
+    if not args.no_update:
+        if update_index(index, log_files(args.log_dir, args.legacy)):
+            save_index(index, index_path)
+
+    if args.command == "update":
+        print(f"Indexed {len(index['entries'])} log segments into {index_path}")
+    elif args.command == "per-hour":
+        for hour, ok, failed in logins_per_hour(index, args.day):
+            print(f"{hour}:00  success={ok:<6} failure={failed}")
+    elif args.command == "top-users":
+        for email, ok, failed, last in top_users(index, args.n, args.failures):
+            print(f"{email:<40} success={ok:<6} failure={failed:<6} last={last}:00")
+    elif args.command == "failed-spikes":
+        for minute, n in failed_login_spikes(index, args.threshold):
+            print(f"{minute}  failed={n}")
+    elif args.command == "day":
+        for line in lines_for_day(index, args.day):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.ride_utils import backfill_ride_history
+
+parser = argparse.ArgumentParser(description="Build the ride_history read model from the rides tables.")
+parser.add_argument("--batch-size", type=int, default=1000)
+args = parser.parse_args()
+
+batches = backfill_ride_history(args.batch_size)
+if batches is None:
+    print("Ride history backfill failed.")
+    sys.exit(1)
+
+print(f"Backfilled ride_history in {batches} batches of up to {args.batch_size} rides.")
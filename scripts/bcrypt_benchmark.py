@@ -0,0 +1,49 @@
+import os
+import sys
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from auth import password_pool
+
+
+def burst(users: int, rounds: int):
+    """Simulate a shift-start login burst through the auth pool and return sorted latencies (ms)."""
+    hashed = password_pool.hash_password("Burst-Password1", rounds)
+
+    def login(_):
+        start = time.perf_counter()
+        password_pool.check_password("Burst-Password1", hashed)
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        return sorted(executor.map(login, range(users)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick a bcrypt cost factor for a target hash latency on this machine.")
+    parser.add_argument("--target-ms", type=float, default=250.0)
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=16)
+    parser.add_argument("--burst", type=int, default=0, help="also simulate N concurrent logins at the chosen cost")
+    args = parser.parse_args()
+
+    best, timings = password_pool.benchmark_rounds(args.target_ms, args.min_rounds, args.max_rounds)
+    for rounds, ms in timings.items():
+        print(f"rounds={rounds:2d}  {ms:8.1f} ms")
+    print(f"\nRecommended: BCRYPT_ROUNDS={best}  (target {args.target_ms:.0f} ms)")
+
+    if args.burst:
+        latencies = burst(args.burst, best)
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"Burst of {args.burst} logins with AUTH_POOL_SIZE={password_pool.AUTH_POOL_SIZE}: "
+              f"p50={p50:.0f} ms  p99={p99:.0f} ms")
+
+    password_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
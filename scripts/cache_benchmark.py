@@ -0,0 +1,60 @@
+import os
+import sys
+import argparse
+import multiprocessing
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import query_cache
+
+
+@query_cache.cached(ttl=300, maxsize=1024, tags=lambda key: ["ride_offers", f"route:{key % 16}"])
+def _lookup(key):
+    time.sleep(0.002)  # stand-in for a MySQL round trip
+    return [{"key": key, "pid": os.getpid()}]
+
+
+def _worker(backend_name, path, ops, keys, invalidate_every):
+    if backend_name == "sqlite":
+        query_cache.set_backend(query_cache.SQLiteBackend(path))
+    elif backend_name == "redis":
+        query_cache.set_backend(query_cache.RedisBackend())
+    start = time.perf_counter()
+    for i in range(ops):
+        if invalidate_every and i % invalidate_every == 0:
+            query_cache.invalidate(f"route:{i % 16}")
+        _lookup(i % keys)
+    elapsed = time.perf_counter() - start
+    return elapsed, query_cache.cache_stats()["total"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read throughput and hit ratio of the query cache backends across processes.")
+    parser.add_argument("--backend", choices=["memory", "sqlite", "redis"], nargs="+", default=["memory", "sqlite"])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=5000, help="lookups per process")
+    parser.add_argument("--keys", type=int, default=200)
+    parser.add_argument("--invalidate-every", type=int, default=100)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    for backend_name in args.backend:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "query_cache.sqlite3")
+            with ctx.Pool(args.processes) as pool:
+                results = pool.starmap(
+                    _worker,
+                    [(backend_name, path, args.ops, args.keys, args.invalidate_every)] * args.processes,
+                )
+        wall = max(elapsed for elapsed, _ in results)
+        hits = sum(stats["hits"] for _, stats in results)
+        misses = sum(stats["misses"] for _, stats in results)
+        total_ops = args.processes * args.ops
+        print(f"{backend_name:<7} {total_ops / wall:10.0f} lookups/s   "
+              f"hit ratio {hits / (hits + misses):.3f}   DB calls {misses}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
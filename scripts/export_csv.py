@@ -0,0 +1,53 @@
+import os
+import sys
+import argparse
+import csv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.db_connection import STREAM_BATCH_SIZE, iter_query
+
+# export name -> query; users leaves out password hashes
+EXPORTS = {
+    "users": "SELECT user_id, name, email, role, is_active, created_at, updated_at FROM users ORDER BY user_id",
+    "rides": "SELECT * FROM rides ORDER BY ride_id",
+    "ride_offers": "SELECT * FROM ride_offers ORDER BY offer_id",
+    "ride_requests": "SELECT * FROM ride_requests ORDER BY request_id",
+    "ride_history": "SELECT * FROM ride_history ORDER BY user_id, ride_id",
+    "ratings": "SELECT * FROM ratings ORDER BY rating_id",
+    "ride_incidents": "SELECT * FROM ride_incidents ORDER BY incident_id",
+}
+
+
+def export(name, out, batch_size=STREAM_BATCH_SIZE):
+    """Stream one export into a CSV file object; memory use does not grow with the table."""
+    writer = None
+    count = 0
+    for row in iter_query(EXPORTS[name], batch_size=batch_size, read_only=True):
+        if writer is None:
+            writer = csv.DictWriter(out, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a table to CSV through a server-side cursor.")
+    parser.add_argument("export", help=f"one of: {', '.join(EXPORTS)}")
+    parser.add_argument("--out", help="output file (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=STREAM_BATCH_SIZE, help="rows fetched per round trip")
+    args = parser.parse_args()
+    if args.export not in EXPORTS:
+        parser.error(f"unknown export {args.export!r}; choose from {', '.join(EXPORTS)}")
+
+    if args.out:
+        with open(args.out, "w", newline="", encoding="utf-8") as out:
+            count = export(args.export, out, args.batch_size)
+    else:
+        count = export(args.export, sys.stdout, args.batch_size)
+    print(f"Exported {count} {args.export} rows.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,13 +1,114 @@
+import atexit
+import glob
+import gzip
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
 from datetime import datetime
 
-logging.basicConfig(
-    filename="auth_activity.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
- 
-def log_user_action(action: str, email: str, role: str = "", success: bool = True, message: str = ""):
-    status = "SUCCESS" if success else "FAILURE"
-    log_message = f"{action.upper()} - {status} - Email: {email} - Role: {role} - {message}"
-    logging.info(log_message)
\ No newline at end of file
+LOG_DIR = os.getenv("ACTIVITY_LOG_DIR", "logs")
+LOG_FILE = os.path.join(LOG_DIR, "auth_activity.jsonl")
+LOG_MAX_BYTES = int(os.getenv("ACTIVITY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_SECONDS = int(os.getenv("ACTIVITY_LOG_ROTATE_SECONDS", str(24 * 60 * 60)))
+LOG_BACKUP_COUNT = int(os.getenv("ACTIVITY_LOG_BACKUP_COUNT", "30"))
+
+_setup_lock = threading.Lock()
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+        }
+        entry.update(getattr(record, "activity", None) or {"message": record.getMessage()})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RotatingGzipHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rolls the active file over when it exceeds max_bytes or is older than
+    rotate_seconds, then gzips the rotated segment as <file>.<timestamp>.gz and
+    keeps only the newest backup_count segments.
+    """
+
+    def __init__(self, filename, max_bytes, rotate_seconds, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.rotate_seconds = rotate_seconds
+        # like TimedRotatingFileHandler: an existing file keeps its age across restarts
+        started = os.stat(self.baseFilename).st_mtime if os.path.exists(self.baseFilename) else time.time()
+        self.rollover_at = started + rotate_seconds
+
+    def shouldRollover(self, record):
+        if self.rotate_seconds and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            rotated = f"{self.baseFilename}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+            os.replace(self.baseFilename, rotated)
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+
+            segments = sorted(glob.glob(glob.escape(self.baseFilename) + ".*.gz"))
+            for old in segments[:-self.backupCount] if self.backupCount else []:
+                os.remove(old)
+
+        self.rollover_at = time.time() + self.rotate_seconds
+        if not self.delay:
+            self.stream = self._open()
+
+
+def get_logger():
+    """
+    The activity logger, set up on first use so importing this module starts no
+    thread and creates no log directory. Request threads only enqueue records; a
+    QueueListener thread formats them and does all file I/O, rotation and
+    compression.
+    """
+    activity_logger = logging.getLogger("carpool.activity")
+    if getattr(activity_logger, "_listener", None):
+        return activity_logger
+    with _setup_lock:
+        if getattr(activity_logger, "_listener", None):
+            return activity_logger
+
+        os.makedirs(LOG_DIR, exist_ok=True)
+        file_handler = RotatingGzipHandler(LOG_FILE, LOG_MAX_BYTES, LOG_ROTATE_SECONDS, LOG_BACKUP_COUNT)
+        file_handler.setFormatter(JsonLineFormatter())
+
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+
+        activity_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        activity_logger.setLevel(logging.INFO)
+        activity_logger.propagate = False
+        activity_logger._listener = listener
+        return activity_logger
+
+
+def log_user_action(action: str, email: str, role: str = "", success: bool = True, message: str = "",
+                    user_id: int = None, latency_ms: float = None):
+    activity = {
+        "action": action.lower(),
+        "outcome": "success" if success else "failure",
+        "user_id": user_id,
+        "email": email,
+        "role": role,
+        "latency_ms": round(latency_ms, 2) if latency_ms is not None else None,
+        "message": message,
+    }
+    get_logger().info("%s %s", activity["action"], activity["outcome"], extra={"activity": activity})
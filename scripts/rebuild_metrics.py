@@ -0,0 +1,12 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.metrics_rollup import rebuild_metrics
+
+if not rebuild_metrics():
+    print("Metrics rebuild failed.")
+    sys.exit(1)
+
+print("Rebuilt hourly, daily, total and per-driver metrics from the users and rides tables.")
\ No newline at end of file
@@ -0,0 +1,13 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.ride_utils import rebuild_rating_aggregates
+
+rebuilt = rebuild_rating_aggregates()
+if rebuilt is None:
+    print("Rating reconciliation failed.")
+    sys.exit(1)
+
+print(f"Rebuilt {rebuilt} rating aggregates from the ratings table.")
@@ -0,0 +1,66 @@
+import os
+import sys
+import argparse
+import datetime
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from model.records import RecordBatch, Ride
+
+
+def _rows(n):
+    """Tuples shaped like a rides result set, as a tuple cursor would return them."""
+    start = datetime.datetime(2025, 1, 1)
+    return [
+        (i, i // 2, i % 500, i % 80, start, None, i % 40, "active", "Mumbai", "Pune", f"passenger {i % 500}", f"driver {i % 80}", i % 80)
+        for i in range(n)
+    ]
+
+
+def as_dicts(rows):
+    # what DictCursor does per row: a fresh dict keyed by the column names
+    names = Ride._fields
+    return [dict(zip(names, row)) for row in rows]
+
+
+def as_records(rows):
+    return list(map(Ride._make, rows))
+
+
+def as_batch(rows):
+    return RecordBatch.from_rows(Ride, rows)
+
+
+def measure(build, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(rows)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    result = build(rows)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build time and memory of DictCursor-style dicts vs Ride records vs a columnar batch.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = _rows(args.rows)
+    baseline = None
+    for label, build in (("dict rows", as_dicts), ("Ride records", as_records), ("RecordBatch", as_batch)):
+        seconds, size = measure(build, rows, args.repeat)
+        baseline = baseline or (seconds, size)
+        print(f"{label:<13} {seconds * 1000:8.1f} ms  {size / 1024 / 1024:7.1f} MiB  "
+              f"({baseline[0] / seconds:4.1f}x faster, {baseline[1] / size:4.1f}x smaller than dict rows)")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
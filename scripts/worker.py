@@ -0,0 +1,47 @@
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import job_queue
+from utils.jobs import install_default_schedules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background jobs from the jobs table. Start more processes to scale out.")
+    parser.add_argument("--worker-id", help="defaults to <hostname>:<pid>")
+    parser.add_argument("--types", nargs="+", help="only claim these job types (default: every registered type)")
+    parser.add_argument("--batch-size", type=int, default=10, help="jobs run per pass, each claimed just before it runs")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds to sleep when the queue is empty")
+    parser.add_argument("--report-every", type=float, default=60, help="seconds between throughput lines")
+    parser.add_argument("--max-jobs", type=int, help="exit after handling this many jobs")
+    parser.add_argument("--once", action="store_true", help="run one pass of up to --batch-size jobs, then exit")
+    parser.add_argument("--install-schedules", action="store_true", help="create/update the default recurring jobs first")
+    args = parser.parse_args()
+
+    unknown = set(args.types or ()) - set(job_queue.registered_types())
+    if unknown:
+        parser.error(f"unknown job types: {', '.join(sorted(unknown))}")
+    if args.install_schedules and not install_default_schedules():
+        sys.exit(1)
+
+    try:
+        counts = job_queue.run_worker(
+            worker_id=args.worker_id,
+            job_types=args.types,
+            batch_size=args.batch_size,
+            poll_interval=args.poll_interval,
+            once=args.once,
+            report_every=args.report_every,
+            max_jobs=args.max_jobs,
+        )
+    except KeyboardInterrupt:
+        return
+    handled = counts["jobs_done"] + counts["jobs_retried"] + counts["jobs_failed"]
+    print(f"Handled {handled} jobs in {counts['elapsed']:.1f}s: done={counts['jobs_done']} "
+          f"retried={counts['jobs_retried']} failed={counts['jobs_failed']}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import datetime
+import pytest
+from unittest.mock import MagicMock
+
+from utils.analytics import (
+    export_snapshot,
+    load_watermarks,
+    demand_report,
+    revenue_report,
+    incident_report,
+)
+
+
+def _ride(ride_id, month, status="completed", fare=100.0, driver_id=3):
+    start = datetime.datetime(2025, month, 5, 8, 30)
+    return (ride_id, ride_id, 2, driver_id, 1, fare, start, None, status)
+
+
+@pytest.fixture
+def mock_db(mocker):
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mocker.patch("utils.analytics.get_connection", return_value=mock_conn)
+    return mock_conn, mock_cursor
+
+
+def test_export_is_incremental_by_primary_key(mock_db, tmp_path):
+    _, cursor = mock_db
+    cursor.fetchmany.side_effect = [[_ride(1, 10), _ride(2, 11)], []]
+    assert export_snapshot(["rides"], tmp_path, batch_size=2) == {"rides": 2}
+    assert load_watermarks(tmp_path) == {"rides": 2}
+
+    cursor.fetchmany.side_effect = [[_ride(3, 11, fare=50.0)], []]
+    assert export_snapshot(["rides"], tmp_path) == {"rides": 1}
+    assert cursor.execute.call_args[0][1] == (2,)
+    assert load_watermarks(tmp_path) == {"rides": 3}
+    assert sorted(p.name for p in (tmp_path / "rides").iterdir()) == ["month=2025-10", "month=2025-11"]
+
+    report = revenue_report(by="month", snapshot_dir=tmp_path).to_pylist()
+    assert report == [{"month": "2025-10", "rides": 1, "revenue": 100.0},
+                      {"month": "2025-11", "rides": 2, "revenue": 150.0}]
+
+
+def test_full_export_resets_watermark(mock_db, tmp_path):
+    _, cursor = mock_db
+    cursor.fetchmany.side_effect = [[_ride(1, 10)], [], [_ride(1, 10, status="cancelled")], []]
+    export_snapshot(["rides"], tmp_path)
+    export_snapshot(["rides"], tmp_path, full=True)
+
+    assert cursor.execute.call_args[0][1] == (0,)
+    assert revenue_report(snapshot_dir=tmp_path).num_rows == 0
+
+
+def test_revenue_report_filters_dates_and_status(mock_db, tmp_path):
+    _, cursor = mock_db
+    cursor.fetchmany.side_effect = [[_ride(1, 9), _ride(2, 10, driver_id=4), _ride(3, 10, status="cancelled")], []]
+    export_snapshot(["rides"], tmp_path)
+
+    report = revenue_report(datetime.date(2025, 10, 1), datetime.date(2025, 10, 31), by="driver_id",
+                            snapshot_dir=tmp_path).to_pylist()
+    assert report == [{"driver_id": 4, "rides": 1, "revenue": 100.0}]
+    with pytest.raises(ValueError):
+        revenue_report(by="route", snapshot_dir=tmp_path)
+
+
+def test_demand_and_incident_reports(mock_db, tmp_path):
+    _, cursor = mock_db
+    created = datetime.datetime(2025, 11, 2, 9, 0)
+    cursor.fetchmany.side_effect = [
+        [(1, 7, "Mumbai", "Pune", created, 2, "matched", created),
+         (2, 8, "Mumbai", "Pune", created, 1, "pending", created),
+         (3, 9, "Delhi", "Agra", created, 3, "pending", created)],
+        [],
+        [(1, 5, 7, "panic_stop", "high", created), (2, 5, 8, "panic_stop", "high", created),
+         (3, 6, 7, "mechanical_issue", "low", created)],
+        [],
+    ]
+    export_snapshot(["ride_requests", "ride_incidents"], tmp_path)
+
+    demand = demand_report(snapshot_dir=tmp_path).to_pylist()
+    assert demand[0] == {"from_city": "Mumbai", "to_city": "Pune", "requests": 2, "seats_requested": 3, "matched": 1}
+
+    incidents = incident_report(severity="high", snapshot_dir=tmp_path).to_pylist()
+    assert incidents == [{"incident_type": "panic_stop", "severity": "high", "incidents": 2, "rides": 1}]
+
+
+def test_reports_on_missing_snapshot_are_empty(tmp_path):
+    assert demand_report(snapshot_dir=tmp_path).num_rows == 0
\ No newline at end of file
@@ -0,0 +1,137 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from scripts import auth_log_index as idx
+
+
+def _json_line(ts, outcome, email, action="login"):
+    return json.dumps({"ts": ts, "level": "INFO", "action": action, "outcome": outcome,
+                       "user_id": 1, "email": email, "message": ""}) + "\n"
+
+
+def _legacy_line(ts, outcome, email, action="LOGIN"):
+    return f"{ts},395 - INFO - {action} - {outcome} - Email: {email} - Role: driver - msg\n"
+
+
+def _write(path, lines, mode="w"):
+    with open(path, mode, encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+def test_parses_legacy_and_jsonl_lines(tmp_path):
+    legacy = tmp_path / "auth_activity.log"
+    active = tmp_path / "auth_activity.jsonl"
+    _write(legacy, [
+        _legacy_line("2025-10-31 02:40:40", "SUCCESS", "a@b.com"),
+        _legacy_line("2025-10-31 02:41:10", "FAILURE", "a@b.com"),
+        _legacy_line("2025-10-31 02:42:00", "SUCCESS", "a@b.com", action="SIGNUP"),
+        "not a log line\n",
+    ])
+    _write(active, [
+        _json_line("2026-10-19T11:38:45.785", "success", "c@d.com"),
+        _json_line("2026-10-19T11:39:02.001", "failure", "c@d.com"),
+    ])
+    index = idx.load_index(str(tmp_path / "index.json"))
+
+    assert idx.update_index(index, idx.log_files(str(tmp_path), str(legacy))) == 2
+
+    assert idx.logins_per_hour(index) == [("2025-10-31T02", 1, 1), ("2026-10-19T11", 1, 1)]
+
+
+def test_json_lines_parse_in_any_key_order(tmp_path):
+    active = tmp_path / "auth_activity.jsonl"
+    _write(active, [
+        json.dumps({"email": "a@b.com", "outcome": "failure", "action": "login",
+                    "ts": "2026-10-19T11:38:45.785", "level": "INFO"}, separators=(",", ":")) + "\n",
+        json.dumps({"message": "login page", "email": "a@b.com", "action": "signup", "outcome": "success",
+                    "ts": "2026-10-19T11:40:00.000"}) + "\n",
+        '{"ts": "2026-10-19T11:41:00.000", "action": "login", "outcome": \n',
+    ])
+    index = idx.load_index(str(tmp_path / "index.json"))
+    idx.update_index(index, [str(active)])
+
+    assert idx.logins_per_hour(index) == [("2026-10-19T11", 0, 1)]
+    assert idx.top_users(index, by_failures=True) == [("a@b.com", 0, 1, "2026-10-19T11")]
+
+
+def test_resumes_from_saved_offset(tmp_path):
+    active = tmp_path / "auth_activity.jsonl"
+    index_path = str(tmp_path / "index.json")
+    _write(active, [_json_line("2026-10-19T11:00:00.000", "success", "a@b.com")])
+    index = idx.load_index(index_path)
+    idx.update_index(index, [str(active)])
+    idx.save_index(index, index_path)
+
+    # a partially written line is left for the next run
+    _write(active, [_json_line("2026-10-19T11:05:00.000", "success", "a@b.com"), '{"ts": "2026'], mode="a")
+    index = idx.load_index(index_path)
+    assert idx.update_index(index, [str(active)]) == 1
+    (entry,) = index["entries"].values()
+    assert entry["offset"] < os.path.getsize(active)
+
+    _write(active, ['-10-19T11:06:00.000", "level": "INFO", "action": "login", "outcome": "failure", '
+                    '"user_id": 1, "email": "a@b.com"}\n'], mode="a")
+    assert idx.update_index(index, [str(active)]) == 1
+    assert idx.update_index(index, [str(active)]) == 0  # nothing new
+    assert idx.logins_per_hour(index) == [("2026-10-19T11", 2, 1)]
+
+
+def test_rotated_gz_is_recognised_by_fingerprint(tmp_path):
+    active = tmp_path / "auth_activity.jsonl"
+    lines = [_json_line("2026-10-19T11:00:00.000", "success", "a@b.com"),
+             _json_line("2026-10-19T11:01:00.000", "failure", "a@b.com")]
+    _write(active, lines[:1])
+    index = idx.load_index(str(tmp_path / "index.json"))
+    idx.update_index(index, idx.log_files(str(tmp_path), None))
+
+    # the segment grows, then rotates and is gzipped under a new name
+    _write(active, lines[1:], mode="a")
+    rotated = str(active) + ".20261019-120000-000000.gz"
+    with open(active, "rb") as src, gzip.open(rotated, "wb") as dst:
+        dst.write(src.read())
+    os.remove(active)
+
+    assert idx.log_files(str(tmp_path), None) == [rotated]
+    idx.update_index(index, idx.log_files(str(tmp_path), None))
+
+    (entry,) = index["entries"].values()
+    assert entry["complete"] is True
+    assert entry["path"] == rotated
+    assert idx.logins_per_hour(index) == [("2026-10-19T11", 1, 1)]
+    assert idx.update_index(index, [rotated]) == 0
+
+
+@pytest.fixture
+def busy_index(tmp_path):
+    lines = [_json_line(f"2026-10-18T09:{m:02d}:00.000", "failure", "x@y.com") for m in range(3)]
+    lines += [_json_line("2026-10-19T10:00:00.000", "success", "a@b.com") for _ in range(3)]
+    lines += [_json_line("2026-10-19T10:30:00.000", "success", "c@d.com")]
+    lines += [_json_line("2026-10-19T11:15:30.000", "failure", "x@y.com") for _ in range(9)]
+    active = tmp_path / "auth_activity.jsonl"
+    _write(active, lines)
+    index = idx.load_index(str(tmp_path / "index.json"))
+    idx.update_index(index, [str(active)])
+    return index
+
+
+def test_per_hour_filters_by_day(busy_index):
+    assert idx.logins_per_hour(busy_index, day="2026-10-19") == [("2026-10-19T10", 4, 0), ("2026-10-19T11", 0, 9)]
+
+
+def test_top_users_by_success_and_failures(busy_index):
+    assert idx.top_users(busy_index, n=2) == [("a@b.com", 3, 0, "2026-10-19T10"), ("c@d.com", 1, 0, "2026-10-19T10")]
+    assert idx.top_users(busy_index, by_failures=True) == [("x@y.com", 0, 12, "2026-10-19T11")]
+
+
+def test_failed_spikes(busy_index):
+    assert idx.failed_login_spikes(busy_index, threshold=5) == [("2026-10-19T11:15", 9)]
+    assert idx.failed_login_spikes(busy_index, threshold=1)[-1][1] == 1
+
+
+def test_lines_for_day_seeks_to_the_day(busy_index):
+    lines = list(idx.lines_for_day(busy_index, "2026-10-18"))
+    assert len(lines) == 3
+    assert all('"2026-10-18T09' in line for line in lines)
\ No newline at end of file
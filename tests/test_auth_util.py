@@ -7,11 +7,14 @@ from auth.auth_util import (
     check_password,
     is_valid_email,
     is_valid_password,
-    load_users,
     save_user,
     authenticate_user,
     update_last_login,
+    LoginBusy,
+    LoginThrottled,
 )
+from auth import password_pool
+from auth.rate_limiter import SlidingWindowLimiter
  
 
 def test_hash_password_generates_valid_hash():
@@ -48,6 +51,12 @@ def test_is_valid_password():
     assert not is_valid_password("Abc12")             # Too short
  
  
+@pytest.fixture(autouse=True)
+def inline_password_pool(mocker):
+    """bcrypt on the test thread: no auth worker processes are started."""
+    mocker.patch.object(password_pool, "AUTH_POOL_SIZE", 0)
+
+
 @pytest.fixture
 def mock_db(mocker):
     """Mock get_cursor() to avoid real DB."""
@@ -58,21 +67,6 @@ def mock_db(mocker):
     return mock_conn, mock_cursor
  
  
-def test_load_users(mock_db):
-    mock_conn, mock_cursor = mock_db
-    mock_cursor.fetchall.return_value = [
-        {"email": "one@test.com", "user_id": 1},
-        {"email": "two@test.com", "user_id": 2},
-    ]
- 
-    result = load_users()
- 
-    assert "one@test.com" in result
-    assert "two@test.com" in result
-    assert result["one@test.com"]["user_id"] == 1
- 
- 
- 
 def test_save_user_success(mock_db, mocker):
     mock_conn, mock_cursor = mock_db
  
@@ -135,4 +129,77 @@ def test_update_last_login(mock_db):
     update_last_login(5)
  
     mock_cursor.execute.assert_called_once()
-    mock_conn.commit.assert_called_once()
\ No newline at end of file
+    mock_conn.commit.assert_called_once()
+
+def test_authenticate_user_rehashes_outdated_cost(mock_db, mocker):
+    mock_conn, mock_cursor = mock_db
+
+    mock_cursor.fetchone.return_value = {
+        "user_id": 3,
+        "email": "old@test.com",
+        "password": "$2b$04$abcdefghijklmnopqrstuu",
+        "role": "driver",
+    }
+    mocker.patch("auth.auth_util.check_password", return_value=True)
+    mocker.patch("auth.auth_util.hash_password", return_value="$2b$12$newhash")
+
+    user = authenticate_user("old@test.com", "Abcd1234")
+
+    assert user["user_id"] == 3
+    assert "password" not in user
+    sql, params = mock_cursor.execute.call_args_list[-1][0]
+    assert "password" in sql
+    assert params[1] == "$2b$12$newhash"
+
+
+def test_authenticate_user_single_connection(mock_db, mocker):
+    mock_conn, mock_cursor = mock_db
+
+    mock_cursor.fetchone.return_value = {
+        "user_id": 1,
+        "email": "test@test.com",
+        "password": hash_password("Abcd1234"),
+        "role": "passenger",
+    }
+    get_cursor = mocker.patch("auth.auth_util.get_cursor", return_value=(mock_conn, mock_cursor))
+
+    user = authenticate_user("test@test.com", "Abcd1234")
+
+    assert user["user_id"] == 1
+    assert get_cursor.call_count == 1
+    assert "SELECT *" not in mock_cursor.execute.call_args_list[0][0][0]
+    assert mock_cursor.execute.call_count == 2
+    mock_conn.commit.assert_called_once()
+
+
+def test_authenticate_user_throttled_before_db(mock_db, mocker):
+    mock_conn, mock_cursor = mock_db
+    mocker.patch("auth.auth_util._email_limiter", SlidingWindowLimiter(2, 60))
+    mocker.patch("auth.auth_util._client_limiter", SlidingWindowLimiter(100, 60))
+    check = mocker.patch("auth.auth_util.check_password", return_value=False)
+    mock_cursor.fetchone.return_value = {"user_id": 1, "password": "x", "role": "driver"}
+
+    assert authenticate_user("victim@test.com", "bad", client="10.0.0.1") is None
+    assert authenticate_user("victim@test.com", "bad", client="10.0.0.1") is None
+
+    with pytest.raises(LoginThrottled):
+        authenticate_user("victim@test.com", "bad", client="10.0.0.1")
+    assert check.call_count == 2
+    assert mock_cursor.execute.call_count == 2
+
+    # same email from another client is unaffected
+    assert authenticate_user("victim@test.com", "bad", client="10.0.0.2") is None
+
+
+def test_authenticate_user_busy_pool_is_not_a_failed_attempt(mock_db, mocker):
+    mock_conn, mock_cursor = mock_db
+    limiter = SlidingWindowLimiter(1, 60)
+    mocker.patch("auth.auth_util._email_limiter", limiter)
+    mocker.patch("auth.auth_util._client_limiter", SlidingWindowLimiter(100, 60))
+    mocker.patch("auth.auth_util.check_password", side_effect=password_pool.AuthPoolBusy("busy"))
+    mock_cursor.fetchone.return_value = {"user_id": 1, "password": "x", "role": "driver"}
+
+    with pytest.raises(LoginBusy):
+        authenticate_user("user@test.com", "Abcd1234", client="10.0.0.1")
+    assert len(limiter) == 0
+    mock_conn.close.assert_called_once()
@@ -0,0 +1,189 @@
+import datetime
+import pyarrow as pa
+import pytest
+import tracemalloc
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+from utils import db_connection
+from utils.db_connection import (
+    arrow_table,
+    get_connection,
+    iter_query,
+    json_value,
+    note_write,
+    read_only,
+    row_adapter,
+    run_query_arrow,
+    use_primary,
+)
+
+
+def _cursor(names, rows):
+    cursor = MagicMock()
+    cursor.description = [(name,) for name in names]
+    cursor.fetchall.return_value = rows
+    return cursor
+
+
+def test_arrow_table_builds_typed_columns():
+    cursor = _cursor(["day", "earnings", "rides"], [
+        (datetime.date(2025, 11, 1), Decimal("120.50"), 2),
+        (datetime.date(2025, 11, 2), None, 1),
+    ])
+
+    table = arrow_table(cursor, {"earnings": pa.float64()})
+
+    assert table.schema.field("day").type == pa.date32()
+    assert table.schema.field("earnings").type == pa.float64()
+    assert table.column("earnings").to_pylist() == [120.5, None]
+    assert table.column("rides").to_pylist() == [2, 1]
+
+
+def test_arrow_table_empty_result_keeps_columns_and_types():
+    table = arrow_table(_cursor(["start_time", "status"], []), {"start_time": pa.timestamp("s")})
+
+    assert table.num_rows == 0
+    assert table.column_names == ["start_time", "status"]
+    assert table.schema.field("start_time").type == pa.timestamp("s")
+
+
+def test_run_query_arrow_uses_tuple_cursor(mocker):
+    conn = MagicMock()
+    cursor = _cursor(["status", "count"], [("completed", 3)])
+    conn.cursor.return_value.__enter__.return_value = cursor
+    mocker.patch("utils.db_connection.get_connection", return_value=conn)
+
+    table = run_query_arrow("SELECT status, COUNT(*) AS count FROM rides GROUP BY status")
+
+    assert table.to_pylist() == [{"status": "completed", "count": 3}]
+    assert conn.cursor.call_args[0][0].__name__ == "Cursor"
+    assert conn.close.called
+
+
+@pytest.fixture
+def replicas(monkeypatch):
+    """Two replicas and a primary whose connections are just their host names; lag per host is configurable."""
+    lag = {"r1:3307": 0.0, "r2:3308": 0.0}
+    monkeypatch.setattr(db_connection, "DB_REPLICA_HOSTS", list(lag))
+    monkeypatch.setattr(db_connection, "_replica_health", {})
+    monkeypatch.setattr(db_connection, "_last_write", {})
+    monkeypatch.setattr(db_connection, "_session_key", lambda: "session-1")
+    monkeypatch.setenv("DB_HOST", "primary")
+    monkeypatch.setattr(db_connection, "_connect", lambda host, *args, **kwargs: MagicMock(host=host))
+    monkeypatch.setattr(db_connection, "_replica_lag", lambda conn: lag[conn.host])
+    return lag
+
+
+def test_reads_go_to_primary_unless_marked_read_only(replicas):
+    assert get_connection().host == "primary"
+
+    @read_only
+    def load():
+        return get_connection().host
+
+    assert {load(), load()} == {"r1:3307", "r2:3308"}
+    assert get_connection(read_only=True).host in replicas
+
+
+def test_session_is_pinned_to_primary_after_its_own_write(replicas, monkeypatch):
+    note_write()
+    assert get_connection(read_only=True).host == "primary"
+    assert db_connection.pinned_to_primary("other-session") is False
+
+    monkeypatch.setattr(db_connection, "READ_YOUR_WRITES_SECONDS", 0)
+    assert get_connection(read_only=True).host in replicas
+
+
+def test_lagging_replica_is_skipped_until_it_recovers(replicas, monkeypatch):
+    replicas["r1:3307"] = 120.0
+    replicas["r2:3308"] = None  # replication stopped
+
+    assert get_connection(read_only=True).host == "primary"
+    status = {row["host"]: row for row in db_connection.replica_status()}
+    assert status["r1:3307"]["healthy"] is False and status["r1:3307"]["error"] == "lagging 120s"
+    assert status["r2:3308"]["error"] == "replication stopped"
+
+    replicas["r1:3307"] = 1.0
+    assert get_connection(read_only=True).host == "primary"  # still inside the check interval
+    monkeypatch.setattr(db_connection, "REPLICA_CHECK_INTERVAL", 0)
+    assert get_connection(read_only=True).host == "r1:3307"
+
+
+def test_use_primary_overrides_read_only(replicas):
+    with use_primary():
+        assert get_connection(read_only=True).host == "primary"
+
+
+
+@pytest.fixture
+def stream_db(mocker):
+    conn = MagicMock()
+    cursor = MagicMock()
+    cursor.fetchmany.return_value = []
+    conn.cursor.return_value = cursor
+    mocker.patch("utils.db_connection.get_connection", return_value=conn)
+    return conn, cursor
+
+
+def test_iter_query_fetches_lazily_in_batches(stream_db):
+    conn, cursor = stream_db
+    cursor.fetchmany.side_effect = [[{"id": 1}, {"id": 2}], [{"id": 3}], []]
+
+    rows = iter_query("SELECT id FROM rides", batch_size=2)
+    assert not conn.cursor.called
+
+    assert next(rows) == {"id": 1}
+    assert conn.cursor.call_args[0][0].__name__ == "SSDictCursor"
+    assert [r["id"] for r in rows] == [2, 3]
+    cursor.fetchmany.assert_called_with(2)
+    assert cursor.close.called and conn.close.called
+
+
+def test_iter_query_abandoned_early_drops_connection_without_draining(stream_db):
+    conn, cursor = stream_db
+    cursor.fetchmany.side_effect = [[(1,), (2,)], [(3,)], []]
+
+    rows = iter_query("SELECT id FROM rides", batch_size=2, dict_rows=False)
+    assert next(rows) == (1,)
+    rows.close()
+
+    assert conn.cursor.call_args[0][0].__name__ == "SSCursor"
+    assert not cursor.close.called
+    assert conn.close.called
+
+
+def test_iter_query_resolves_read_only_when_called(stream_db):
+    get_conn = db_connection.get_connection
+
+    @read_only
+    def stream():
+        return iter_query("SELECT 1")
+
+    list(stream())
+    get_conn.assert_called_once_with(True)
+
+
+def test_iter_query_peak_memory_does_not_grow_with_result_size(stream_db):
+    _, cursor = stream_db
+
+    def peak(total):
+        batches = iter([{"ride_id": i, "status": "completed" * 4} for i in range(start, min(start + 500, total))]
+                       for start in range(0, total, 500))
+        cursor.fetchmany.side_effect = lambda n: next(batches, [])
+        tracemalloc.start()
+        for _ in iter_query("SELECT * FROM rides", batch_size=500):
+            pass
+        _, top = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return top
+
+    assert peak(50_000) < peak(5_000) * 2
+
+
+def test_row_adapter_converts_columns_and_builds_objects():
+    adapt = row_adapter({"total_fare": float, "coordinates": json_value}, factory=lambda **row: row)
+
+    row = adapt({"total_fare": Decimal("12.50"), "coordinates": b"[[72.5, 19.1]]", "status": None})
+
+    assert row == {"total_fare": 12.5, "coordinates": [[72.5, 19.1]], "status": None}
@@ -0,0 +1,83 @@
+import pytest
+from unittest.mock import MagicMock
+
+from auth import user_repository
+from auth.identity import (
+    Identity,
+    SESSION_KEY,
+    current_identity,
+    refresh_identity,
+    remember_identity,
+    resolve_identity,
+)
+
+
+@pytest.fixture
+def mock_db(mocker):
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mocker.patch("auth.user_repository.get_connection", return_value=mock_conn)
+    user_repository.invalidate()
+    yield mock_conn, mock_cursor
+    user_repository.invalidate()
+
+
+def test_identity_from_login_row():
+    identity = Identity.from_row({"user_id": 3, "name": "A", "email": "a@test.com", "role": "Driver",
+                                  "driver_id": 11, "passenger_id": None})
+
+    assert identity.is_driver and not identity.is_passenger
+    assert identity.role == "driver"
+    assert identity.roles == {"driver"}
+
+
+def test_identity_roles_follow_existing_profiles():
+    identity = Identity(user_id=1, name="B", email="b@test.com", role="both", driver_id=2, passenger_id=5)
+    assert identity.roles == {"driver", "passenger"}
+
+
+def test_resolve_identity_single_query(mock_db):
+    _, cursor = mock_db
+    cursor.fetchone.return_value = {"user_id": 4, "name": "C", "email": "c@test.com", "role": "passenger",
+                                    "driver_id": None, "passenger_id": 9}
+
+    identity = resolve_identity(4)
+
+    assert identity.passenger_id == 9
+    assert cursor.execute.call_count == 1
+    assert "LEFT JOIN drivers" in cursor.execute.call_args[0][0]
+
+
+def test_resolve_identity_without_database(mocker):
+    mocker.patch("auth.user_repository.get_connection", return_value=None)
+    user_repository.invalidate()
+
+    assert resolve_identity(4) is None
+
+
+def test_current_identity_reuses_session_copy(mock_db):
+    _, cursor = mock_db
+    session = {"user": {"user_id": 4, "role": "passenger"}}
+    remember_identity(Identity(user_id=4, name="C", email="c@test.com", role="passenger", passenger_id=9), session)
+
+    assert current_identity(session).passenger_id == 9
+    cursor.execute.assert_not_called()
+
+
+def test_current_identity_refreshes_on_role_change(mock_db):
+    _, cursor = mock_db
+    session = {"user": {"user_id": 4, "role": "both"}}
+    remember_identity(Identity(user_id=4, name="C", email="c@test.com", role="passenger", passenger_id=9), session)
+    cursor.fetchone.return_value = {"user_id": 4, "name": "C", "email": "c@test.com", "role": "both",
+                                    "driver_id": 12, "passenger_id": 9}
+
+    identity = current_identity(session)
+
+    assert identity.driver_id == 12
+    assert session[SESSION_KEY] is identity
+    assert cursor.execute.call_count == 1
+
+
+def test_refresh_identity_without_user():
+    assert refresh_identity({}) is None
\ No newline at end of file
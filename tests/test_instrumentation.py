@@ -0,0 +1,88 @@
+import json
+import urllib.request
+from unittest.mock import MagicMock
+
+import pytest
+
+from utils import instrumentation, sql_registry
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics(monkeypatch):
+    monkeypatch.setattr(instrumentation, "INSTRUMENTATION_ENABLED", True)
+    monkeypatch.setattr(instrumentation, "INSTRUMENTATION_SAMPLE_RATE", 1.0)
+    instrumentation.reset()
+    yield
+    instrumentation.reset()
+
+
+def test_prometheus_buckets_are_cumulative():
+    for value in (0.002, 0.02, 3.0):
+        instrumentation.observe("db_query_seconds", value, statement="ride.transition")
+
+    text = instrumentation.render_prometheus()
+
+    assert "# TYPE db_query_seconds histogram" in text
+    assert 'db_query_seconds_bucket{statement="ride.transition",le="0.0025"} 1' in text
+    assert 'db_query_seconds_bucket{statement="ride.transition",le="0.025"} 2' in text
+    assert 'db_query_seconds_bucket{statement="ride.transition",le="+Inf"} 3' in text
+    assert 'db_query_seconds_count{statement="ride.transition"} 3' in text
+
+
+def test_timed_records_even_when_the_block_raises():
+    with pytest.raises(RuntimeError):
+        with instrumentation.timed("page_render_seconds", page="Offer"):
+            raise RuntimeError("rerun")
+
+    (series,) = instrumentation.snapshot()["series"]
+    assert series["labels"] == {"page": "Offer"}
+    assert series["count"] == 1
+
+
+def test_sample_rate_zero_records_nothing(monkeypatch):
+    monkeypatch.setattr(instrumentation, "INSTRUMENTATION_SAMPLE_RATE", 0.0)
+
+    with instrumentation.timed("page_render_seconds", page="Home"):
+        pass
+    sql_registry.execute(MagicMock(rowcount=1), "driver.id_by_user", (1,))
+
+    assert instrumentation.snapshot()["series"] == []
+
+
+def test_registered_statements_record_latency_and_rows():
+    sql_registry.execute(MagicMock(rowcount=4), "route.coordinates", (2,))
+
+    series = {s["metric"]: s for s in instrumentation.snapshot()["series"]}
+    assert series["db_query_seconds"]["labels"] == {"statement": "route.coordinates"}
+    assert series["db_query_rows"]["sum"] == 4
+
+
+def test_write_snapshot_and_http_endpoint(tmp_path):
+    instrumentation.observe("db_connect_seconds", 0.004, target="primary")
+
+    path = tmp_path / "metrics" / "snapshot.json"
+    instrumentation.write_snapshot(str(path))
+    assert json.loads(path.read_text())["series"][0]["p50"] == 0.005
+
+    server = instrumentation.start_http_server(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+        assert 'db_connect_seconds_count{target="primary"} 1' in body
+    finally:
+        server.shutdown()
+        server.server_close()
+        instrumentation._server = None
+
+
+def test_http_server_bind_failure_is_reported_once(mocker, capsys):
+    bind = mocker.patch.object(instrumentation, "ThreadingHTTPServer", side_effect=OSError("Address already in use"))
+    try:
+        assert instrumentation.start_http_server(port=9100) is None
+        assert instrumentation.start_http_server(port=9100) is None
+        assert bind.call_count == 1
+        out = capsys.readouterr().out.splitlines()
+        assert len(out) == 1
+        assert "Address already in use" in out[0]
+    finally:
+        instrumentation._server = None
\ No newline at end of file
@@ -0,0 +1,167 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+
+from utils import job_queue
+from utils.job_queue import (
+    backoff_seconds,
+    claim_jobs,
+    enqueue,
+    enqueue_due,
+    finish_job,
+    job,
+    requeue_stale,
+    run_job,
+)
+
+
+@pytest.fixture(autouse=True)
+def handlers(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(job_queue, "_handlers", registry)
+    return registry
+
+
+@pytest.fixture
+def mock_db(mocker):
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mocker.patch("utils.job_queue.get_connection", return_value=mock_conn)
+    return mock_conn, mock_cursor
+
+
+def test_enqueue_uses_registered_max_attempts(mock_db):
+    conn, cursor = mock_db
+    cursor.lastrowid = 42
+    job("send", max_attempts=2)(lambda payload: None)
+
+    assert enqueue("send", {"to": 1}, priority=3, delay=60) == 42
+    params = cursor.execute.call_args[0][1]
+    assert params == ("send", json.dumps({"to": 1}), 3, 2, None, 60)
+    assert conn.commit.called
+
+
+def test_enqueue_on_callers_cursor_does_not_commit(mock_db):
+    conn, _ = mock_db
+    cursor = MagicMock(lastrowid=7)
+
+    assert enqueue("send", cursor=cursor) == 7
+    assert cursor.execute.called
+    assert not conn.commit.called
+
+
+def test_claim_skips_locked_rows_and_respects_concurrency():
+    job("rebuild", concurrency=1)(lambda payload: None)
+    job("send")(lambda payload: None)
+    conn, cursor = MagicMock(), MagicMock()
+    conn.cursor.return_value = cursor
+    cursor.fetchall.side_effect = [
+        [],  # nothing running yet
+        [
+            {"job_id": 1, "job_type": "rebuild", "payload": None, "attempts": 0, "max_attempts": 5},
+            {"job_id": 2, "job_type": "rebuild", "payload": None, "attempts": 0, "max_attempts": 5},
+            {"job_id": 3, "job_type": "send", "payload": '{"to": 9}', "attempts": 1, "max_attempts": 5},
+        ],
+    ]
+
+    claimed = claim_jobs(conn, "w1", limit=10)
+
+    _, select, update = [c[0][0] for c in cursor.execute.call_args_list]
+    assert "FOR UPDATE SKIP LOCKED" in select
+    assert "ORDER BY priority DESC" in select
+    assert [row["job_id"] for row in claimed] == [1, 3]
+    assert cursor.execute.call_args_list[2][0][1] == ("w1", [1, 3])
+    assert claimed[1]["payload"] == {"to": 9} and claimed[1]["attempts"] == 2
+    assert conn.commit.called
+
+
+def test_claim_returns_nothing_when_type_is_at_its_limit():
+    job("rebuild", concurrency=1)(lambda payload: None)
+    conn, cursor = MagicMock(), MagicMock()
+    conn.cursor.return_value = cursor
+    cursor.fetchall.return_value = [{"job_type": "rebuild", "running": 1}]
+
+    assert claim_jobs(conn, "w1") == []
+    assert cursor.execute.call_count == 1
+
+
+def test_backoff_doubles_and_caps(monkeypatch):
+    monkeypatch.setattr(job_queue, "BACKOFF_BASE", 10)
+    monkeypatch.setattr(job_queue, "BACKOFF_CAP", 60)
+    assert [backoff_seconds(n) for n in (1, 2, 3, 4)] == [10, 20, 40, 60]
+
+
+def test_failed_job_is_retried_until_out_of_attempts():
+    conn, cursor = MagicMock(), MagicMock()
+    conn.cursor.return_value = cursor
+    row = {"job_id": 5, "job_type": "send", "attempts": 1, "max_attempts": 3}
+
+    assert finish_job(conn, row, error="boom") == "jobs_retried"
+    assert "status = 'queued'" in cursor.execute.call_args_list[0][0][0]
+    assert cursor.execute.call_args_list[0][0][1][1] == backoff_seconds(1)
+
+    cursor.reset_mock()
+    assert finish_job(conn, dict(row, attempts=3), error="boom") == "jobs_failed"
+    assert "status = 'failed'" in cursor.execute.call_args_list[0][0][0]
+    assert "metrics_totals" in cursor.executemany.call_args_list[-1][0][0]
+
+
+def test_run_job_records_handler_outcome():
+    calls = []
+    job("ok")(calls.append)
+    job("bad")(lambda payload: 1 / 0)
+    conn = MagicMock()
+
+    assert run_job(conn, {"job_id": 1, "job_type": "ok", "payload": {"a": 1}, "attempts": 1, "max_attempts": 5}) == "jobs_done"
+    assert calls == [{"a": 1}]
+    assert run_job(conn, {"job_id": 2, "job_type": "bad", "payload": None, "attempts": 1, "max_attempts": 5}) == "jobs_retried"
+
+
+def test_enqueue_due_fires_schedules_in_one_insert():
+    conn, cursor = MagicMock(), MagicMock()
+    conn.cursor.return_value = cursor
+    cursor.fetchall.return_value = [
+        {"name": "a", "job_type": "rebuild", "payload": None, "priority": 0},
+        {"name": "b", "job_type": "send", "payload": "{}", "priority": 1},
+    ]
+
+    assert enqueue_due(conn) == 2
+    select, update = [c[0][0] for c in cursor.execute.call_args_list]
+    assert "SKIP LOCKED" in select
+    insert, rows = cursor.executemany.call_args[0]
+    assert "INSERT INTO jobs" in insert
+    assert rows == [("rebuild", None, 0, 5), ("send", "{}", 1, 5)]
+    assert "interval_seconds" in update and cursor.execute.call_args_list[1][0][1] == (["a", "b"],)
+
+
+def test_requeue_stale():
+    conn, cursor = MagicMock(), MagicMock(rowcount=2)
+    conn.cursor.return_value = cursor
+
+    assert requeue_stale(conn, timeout=60) == 2
+    assert cursor.execute.call_args[0][1] == (60,)
+
+
+def test_run_worker_claims_each_job_just_before_running_it(mock_db, mocker):
+    rows = [{"job_id": i, "job_type": "send", "payload": None, "attempts": 1, "max_attempts": 5} for i in (1, 2)]
+    queue = [[rows[0]], [rows[1]], []]
+    events = []
+
+    def claim(conn, worker_id, limit, job_types):
+        events.append(("claim", limit))
+        return queue.pop(0)
+
+    def run(conn, job_row):
+        events.append(("run", job_row["job_id"]))
+        return "jobs_done"
+
+    mocker.patch("utils.job_queue.claim_jobs", side_effect=claim)
+    mocker.patch("utils.job_queue.run_job", side_effect=run)
+    mocker.patch("utils.job_queue.enqueue_due")
+    mocker.patch("utils.job_queue.requeue_stale")
+
+    counts = job_queue.run_worker("w1", batch_size=10, once=True, report_every=0)
+
+    assert events == [("claim", 1), ("run", 1), ("claim", 1), ("run", 2), ("claim", 1)]
+    assert counts["jobs_done"] == 2
\ No newline at end of file
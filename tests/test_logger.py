@@ -0,0 +1,43 @@
+import os
+import time
+
+from scripts.logger import RotatingGzipHandler
+
+
+def test_rollover_clock_starts_from_existing_file_mtime(tmp_path):
+    path = tmp_path / "activity.jsonl"
+    path.write_text("{}\n")
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+
+    handler = RotatingGzipHandler(str(path), max_bytes=0, rotate_seconds=600, backup_count=2)
+
+    assert abs(handler.rollover_at - (old + 600)) < 1
+    assert handler.shouldRollover(None)
+
+
+def test_rollover_clock_starts_now_without_a_file(tmp_path):
+    before = time.time()
+    handler = RotatingGzipHandler(str(tmp_path / "activity.jsonl"), max_bytes=0, rotate_seconds=600, backup_count=2)
+
+    assert before + 600 <= handler.rollover_at <= time.time() + 600
+
+def test_listener_starts_on_first_use(tmp_path, monkeypatch):
+    import atexit
+    import logging
+    from scripts import logger
+
+    activity_logger = logging.getLogger("carpool.activity")
+    monkeypatch.setattr(logger, "LOG_DIR", str(tmp_path / "logs"))
+    monkeypatch.setattr(logger, "LOG_FILE", str(tmp_path / "logs" / "activity.jsonl"))
+    monkeypatch.setattr(activity_logger, "handlers", [])
+    monkeypatch.setattr(activity_logger, "_listener", None, raising=False)
+    assert not (tmp_path / "logs").exists()
+
+    logger.log_user_action("login", "a@test.com")
+    listener = activity_logger._listener
+    listener.stop()
+    atexit.unregister(listener.stop)
+
+    assert logger.get_logger() is activity_logger
+    assert '"action": "login"' in (tmp_path / "logs" / "activity.jsonl").read_text()
\ No newline at end of file
@@ -0,0 +1,207 @@
+import datetime
+import pytest
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+from utils.metrics_rollup import (
+    record_metrics,
+    ride_created_events,
+    ride_status_events,
+    get_totals,
+    get_series,
+    rebuild_metrics,
+    REBUILT_SERIES,
+    REBUILT_TOTALS,
+    record_driver_ride,
+    record_ride_start,
+    get_driver_stats,
+    get_driver_daily_stats,
+    get_driver_leaderboard,
+)
+
+
+@pytest.fixture
+def mock_db(mocker):
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mocker.patch("utils.metrics_rollup.get_connection", return_value=mock_conn)
+    return mock_conn, mock_cursor
+
+
+def test_record_metrics_batches_events_per_table():
+    cursor = MagicMock()
+    at = datetime.datetime(2025, 11, 3, 14, 37, 5)
+
+    record_metrics(cursor, ride_status_events("active", "completed", 250), at=at)
+
+    assert cursor.executemany.call_count == 3
+    hourly, daily, totals = [c[0] for c in cursor.executemany.call_args_list]
+    assert "metrics_hourly" in hourly[0] and hourly[1][0][0] == datetime.datetime(2025, 11, 3, 14)
+    assert "metrics_daily" in daily[0] and daily[1][0][0] == datetime.date(2025, 11, 3)
+    assert "metrics_totals" in totals[0]
+    assert totals[1] == [("rides_by_status", "active", -1.0), ("rides_by_status", "completed", 1.0),
+                         ("ride_transitions", "completed", 1.0), ("revenue", "", 250.0)]
+
+
+def test_record_metrics_skips_empty():
+    cursor = MagicMock()
+    record_metrics(cursor, [])
+    cursor.executemany.assert_not_called()
+
+
+def test_ride_created_events_use_route_dimension():
+    assert ("route_volume", 4, 1) in ride_created_events("booked", 4)
+    assert ("rides_by_status", "booked", 1) in ride_created_events("booked", 4)
+
+
+def test_record_ride_start_moves_counts_between_start_buckets():
+    cursor = MagicMock()
+    booked, started = datetime.datetime(2025, 11, 3, 9, 10), datetime.datetime(2025, 11, 4, 8, 5)
+
+    record_ride_start(cursor, 4, booked, started)
+
+    hourly, daily = [c[0] for c in cursor.executemany.call_args_list]
+    assert "metrics_hourly" in hourly[0]
+    assert hourly[1] == [(datetime.datetime(2025, 11, 3, 9), "rides", "", -1),
+                         (datetime.datetime(2025, 11, 3, 9), "route_volume", "4", -1),
+                         (datetime.datetime(2025, 11, 4, 8), "rides", "", 1),
+                         (datetime.datetime(2025, 11, 4, 8), "route_volume", "4", 1)]
+    assert {row[0] for row in daily[1]} == {datetime.date(2025, 11, 3), datetime.date(2025, 11, 4)}
+
+
+def test_incremental_and_rebuilt_driver_stats_bucket_by_the_same_day(mock_db):
+    _, cursor = mock_db
+    incremental = MagicMock()
+    record_driver_ride(incremental, 7, "booked", "cancelled")
+
+    assert rebuild_metrics() is True
+
+    (rebuilt,) = [c[0][0] for c in cursor.execute.call_args_list if "INSERT INTO driver_daily_stats" in c[0][0]]
+    day = "DATE(COALESCE(r.end_time, r.start_time))"
+    assert day in incremental.execute.call_args[0][0] and day in rebuilt
+    assert "CURDATE()" not in incremental.execute.call_args[0][0]
+
+
+def test_revenue_only_on_completion():
+    assert not any(m == "revenue" for m, _, _ in ride_status_events("booked", "cancelled", 250))
+
+
+def test_get_totals_groups_by_metric(mock_db):
+    _, cursor = mock_db
+    cursor.fetchall.return_value = [
+        {"metric": "rides", "dimension": "", "value": Decimal("12")},
+        {"metric": "rides_by_status", "dimension": "completed", "value": Decimal("5")},
+    ]
+
+    totals = get_totals()
+    assert totals["rides"][""] == 12.0
+    assert totals["rides_by_status"] == {"completed": 5.0}
+    assert "FROM rides" not in cursor.execute.call_args[0][0]
+
+
+def test_get_series_reads_daily_rollup(mock_db):
+    _, cursor = mock_db
+    cursor.fetchall.return_value = [{"bucket": datetime.date(2025, 11, 3), "metric": "rides",
+                                     "dimension": "", "value": Decimal("3")}]
+
+    rows = get_series(["rides", "revenue"], days=7)
+    assert rows[0]["value"] == 3.0
+    assert "FROM metrics_daily" in cursor.execute.call_args[0][0]
+
+
+def test_record_driver_ride_completion_updates_total_rides():
+    cursor = MagicMock()
+    record_driver_ride(cursor, 7, "active", "completed")
+
+    upsert, total = cursor.execute.call_args_list
+    assert "INSERT INTO driver_daily_stats" in upsert[0][0]
+    assert upsert[0][1] == (1, 1, 0, 1, 1, 7)
+    assert "total_rides = d.total_rides + 1" in total[0][0]
+
+
+def test_record_driver_ride_cancellation_counts_only_cancel():
+    cursor = MagicMock()
+    record_driver_ride(cursor, 7, "booked", "cancelled")
+
+    assert cursor.execute.call_count == 1
+    assert cursor.execute.call_args[0][1] == (0, 0, 1, 0, 0, 7)
+
+
+def test_record_driver_ride_ignores_repeat_or_non_terminal():
+    cursor = MagicMock()
+    record_driver_ride(cursor, 7, "completed", "completed")
+    record_driver_ride(cursor, 7, "booked", "active")
+    cursor.execute.assert_not_called()
+
+
+def test_get_driver_stats_reads_rollup(mock_db):
+    _, cursor = mock_db
+    cursor.fetchone.return_value = {"earnings": Decimal("1200.50"), "completed_rides": Decimal("4"),
+                                    "cancelled_rides": Decimal("1"), "seats_filled": Decimal("9"),
+                                    "km_driven": Decimal("310")}
+
+    stats = get_driver_stats(3)
+    assert stats["earnings"] == 1200.5 and stats["completed_rides"] == 4
+    assert "FROM driver_daily_stats" in cursor.execute.call_args[0][0]
+    assert "FROM rides" not in cursor.execute.call_args[0][0]
+
+
+def test_get_driver_daily_stats_returns_arrow(mock_db):
+    _, cursor = mock_db
+    cursor.description = [("day",), ("earnings",), ("completed_rides",), ("cancelled_rides",),
+                          ("seats_filled",), ("km_driven",)]
+    cursor.fetchall.return_value = [(datetime.date(2025, 11, 3), Decimal("450.00"), 3, 0, 5, Decimal("120.5"))]
+
+    daily = get_driver_daily_stats(3, days=7)
+    assert daily.num_rows == 1
+    assert daily.to_pylist()[0]["earnings"] == 450.0
+    assert str(daily.schema.field("km_driven").type) == "double"
+
+
+def test_get_driver_leaderboard_rejects_unknown_column(mock_db):
+    with pytest.raises(ValueError):
+        get_driver_leaderboard(order_by="1; DROP TABLE rides")
+
+
+def test_get_driver_leaderboard_orders_by_column(mock_db):
+    _, cursor = mock_db
+    cursor.fetchall.return_value = [{"driver_id": 1, "km_driven": 50}]
+
+    assert get_driver_leaderboard(order_by="km_driven", days=None, limit=5) == [{"driver_id": 1, "km_driven": 50}]
+    query, params = cursor.execute.call_args[0]
+    assert "ORDER BY km_driven DESC" in query
+    assert params == (datetime.date.min, 5)
+
+
+def test_rebuild_metrics_rolls_back_on_error(mock_db):
+    conn, cursor = mock_db
+    cursor.execute.side_effect = Exception("db down")
+
+    assert rebuild_metrics() is False
+    assert conn.rollback.called
+
+
+def test_rebuild_metrics_sends_literal_hour_format(mock_db):
+    conn, cursor = mock_db
+
+    assert rebuild_metrics() is True
+
+    (call,) = [c for c in cursor.execute.call_args_list if "INSERT INTO metrics_hourly" in c[0][0]]
+    # no params, so PyMySQL sends the SQL as is: the format must already be single-%
+    assert len(call[0]) == 1
+    assert "DATE_FORMAT(r.start_time, '%Y-%m-%d %H:00:00')" in call[0][0]
+    assert "%%" not in call[0][0]
+    assert conn.commit.called
+
+def test_rebuild_metrics_only_deletes_what_it_rebuilds(mock_db):
+    _, cursor = mock_db
+
+    assert rebuild_metrics() is True
+
+    deletes = {c[0][0].split()[2]: c[0][1] for c in cursor.execute.call_args_list
+               if c[0][0].startswith("DELETE FROM metrics_")}
+    assert deletes["metrics_daily"] == (REBUILT_SERIES,)
+    assert deletes["metrics_totals"] == (REBUILT_TOTALS,)
+    for metrics in (REBUILT_SERIES, REBUILT_TOTALS):
+        assert "jobs_done" not in metrics and "ride_transitions" not in metrics
\ No newline at end of file
@@ -0,0 +1,68 @@
+import concurrent.futures
+import threading
+import pytest
+from unittest.mock import MagicMock
+
+from auth import password_pool
+
+
+@pytest.fixture(autouse=True)
+def inline_pool(mocker):
+    """Run bcrypt inline unless a test opts in; no worker processes are started."""
+    mocker.patch.object(password_pool, "AUTH_POOL_SIZE", 0)
+
+
+def test_hash_and_check_roundtrip():
+    hashed = password_pool.hash_password("Abcd1234", rounds=4)
+    assert password_pool.check_password("Abcd1234", hashed) is True
+    assert password_pool.check_password("Wrong1234", hashed) is False
+
+
+def test_check_password_malformed_hash():
+    assert password_pool.check_password("Abcd1234", "not-a-hash") is False
+
+
+def test_get_rounds_and_needs_rehash():
+    hashed = password_pool.hash_password("Abcd1234", rounds=4)
+    assert password_pool.get_rounds(hashed) == 4
+    assert password_pool.needs_rehash(hashed, rounds=4) is False
+    assert password_pool.needs_rehash(hashed, rounds=5) is True
+    assert password_pool.get_rounds("garbage") is None
+
+
+def test_run_inline_when_pool_disabled(mocker):
+    mocker.patch.object(password_pool, "AUTH_POOL_SIZE", 0)
+    fn = MagicMock(return_value="ok")
+    assert password_pool._run(fn, 1, 2) == "ok"
+    fn.assert_called_once_with(1, 2)
+
+
+def test_run_rejects_when_queue_full(mocker):
+    mocker.patch.object(password_pool, "AUTH_POOL_SIZE", 2)
+    mocker.patch.object(password_pool, "AUTH_POOL_TIMEOUT", 0.01)
+    slots = MagicMock()
+    slots.acquire.return_value = False
+    mocker.patch.object(password_pool, "_slots", slots)
+
+    with pytest.raises(password_pool.AuthPoolBusy):
+        password_pool._run(print)
+
+
+def test_run_timeout_is_reported_as_busy(mocker):
+    mocker.patch.object(password_pool, "AUTH_POOL_SIZE", 2)
+    mocker.patch.object(password_pool, "_slots", threading.BoundedSemaphore(1))
+    future = MagicMock()
+    future.result.side_effect = concurrent.futures.TimeoutError()
+    pool = MagicMock()
+    pool.submit.return_value = future
+    mocker.patch.object(password_pool, "_get_pool", return_value=pool)
+
+    with pytest.raises(password_pool.AuthPoolBusy):
+        password_pool._run(print)
+    future.cancel.assert_called_once()
+
+
+def test_benchmark_rounds_stops_at_target():
+    best, timings = password_pool.benchmark_rounds(target_ms=10_000, min_rounds=4, max_rounds=5, samples=1)
+    assert best == 5
+    assert set(timings) == {4, 5}
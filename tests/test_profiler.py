@@ -0,0 +1,70 @@
+import os
+import pstats
+
+import pymysql
+import pytest
+
+from utils import profiler
+from utils.db_connection import ObservedConnection
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _busy():
+    return sum(i * i for i in range(20000))
+
+
+def test_not_requested_runs_block_without_profiling(profile_dir):
+    session = {}
+    with profiler.profile_rerun("Offer", session=session, params={}):
+        _busy()
+
+    assert profiler.PROFILE_REPORT not in session
+    assert os.listdir(profile_dir) == []
+
+
+def test_requested_rerun_saves_pstats_and_is_one_shot(profile_dir):
+    session = {}
+    profiler.request_profile(session)
+    with profiler.profile_rerun("Map", session=session, params={}):
+        _busy()
+
+    report = session[profiler.PROFILE_REPORT]
+    assert report["page"] == "Map"
+    assert report["path"].endswith("-map.pstats")
+    assert pstats.Stats(report["path"]).total_calls > 0
+    assert any("_busy" in row["function"] for row in report["top"])
+    assert profiler.PROFILE_FLAG not in session
+
+    del session[profiler.PROFILE_REPORT]
+    with profiler.profile_rerun("Map", session=session, params={}):
+        pass
+    assert profiler.PROFILE_REPORT not in session
+
+
+def test_query_param_needs_an_admin(profile_dir, mocker):
+    mocker.patch("auth.identity.current_identity", return_value=None)
+    session = {}
+    with profiler.profile_rerun("Home", session=session, params={"profile": "1"}):
+        pass
+    assert profiler.PROFILE_REPORT not in session
+
+
+def test_db_time_is_attributed_to_the_ride_utils_caller(profile_dir, mocker):
+    mocker.patch.object(pymysql.connections.Connection, "query", return_value=1)
+    conn = ObservedConnection.__new__(ObservedConnection)
+    scope = {"__name__": "utils.ride_utils", "conn": conn}
+    exec("def get_open_ride_requests():\n    conn.query('SELECT 1')\n    conn.query('SELECT 2')", scope)
+
+    session = {}
+    profiler.request_profile(session)
+    with profiler.profile_rerun("Offer", session=session, params={}):
+        scope["get_open_ride_requests"]()
+
+    (row,) = session[profiler.PROFILE_REPORT]["db"]
+    assert row["function"] == "get_open_ride_requests"
+    assert row["queries"] == 2
\ No newline at end of file
@@ -0,0 +1,74 @@
+import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from utils import query_cache, ride_utils
+from utils.query_budget import QueryBudgetExceeded, assert_query_budget, record_queries
+from utils.ride_utils import get_driver_id, get_ride_history
+
+
+@pytest.fixture(autouse=True)
+def clear_query_cache():
+    query_cache.clear()
+    yield
+    query_cache.clear()
+
+
+@pytest.fixture
+def mock_db(mocker):
+    conn = MagicMock()
+    cursor = MagicMock()
+    conn.cursor.return_value = cursor
+    cursor.fetchmany.return_value = []
+    mocker.patch("utils.ride_utils.get_connection", return_value=conn)
+    mocker.patch("utils.db_connection.get_connection", return_value=conn)
+    return conn, cursor
+
+
+def _rides(n):
+    start = datetime.datetime(2025, 11, 1, 9, 0)
+    return [dict(ride_id=i, status="completed", start_time=start, counterpart_user_id=11, counterpart_name="D")
+            for i in range(1, n + 1)]
+
+
+def test_my_rides_with_100_rides_stays_within_budget(mock_db):
+    _, cursor = mock_db
+    cursor.fetchall.side_effect = [_rides(100), [{"ride_id": 3}]]
+
+    with assert_query_budget(max_queries=2, max_connections=2, max_repeats=1) as log:
+        rides = get_ride_history(5, "passenger", limit=100)
+
+    assert len(rides) == 100
+    assert log.count == 2
+
+
+def test_per_row_lookups_are_flagged_as_n_plus_1(mock_db):
+    _, cursor = mock_db
+    cursor.fetchone.return_value = None
+
+    with pytest.raises(QueryBudgetExceeded, match="N\\+1 suspect ran 10 times"):
+        with assert_query_budget(max_repeats=1):
+            for user_id in range(10):
+                get_driver_id(user_id)
+
+
+def test_query_budget_counts_and_restores_get_connection(mock_db):
+    original = ride_utils.get_connection
+
+    with pytest.raises(QueryBudgetExceeded, match="3 queries, budget 2"):
+        with assert_query_budget(max_queries=2):
+            for user_id in range(3):
+                get_driver_id(user_id)
+
+    assert ride_utils.get_connection is original
+
+
+def test_repeats_ignore_literals_and_whitespace(mock_db):
+    with record_queries() as log:
+        cursor = ride_utils.get_connection().cursor()
+        cursor.execute("SELECT * FROM rides WHERE ride_id = 1")
+        cursor.execute("select *  from rides where ride_id = %s", (2,))
+
+    assert log.connections == 1
+    assert log.repeated() == [("SELECT * FROM rides WHERE ride_id = 1", 2)]
\ No newline at end of file
@@ -0,0 +1,160 @@
+import os
+import multiprocessing
+import pytest
+
+from utils import query_cache
+from utils.query_cache import cached, invalidate, cache_stats, get_backend, set_backend, SQLiteBackend
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    query_cache.clear()
+    yield
+    query_cache.clear()
+
+
+def test_cached_returns_stored_result_until_ttl():
+    calls = []
+
+    @cached(ttl=60, maxsize=8)
+    def load(x):
+        calls.append(x)
+        return [{"x": x}]
+
+    assert load(1) == [{"x": 1}]
+    assert load(1) == [{"x": 1}]
+    assert load(2) == [{"x": 2}]
+    assert calls == [1, 2]
+
+
+def test_results_are_copied_so_callers_cannot_poison_cache():
+    @cached(ttl=60)
+    def load():
+        return [{"ride_id": 1}]
+
+    rows = load()
+    rows[0]["already_rated"] = True
+    assert load() == [{"ride_id": 1}]
+
+
+def test_invalidate_only_drops_dependent_entries():
+    calls = []
+
+    @cached(ttl=60, tags=lambda user_id: [f"user:{user_id}"])
+    def driver_id(user_id):
+        calls.append(user_id)
+        return user_id * 10
+
+    driver_id(1)
+    driver_id(2)
+    invalidate("user:1")
+    driver_id(1)
+    driver_id(2)
+    assert calls == [1, 2, 1]
+
+
+def test_none_is_not_cached():
+    calls = []
+
+    @cached(ttl=60)
+    def lookup():
+        calls.append(1)
+        return None
+
+    lookup()
+    lookup()
+    assert len(calls) == 2
+
+
+def test_write_during_read_does_not_store_stale_result():
+    @cached(ttl=60, tags=["ride_offers"])
+    def offers():
+        invalidate("ride_offers")  # a concurrent write lands while we query
+        return ["old"]
+
+    offers()
+    assert cache_stats()[offers.cache_name]["size"] == 0
+
+
+def test_lru_bound_and_stats():
+    @cached(ttl=60, maxsize=2)
+    def square(x):
+        return x * x
+
+    for x in (1, 2, 3, 3):
+        square(x)
+
+    stats = cache_stats()[square.cache_name]
+    assert stats["size"] == 2
+    assert stats["hits"] == 1 and stats["misses"] == 3
+    assert cache_stats()["total"]["hit_ratio"] == 0.25
+
+@cached(ttl=60, tags=["ride_offers"])
+def _offers_seen_by():
+    return [os.getpid()]
+
+
+def _read_then_invalidate(path):
+    set_backend(SQLiteBackend(path))
+    seen = _offers_seen_by()
+    invalidate("ride_offers")
+    return seen
+
+
+def _hammer(path, n):
+    set_backend(SQLiteBackend(path))
+    for i in range(n):
+        if i % 50 == 0:
+            invalidate("ride_offers")
+        _offers_seen_by()
+    return cache_stats()["total"]
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path):
+    previous = get_backend()
+    backend = set_backend(SQLiteBackend(str(tmp_path / "cache.sqlite3")))
+    yield backend
+    set_backend(previous)
+
+
+def test_sqlite_backend_shares_entries_and_invalidations_across_processes(sqlite_backend):
+    assert _offers_seen_by() == [os.getpid()]
+
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        child_saw = pool.apply(_read_then_invalidate, (sqlite_backend.path,))
+
+    # the child was served the parent's entry, and its invalidation reached the parent
+    assert child_saw == [os.getpid()]
+    _offers_seen_by()
+    assert cache_stats()[_offers_seen_by.cache_name]["misses"] == 2
+
+
+def test_sqlite_backend_concurrent_processes_stay_consistent(sqlite_backend):
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        totals = pool.starmap(_hammer, [(sqlite_backend.path, 500)] * 4)
+
+    assert sum(t["hits"] + t["misses"] for t in totals) == 2000
+    assert all(t["hits"] > t["misses"] for t in totals)
+    assert sqlite_backend.versions(["ride_offers"]) == {"ride_offers": 40}
+
+def test_memory_backend_versions_do_not_grow_on_lookup():
+    backend = query_cache.MemoryBackend()
+    assert backend.versions([f"user:{i}" for i in range(100)]) == {f"user:{i}": 0 for i in range(100)}
+    assert len(backend._versions) == 0
+
+def test_memory_backend_forgets_tag_versions_after_the_longest_ttl():
+    now = [0.0]
+    backend = query_cache.MemoryBackend(timer=lambda: now[0])
+    backend.register("rides", ttl=30, maxsize=8)
+    backend.bump([f"user:{i}" for i in range(100)])
+    old = backend.versions(["user:1"])
+    backend.set("rides", 1, ("row", tuple(old.items())))
+
+    now[0] = 31.0
+    backend.bump(["ride_offers"])
+    assert list(backend._versions) == ["ride_offers"]
+    assert backend.get("rides", 1) is None
+
+    backend.bump(["user:1"])
+    assert backend.versions(["user:1"]) != old
\ No newline at end of file
@@ -0,0 +1,54 @@
+from auth.rate_limiter import SlidingWindowLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_limits_after_threshold_within_window():
+    clock = FakeClock()
+    limiter = SlidingWindowLimiter(limit=3, window_s=10, clock=clock)
+
+    for _ in range(3):
+        assert not limiter.is_limited("a")
+        limiter.hit("a")
+    assert limiter.is_limited("a")
+    assert not limiter.is_limited("b")
+
+
+def test_window_slides():
+    clock = FakeClock()
+    limiter = SlidingWindowLimiter(limit=2, window_s=10, clock=clock)
+
+    limiter.hit("a")
+    clock.now = 6
+    limiter.hit("a")
+    assert limiter.is_limited("a")
+
+    clock.now = 10.5
+    assert not limiter.is_limited("a")
+
+    clock.now = 16.5
+    assert not limiter.is_limited("a")
+    assert len(limiter) == 0
+
+
+def test_reset_clears_key():
+    limiter = SlidingWindowLimiter(limit=1, window_s=60)
+    limiter.hit("a")
+    assert limiter.is_limited("a")
+    limiter.reset("a")
+    assert not limiter.is_limited("a")
+
+
+def test_memory_bounded_by_max_keys():
+    limiter = SlidingWindowLimiter(limit=1, window_s=60, max_keys=100)
+    for i in range(1000):
+        limiter.hit(f"attacker-{i}")
+    assert len(limiter) == 100
+    assert limiter.is_limited("attacker-999")
+    assert not limiter.is_limited("attacker-0")
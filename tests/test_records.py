@@ -0,0 +1,33 @@
+import datetime
+
+from model.records import Notification, RecordBatch, Route, columns
+
+
+def test_columns_follow_field_order():
+    assert columns(Route) == "route_id, from_city, to_city, distance_km, duration_min"
+    assert columns(Route, "rt").startswith("rt.route_id, rt.from_city")
+
+
+def test_records_build_from_tuple_rows_by_position():
+    route = Route._make((3, "Mumbai", "Pune", 150.0, 180.0))
+    assert route.to_city == "Pune"
+    assert route._asdict()["distance_km"] == 150.0
+
+
+def test_record_batch_is_columnar_and_iterable():
+    now = datetime.datetime(2025, 11, 3, 9, 0)
+    batch = RecordBatch.from_rows(Notification, [(1, 8, "a", 0, now), (2, 8, "b", 1, now)])
+
+    assert len(batch) == 2
+    assert batch.column("notification_id") == (1, 2)
+    assert batch[1] == Notification(2, 8, "b", 1, now)
+    assert [n.message for n in batch] == ["a", "b"]
+
+
+def test_empty_record_batch_keeps_columns():
+    batch = RecordBatch.from_rows(Route, [])
+
+    assert len(batch) == 0
+    assert not batch
+    assert list(batch) == []
+    assert batch.column("from_city") == ()
\ No newline at end of file
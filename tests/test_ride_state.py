@@ -0,0 +1,187 @@
+import datetime
+import pytest
+from unittest.mock import MagicMock
+
+from utils.ride_state import InvalidTransition, RideStateMachine
+from utils.sql_registry import Batch
+
+
+RIDE = {"ride_id": 5, "status": "active", "total_fare": 300, "driver_id": 2, "passenger_id": 3,
+        "start_time": datetime.datetime(2025, 1, 1, 9, 30), "route_id": 4,
+        "driver_user_id": 11, "passenger_user_id": 12}
+
+
+class BatchCursor:
+    """
+    Stands in for a multi-statement cursor: mogrify keeps the SQL and records the
+    params, and each statement of an executed batch gets a canned result (the
+    ride for the locking SELECT, `updated` rows for the guarded UPDATE).
+    """
+
+    def __init__(self, ride, updated=1):
+        self.ride, self.updated = ride, updated
+        self.rendered = []
+        self.batches = []
+        self.closed = False
+
+    def mogrify(self, sql, params=None):
+        self.rendered.append((sql, params))
+        return sql
+
+    def execute(self, sql):
+        self.batches.append(sql.split(";\n"))
+        self._results = [self._result(part) for part in self.batches[-1]]
+        self.nextset()
+
+    def _result(self, sql):
+        if sql.lstrip().startswith("SELECT"):
+            rows = [dict(self.ride)] if self.ride else []
+            return len(rows), rows
+        if sql.lstrip().startswith("UPDATE rides r"):
+            return self.updated, ()
+        return 1, ()
+
+    def nextset(self):
+        if not self._results:
+            return None
+        self.rowcount, self._rows = self._results.pop(0)
+        return True
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def mock_db(mocker):
+    mock_conn = MagicMock()
+    mock_cursor = BatchCursor(RIDE)
+    mock_conn.cursor.return_value = mock_cursor
+    mocker.patch("utils.ride_state.note_write")
+    invalidate = mocker.patch("utils.ride_state.invalidate")
+    return mock_conn, mock_cursor, invalidate
+
+
+def _machine(conn, hooks=()):
+    return RideStateMachine(connection_factory=lambda: conn, hooks=hooks)
+
+
+def _params(cursor, fragment):
+    return [params for sql, params in cursor.rendered if fragment in sql]
+
+
+def test_transition_reads_and_updates_in_one_round_trip(mock_db):
+    conn, cursor, invalidate = mock_db
+
+    result = _machine(conn).transition(5, "completed")
+
+    assert len(cursor.batches) == 1
+    select, update = cursor.batches[0]
+    assert "JOIN passengers" in select and "FOR UPDATE" in select
+    assert "UPDATE rides r" in update and "ro.status" in update and "rr.status" in update
+    assert "r.status IN %s" in update.split("WHERE")[1]
+    assert _params(cursor, "UPDATE rides r")[0][-2:] == (5, ["booked", "active"])
+    assert conn.begin.called and conn.commit.called
+    assert result["old_status"] == "active" and result["new_status"] == "completed"
+    invalidate.assert_called_once_with("rides", "ride_offers", "ride_requests")
+
+
+def test_transition_batches_notifications_and_logs_incident(mock_db):
+    conn, cursor, invalidate = mock_db
+
+    _machine(conn).transition(
+        5, "cancelled",
+        notify={"driver": "You stopped Ride {ride_id}.", "passenger": "Driver stopped Ride {ride_id}."},
+        incident={"reported_by": "driver", "incident_type": "emergency", "severity": "high"},
+    )
+
+    assert len(cursor.batches) == 2
+    notifications, incident = cursor.batches[1]
+    assert notifications.startswith("INSERT INTO notifications") and notifications.count("(%s, %s, %s, %s)") == 2
+    rows = _params(cursor, "(%s, %s, %s, %s)")
+    assert [row[:2] for row in rows] == [(11, "You stopped Ride 5."), (12, "Driver stopped Ride 5.")]
+    assert "ride_incidents" in incident
+    assert _params(cursor, "ride_incidents") == [(5, 11, "emergency", "", "high")]
+    invalidate.assert_called_once_with("rides", "ride_offers", "ride_requests", "notifications:11", "notifications:12")
+
+
+def test_default_hooks_share_the_side_effect_batch(mock_db):
+    conn, cursor, _ = mock_db
+
+    RideStateMachine(connection_factory=lambda: conn).transition(5, "completed", notify={"passenger": "done"})
+
+    assert len(cursor.batches) == 2
+    effects = " ".join(cursor.batches[1])
+    for table in ("notifications", "metrics_hourly", "metrics_daily", "metrics_totals", "driver_daily_stats",
+                  "ride_history"):
+        assert table in effects
+
+
+def test_metrics_use_the_time_the_update_wrote(mock_db):
+    conn, cursor, _ = mock_db
+    cursor.ride = dict(RIDE, status="booked")
+
+    RideStateMachine(connection_factory=lambda: conn).transition(5, "active")
+
+    update = _params(cursor, "UPDATE rides r")[0]
+    written = update[4]
+    hour = written.replace(minute=0, second=0, microsecond=0)
+    hourly = [row for row in _params(cursor, "(%s, %s, %s, %s)") if isinstance(row[0], datetime.datetime)]
+    assert {row[0] for row in hourly if row[1] == "rides_by_status"} == {hour}
+    # starting the ride moves its count from the booking hour to the start hour
+    assert {(row[0], row[3]) for row in hourly if row[1] == "rides"} == {(datetime.datetime(2025, 1, 1, 9), -1),
+                                                                         (hour, 1)}
+
+
+def test_invalid_transition_rolls_back(mock_db):
+    conn, cursor, invalidate = mock_db
+    cursor.ride = dict(RIDE, status="completed")
+    cursor.updated = 0
+
+    with pytest.raises(InvalidTransition, match="from completed to cancelled"):
+        _machine(conn).transition(5, "cancelled")
+
+    assert len(cursor.batches) == 1
+    assert conn.rollback.called and not conn.commit.called
+    assert not invalidate.called
+
+
+def test_missing_ride_rolls_back(mock_db):
+    conn, cursor, _ = mock_db
+    cursor.ride = None
+    cursor.updated = 0
+
+    with pytest.raises(InvalidTransition, match="not found"):
+        _machine(conn).transition(5, "cancelled", notify={"driver": "x"})
+
+    assert conn.rollback.called and not conn.commit.called
+
+
+def test_unreachable_status_never_connects():
+    factory = MagicMock()
+
+    with pytest.raises(InvalidTransition):
+        RideStateMachine(connection_factory=factory).transition(5, "booked")
+
+    assert not factory.called
+
+
+def test_hooks_run_inside_the_transaction(mock_db):
+    conn, cursor, _ = mock_db
+    seen = []
+
+    _machine(conn, hooks=[lambda batch, ride, old, new: seen.append((batch, ride["ride_id"], old, new))]).transition(5, "completed")
+
+    (batch, ride_id, old, new), = seen
+    assert isinstance(batch, Batch) and batch.cursor is cursor
+    assert (ride_id, old, new) == (5, "active", "completed")
+
+
+def test_can_transition():
+    machine = RideStateMachine(connection_factory=MagicMock())
+    assert machine.can_transition("booked", "active")
+    assert machine.can_transition("active", "cancelled")
+    assert not machine.can_transition("cancelled", "active")
+    assert not machine.can_transition("active", "booked")
\ No newline at end of file
@@ -1,6 +1,10 @@
 import pytest
 from unittest.mock import MagicMock
 import json
+import datetime
+import pymysql
+from model.records import Ride, RideOffer
+from utils import query_cache, sql_registry
 from utils.ride_utils import (
     get_driver_id,
     fetch_routes,
@@ -9,6 +13,7 @@ from utils.ride_utils import (
     create_ride_request,
     create_ride_offer,
     get_open_ride_requests,
+    get_notifications,
     get_open_ride_offers,
     get_matched_ride_details,
     accept_ride_request,
@@ -18,15 +23,21 @@ from utils.ride_utils import (
     find_matching_offers,
     book_ride,
     get_passenger_id_by_user,
-    has_user_already_rated,
+    get_rated_ride_ids,
+    get_ride_history,
+    get_ride_history_page,
+    get_ride_history_table,
+    sync_ride_history,
+    backfill_ride_history,
     save_rating_and_update_averages,
-    get_rides_for_driver,
-    get_rides_for_passenger,
+    rebuild_rating_aggregates,
+    ride_page_cursor,
     update_ride_position,
     get_active_ride,
     notify_user,
     get_unread_notification_count,
     fetch_active_rides,
+    iter_active_rides,
     get_route_coordinates_for_ride,
     update_ride_position_index,
     create_notification,
@@ -35,6 +46,13 @@ from utils.ride_utils import (
 )
 
  
+@pytest.fixture(autouse=True)
+def clear_query_cache():
+    query_cache.clear()
+    yield
+    query_cache.clear()
+
+
 @pytest.fixture
 def mock_db(mocker):
     """Mock the DB connection + cursor for every test."""
@@ -42,7 +60,9 @@ def mock_db(mocker):
     mock_cursor = MagicMock()
  
     mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchmany.return_value = []
     mocker.patch("utils.ride_utils.get_connection", return_value=mock_conn)
+    mocker.patch("utils.db_connection.get_connection", return_value=mock_conn)
  
     return mock_conn, mock_cursor
  
@@ -56,15 +76,53 @@ def test_get_driver_id(mock_db):
     assert d == 7
  
  
+def test_create_ride_offer_invalidates_matched_details(mock_db):
+    _, cursor = mock_db
+    cursor.fetchone.return_value = {"offer_id": 1, "driver_name": "A"}
+    get_matched_ride_details(5)
+    get_matched_ride_details(5)
+    assert cursor.execute.call_count == 1
+
+    create_ride_offer(1, "MH01", 2, 3, 10.0, 100.0)
+    cursor.fetchone.return_value = {"offer_id": 2, "driver_name": "B"}
+    assert get_matched_ride_details(5)["offer_id"] == 2
+
+
+def test_get_driver_id_is_cached_until_the_user_tag_moves(mock_db):
+    _, cursor = mock_db
+    cursor.fetchone.return_value = {"driver_id": 7}
+
+    assert get_driver_id(5) == 7
+    assert get_driver_id(5) == 7
+    assert cursor.execute.call_count == 1
+
+    query_cache.invalidate("user:5")
+    assert get_driver_id(5) == 7
+    assert cursor.execute.call_count == 2
+
+
+def test_create_ride_offer_invalidates_open_offers(mock_db):
+    _, cursor = mock_db
+    cursor.fetchall.return_value = [(1, 2, "MH12AB1234", 3, 10.0, 1500.0, "open", "Mumbai", "Pune")]
+    get_open_ride_offers()
+    get_open_ride_offers()
+    assert cursor.execute.call_count == 1
+
+    create_ride_offer(1, "MH01", 2, 3, 10.0, 100.0)
+    cursor.fetchall.return_value = cursor.fetchall.return_value * 2
+    assert len(get_open_ride_offers()) == 2
+
+
 def test_fetch_routes(mock_db):
     _, cursor = mock_db
     cursor.fetchall.return_value = [
-        {"route_id": 1, "from_city": "A", "to_city": "B"}
+        (1, "A", "B", 120.0, 150.0)
     ]
  
     routes = fetch_routes()
     assert len(routes) == 1
-    assert routes[0]["from_city"] == "A"
+    assert routes[0].from_city == "A"
+    assert "SELECT route_id, from_city, to_city, distance_km, duration_min" in cursor.execute.call_args[0][0]
  
  
 def test_fetch_route_cities(mock_db):
@@ -93,10 +151,9 @@ def test_get_route_coordinates(mock_db):
  
 def test_create_ride_request_success(mock_db):
     conn, cursor = mock_db
-    cursor.fetchone.return_value = {"passenger_id": 4}
  
     ok = create_ride_request(
-        passenger_id=10,
+        passenger_id=4,
         from_city="A",
         to_city="B",
         date_time="2024-01-01 10:00:00",
@@ -105,6 +162,8 @@ def test_create_ride_request_success(mock_db):
     )
     assert ok is True
     assert conn.commit.called
+    assert cursor.execute.call_count == 1
+    assert cursor.execute.call_args[0][1][0] == 4
  
  
 def test_create_ride_offer(mock_db):
@@ -120,17 +179,21 @@ def test_create_ride_offer(mock_db):
  
  
 def test_get_open_ride_requests(mock_db):
-    _, cursor = mock_db
-    cursor.fetchall.return_value = [{"request_id": 1}]
+    conn, cursor = mock_db
+    cursor.fetchmany.side_effect = [[(1, 4, "Mumbai", "Pune", None, 2, None, "pending", None)], []]
     data = get_open_ride_requests()
     assert len(data) == 1
+    assert data[0].request_id == 1 and data[0].to_city == "Pune"
+    assert conn.cursor.call_args[0][0] is pymysql.cursors.SSCursor
  
  
 def test_get_open_ride_offers(mock_db):
     _, cursor = mock_db
-    cursor.fetchall.return_value = [{"offer_id": 1}]
+    cursor.fetchall.return_value = [(1, 2, "MH12AB1234", 3, 10.0, 1500.0, "open", "Mumbai", "Pune")]
     offers = get_open_ride_offers()
     assert len(offers) == 1
+    assert offers[0] == RideOffer(1, 2, "MH12AB1234", 3, 10.0, 1500.0, "open", "Mumbai", "Pune")
+    assert offers.column("to_city") == ("Pune",)
  
  
 def test_get_matched_ride_details(mock_db):
@@ -154,12 +217,15 @@ def test_accept_ride_request(mock_db):
     assert conn.commit.called
  
  
-def test_update_ride_status(mock_db):
-    conn, cursor = mock_db
+def test_update_ride_status(mock_db, mocker):
+    transition = mocker.patch("utils.ride_state.RideStateMachine.transition")
  
     ok = update_ride_status(ride_id=3, new_status="completed")
     assert ok is True
-    assert conn.commit.called
+    transition.assert_called_once_with(3, "completed", None, None)
+ 
+    transition.side_effect = ValueError("Ride 3 cannot go from completed to completed")
+    assert update_ride_status(ride_id=3, new_status="completed") is False
  
  
 def test_find_matching_offers(mock_db):
@@ -173,7 +239,7 @@ def test_find_matching_offers(mock_db):
  
 def test_book_ride(mock_db):
     conn, cursor = mock_db
-    cursor.fetchone.return_value = {"available_seats": 3, "estimated_fare": 200, "driver_id": 5}
+    cursor.fetchone.return_value = {"available_seats": 3, "estimated_fare": 200, "driver_id": 5, "route_id": 1}
  
     ok = book_ride(offer_id=2, passenger_id=7, seats_requested=2)
     assert ok is True
@@ -188,20 +254,79 @@ def test_get_passenger_id_by_user(mock_db):
     assert pid == 20
  
  
-def test_has_user_already_rated(mock_db):
+def test_get_rated_ride_ids_single_query(mock_db):
+    _, cursor = mock_db
+    cursor.fetchall.return_value = [{"ride_id": 1}, {"ride_id": 3}]
+ 
+    rated = get_rated_ride_ids(7, [1, 2, 3])
+    assert rated == {1, 3}
+    cursor.execute.assert_called_once()
+    sql, params = cursor.execute.call_args[0]
+    assert sql == sql_registry.get("rating.rated_ride_ids_in").sql
+    assert params == (7, [1, 2, 3])
+ 
+ 
+def test_get_rated_ride_ids_empty_list_skips_db(mock_db):
+    _, cursor = mock_db
+    assert get_rated_ride_ids(7, []) == set()
+    cursor.execute.assert_not_called()
+ 
+ 
+def test_get_ride_history_attaches_rated_flag(mock_db, mocker):
+    page = mocker.patch("utils.ride_utils.get_ride_history_page", return_value=[
+        {"ride_id": 1, "status": "completed", "counterpart_name": "D", "counterpart_user_id": 11},
+        {"ride_id": 2, "status": "completed", "counterpart_name": "D", "counterpart_user_id": 11},
+        {"ride_id": 3, "status": "booked", "counterpart_name": "E", "counterpart_user_id": 12},
+    ])
+    rated = mocker.patch("utils.ride_utils.get_rated_ride_ids", return_value={2})
+ 
+    rides = get_ride_history(user_id=5, role="passenger", limit=21)
+ 
+    page.assert_called_once_with(5, "passenger", limit=21)
+    rated.assert_called_once_with(5, [1, 2])
+    assert [r["already_rated"] for r in rides] == [False, True, False]
+ 
+ 
+def test_get_ride_history_page_reads_read_model(mock_db):
     _, cursor = mock_db
-    cursor.fetchone.return_value = {"rating_id": 1}
+    cursor.fetchall.return_value = [{"ride_id": 4}]
+ 
+    rows = get_ride_history_page(5, "driver", limit=10, status="completed")
+ 
+    assert rows == [{"ride_id": 4}]
+    sql, params = cursor.execute.call_args[0]
+    assert "FROM ride_history h" in sql
+    assert "JOIN" not in sql
+    assert params[:4] == [5, "driver", "completed", "completed"]
+    assert params[4:12] == [None] * 8
+    assert params[-1] == 10
+ 
+ 
+def test_sync_ride_history_upserts_both_participants():
+    cursor = MagicMock()
+ 
+    sync_ride_history(cursor, 42)
+ 
+    sql, params = cursor.execute.call_args[0]
+    assert "INSERT INTO ride_history" in sql
+    assert "UNION ALL" in sql
+    assert "ON DUPLICATE KEY UPDATE" in sql
+    assert params == [42, 42]
+ 
+ 
+def test_backfill_ride_history_batches(mock_db):
+    conn, cursor = mock_db
+    cursor.fetchone.return_value = (1, 2500)
  
-    assert has_user_already_rated(1, 2) is True
+    assert backfill_ride_history(batch_size=1000) == 3
+    assert conn.commit.call_count == 3
+    assert cursor.execute.call_args_list[-1][0][1] == [2001, 3000, 2001, 3000]
  
  
 def test_save_rating_and_update_averages(mock_db):
     conn, cursor = mock_db
  
-    cursor.fetchone.side_effect = [
-        {},  # first select (avg)
-        {"driver_id": 5},  # belongs to driver
-    ]
+    cursor.fetchone.return_value = {"driver_user_id": 3}  # rated user drove this ride
  
     ok = save_rating_and_update_averages(
         ride_id=1,
@@ -212,20 +337,106 @@ def test_save_rating_and_update_averages(mock_db):
     )
     assert ok is True
     assert conn.commit.called
+ 
+    statements = [c[0][0] for c in cursor.execute.call_args_list]
+    assert not any("AVG(" in sql for sql in statements)
+    assert not any("total_rides" in sql for sql in statements)
+    upsert_sql, upsert_params = cursor.execute.call_args_list[2][0]
+    assert "stars_5 = stars_5 + 1" in upsert_sql
+    assert upsert_params == (3, "driver", 5)
+    assert "UPDATE drivers" in statements[3]
+
+
+def test_save_rating_for_passenger_role(mock_db):
+    conn, cursor = mock_db
+    cursor.fetchone.return_value = {"driver_user_id": 9}
+ 
+    ok = save_rating_and_update_averages(1, 9, 4, 2, None)
+    assert ok is True
+    upsert_sql, upsert_params = cursor.execute.call_args_list[2][0]
+    assert "stars_2" in upsert_sql
+    assert upsert_params == (4, "passenger", 2)
+    assert "UPDATE passengers" in cursor.execute.call_args_list[3][0][0]
+
+
+def test_save_rating_rejects_unknown_ride(mock_db):
+    conn, cursor = mock_db
+    cursor.fetchone.return_value = None
+
+    assert save_rating_and_update_averages(404, 9, 4, 5, None) is False
+    assert conn.rollback.called
+    assert not conn.commit.called
+    assert not any("rating_aggregates" in c[0][0] for c in cursor.execute.call_args_list)
+
+
+def test_rebuild_rating_aggregates(mock_db):
+    conn, cursor = mock_db
+    cursor.rowcount = 12
+ 
+    assert rebuild_rating_aggregates() == 12
+    assert conn.commit.called
+    assert "GROUP BY ra.rated_user" in cursor.execute.call_args_list[1][0][0]
 
-def test_get_rides_for_driver(mock_db):
+
+def test_get_ride_history_page_keyset(mock_db):
     _, cursor = mock_db
-    cursor.fetchall.return_value = [{"ride_id": 1}]
-    data = get_rides_for_driver(4)
-    assert len(data) == 1
+    cursor.fetchall.return_value = [{"ride_id": 5}]
+    after = (datetime.datetime(2024, 1, 2, 10, 0), 40)
+ 
+    get_ride_history_page(4, "driver", limit=21, after=after, status="completed",
+                          date_from=datetime.date(2024, 1, 1), date_to=datetime.date(2024, 1, 31))
+ 
+    sql, params = cursor.execute.call_args[0]
+    assert "(h.start_time <=> %s AND h.ride_id < %s)" in sql
+    assert "(h.start_time < %s OR h.start_time IS NULL)" in sql
+    assert "ORDER BY h.start_time DESC, h.ride_id DESC" in sql
+    assert params == [4, "driver", "completed", "completed", datetime.date(2024, 1, 1), datetime.date(2024, 1, 1),
+                      datetime.date(2024, 2, 1), datetime.date(2024, 2, 1), 40, after[0], 40, after[0], after[0], 21]
+
+
+def test_get_ride_history_page_after_an_undated_ride(mock_db):
+    _, cursor = mock_db
+    cursor.fetchall.return_value = []
+
+    get_ride_history_page(4, "driver", limit=21, after=(None, 4))
+
+    # only the tail of undated rides is left: start_time <=> NULL, and the dated branch is off
+    assert cursor.execute.call_args[0][1][8:13] == [4, None, 4, None, None]
  
  
-def test_get_rides_for_passenger(mock_db):
+def test_ride_history_pages_share_one_registered_statement(mock_db):
     _, cursor = mock_db
-    cursor.fetchall.return_value = [{"ride_id": 2}]
-    data = get_rides_for_passenger(9)
-    assert len(data) == 1
+    cursor.fetchall.return_value = []
+    registered = len(sql_registry.registered())
  
+    get_ride_history_page(4, "driver")
+    get_ride_history_page(4, "driver", limit=21, status="completed", after=(datetime.datetime(2024, 1, 2), 40))
+ 
+    statements = {c[0][0] for c in cursor.execute.call_args_list}
+    assert statements == {sql_registry.get("ride_history.page").sql}
+    assert len(sql_registry.registered()) == registered
+ 
+ 
+def test_ride_page_cursor():
+    assert ride_page_cursor([]) is None
+    assert ride_page_cursor([{"start_time": "t1", "ride_id": 1}, {"start_time": "t0", "ride_id": 7}]) == ("t0", 7) 
+
+
+def test_get_ride_history_table_is_typed_arrow(mock_db):
+    _, cursor = mock_db
+    cursor.description = [("ride_id",), ("start_time",), ("status",), ("total_fare",)]
+    cursor.fetchall.return_value = [
+        (9, datetime.datetime(2025, 11, 2, 9, 30), "completed", 120.0),
+        (4, None, "cancelled", None),
+    ]
+
+    table = get_ride_history_table(5, "driver", ["status", "total_fare"], limit=3)
+
+    assert table.column_names == ["ride_id", "start_time", "status", "total_fare"]
+    assert str(table.schema.field("start_time").type) == "timestamp[s]"
+    assert cursor.execute.call_args[0][0] == sql_registry.get("ride_history.page").sql
+    assert ride_page_cursor(table) == (None, 4)
+    assert ride_page_cursor(table[:1]) == (datetime.datetime(2025, 11, 2, 9, 30), 9)
  
 def test_update_ride_position(mock_db):
     conn, cursor = mock_db
@@ -242,14 +453,27 @@ def test_update_ride_position_index(mock_db):
     assert conn.commit.called
  
  
-def test_get_active_ride(mock_db):
+def test_get_active_ride_without_a_profile_skips_the_query(mock_db):
+    from auth.identity import Identity
     _, cursor = mock_db
-    cursor.fetchone.return_value = {"ride_id": 9}
- 
-    r = get_active_ride(8)
-    assert r["ride_id"] == 9
+
+    assert get_active_ride(Identity(user_id=8, name="A", email="a@test.com", role="admin")) is None
+    assert not cursor.execute.called
  
  
+def test_get_active_ride_with_identity_skips_subqueries(mock_db):
+    from auth.identity import Identity
+    _, cursor = mock_db
+    cursor.fetchone.return_value = {"ride_id": 9}
+
+    r = get_active_ride(Identity(user_id=8, name="A", email="a@test.com", role="driver", driver_id=3))
+
+    assert r["ride_id"] == 9
+    sql, params = cursor.execute.call_args[0]
+    assert "SELECT driver_id FROM drivers" not in sql
+    assert params == (3, None)
+
+
 def test_notify_user(mock_db):
     conn, cursor = mock_db
  
@@ -272,12 +496,38 @@ def test_create_notification(mock_db):
     assert conn.commit.called
  
  
+def _ride_row(ride_id):
+    return (ride_id, 10, 7, 4, datetime.datetime(2025, 1, 1, 9, 0), None, 0, "active",
+            "Mumbai", "Pune", "Asha", "Ravi", 12, 13)
+ 
+ 
 def test_fetch_active_rides(mock_db):
-    _, cursor = mock_db
-    cursor.fetchall.return_value = []
+    conn, cursor = mock_db
  
     active = fetch_active_rides()
     assert active == []
+    assert cursor.execute.call_count == 1
+    assert conn.cursor.call_args[0][0] is pymysql.cursors.SSCursor
+ 
+ 
+def test_iter_active_rides_streams_in_batches(mock_db):
+    _, cursor = mock_db
+    cursor.fetchmany.side_effect = [[_ride_row(3), _ride_row(2)], [_ride_row(1)], []]
+ 
+    rides = iter_active_rides(batch_size=2)
+    assert not cursor.execute.called
+    assert [r.ride_id for r in rides] == [3, 2, 1]
+    cursor.fetchmany.assert_called_with(2)
+ 
+ 
+def test_get_driver_assigned_rides_returns_ride_records(mock_db):
+    _, cursor = mock_db
+    cursor.fetchall.return_value = [_ride_row(6)]
+ 
+    rides = get_driver_assigned_rides(4)
+    assert rides[0].passenger_name == "Asha"
+    assert rides.column("status") == ("active",)
+    assert cursor.execute.call_args[0][1] == (4,)
  
  
 def test_get_route_coordinates_for_ride(mock_db):
@@ -285,7 +535,7 @@ def test_get_route_coordinates_for_ride(mock_db):
     coords = [[72.5, 19.1], [72.6, 19.2]]
     cursor.fetchone.return_value = (json.dumps(coords),)
  
-    pts = get_route_coordinates_for_ride({"ride_id": 5})
+    pts = get_route_coordinates_for_ride(Ride._make(_ride_row(5)))
     assert len(pts) == 2
     assert pts[0]["lat"] == 19.1
  
@@ -302,4 +552,16 @@ def test_create_user_report(mock_db):
     conn, cursor = mock_db
  
     create_user_report(1, 2, 3, "behaviour", "Bad behavior")
-    assert conn.commit.called
\ No newline at end of file
+    assert conn.commit.called
+
+
+def test_get_notifications_returns_columnar_batch(mock_db):
+    _, cursor = mock_db
+    now = datetime.datetime(2025, 11, 3, 9, 0)
+    cursor.fetchall.return_value = [(2, 8, "Ride 5 completed", 0, now), (1, 8, "Welcome", 1, now)]
+
+    batch = get_notifications(8)
+
+    assert len(batch) == 2
+    assert batch.column("message") == ("Ride 5 completed", "Welcome")
+    assert [n.is_read for n in batch] == [0, 1]
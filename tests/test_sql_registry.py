@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from utils import sql_registry
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    sql_registry.reset_stats()
+    yield
+    sql_registry.reset_stats()
+
+
+def test_fingerprint_ignores_literals_whitespace_and_in_list_length():
+    a = sql_registry.fingerprint("SELECT * FROM rides WHERE ride_id = 5 AND status IN ('a', 'b')")
+    b = sql_registry.fingerprint("select *\n  from rides where ride_id = %s and status in (%s, %s, %s) -- hot")
+    assert a == b
+    assert a != sql_registry.fingerprint("SELECT * FROM ride_offers WHERE offer_id = %s")
+
+
+def test_registering_a_name_twice_needs_the_same_sql():
+    sql_registry.statement("test.same", "SELECT 1")
+    assert sql_registry.statement("test.same", "SELECT 1").name == "test.same"
+    with pytest.raises(ValueError):
+        sql_registry.statement("test.same", "SELECT 2")
+
+
+def test_execute_runs_registered_sql_and_records_stats():
+    cursor = MagicMock()
+    sql_registry.execute(cursor, "driver.id_by_user", (7,))
+    sql_registry.execute(cursor, "driver.id_by_user", (8,))
+
+    cursor.execute.assert_called_with(sql_registry.get("driver.id_by_user").sql, (8,))
+    (row,) = sql_registry.query_stats()
+    assert row["name"] == "driver.id_by_user"
+    assert row["calls"] == 2
+    assert row["fingerprint"] == sql_registry.get("driver.id_by_user").fingerprint
+
+
+def test_failed_statements_are_still_timed():
+    cursor = MagicMock()
+    cursor.execute.side_effect = RuntimeError("gone")
+    with pytest.raises(RuntimeError):
+        sql_registry.execute(cursor, "notification.unread_count", (1,))
+    assert sql_registry.query_stats()[0]["calls"] == 1
+
+
+def test_execute_many_sends_one_batch_under_the_name():
+    cursor = MagicMock()
+    rows = [(1, "a", 0, None), (2, "b", 0, None)]
+    sql_registry.execute_many(cursor, "notification.insert_many", rows)
+
+    cursor.executemany.assert_called_once_with(sql_registry.get("notification.insert_many").sql, rows)
+    assert sql_registry.query_stats()[0]["name"] == "notification.insert_many"
+
+def test_batch_sends_queued_statements_in_one_round_trip():
+    cursor = MagicMock()
+    cursor.mogrify.side_effect = lambda sql, params=None: sql.strip()
+    cursor.nextset.side_effect = [True, None]
+    batch = sql_registry.Batch(cursor)
+    sql_registry.execute(batch, "notification.mark_all_read", (1,))
+    sql_registry.execute_many(batch, "notification.insert_many", [(1, "a", 0, None), (2, "b", 0, None)])
+    cursor.execute.assert_not_called()
+
+    assert len(batch.flush()) == 2
+    (sql,), _ = cursor.execute.call_args
+    assert sql.count(";\n") == 1 and sql.endswith("VALUES (%s, %s, %s, %s),(%s, %s, %s, %s)")
+    assert {row["name"] for row in sql_registry.query_stats()} == {"notification.mark_all_read", "notification.insert_many"}
+    assert batch.flush() == []
\ No newline at end of file
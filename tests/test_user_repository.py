@@ -0,0 +1,76 @@
+import pytest
+from unittest.mock import MagicMock
+
+from auth import user_repository
+
+
+@pytest.fixture
+def mock_db(mocker):
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    factory = mocker.patch("auth.user_repository.get_connection", return_value=mock_conn)
+    user_repository.invalidate()
+    yield factory, mock_cursor
+    user_repository.invalidate()
+
+
+def test_get_by_id_caches(mock_db):
+    factory, cursor = mock_db
+    cursor.fetchone.return_value = {"user_id": 1, "email": "a@test.com", "name": "A"}
+
+    assert user_repository.get_by_id(1)["name"] == "A"
+    assert user_repository.get_by_id(1)["name"] == "A"
+    assert factory.call_count == 1
+    assert "password" not in cursor.execute.call_args[0][0]
+
+
+def test_get_by_email_uses_cached_profile(mock_db):
+    factory, cursor = mock_db
+    cursor.fetchone.return_value = {"user_id": 2, "email": "b@test.com", "name": "B"}
+
+    user_repository.get_by_id(2)
+    assert user_repository.get_by_email("B@test.com")["user_id"] == 2
+    assert factory.call_count == 1
+
+
+def test_invalidate_forces_reload(mock_db):
+    factory, cursor = mock_db
+    cursor.fetchone.return_value = {"user_id": 3, "email": "c@test.com", "name": "C"}
+
+    user_repository.get_by_id(3)
+    user_repository.invalidate(3)
+    user_repository.get_by_id(3)
+    assert factory.call_count == 2
+
+
+def test_get_many_fetches_only_misses_in_one_query(mock_db):
+    factory, cursor = mock_db
+    cursor.fetchone.return_value = {"user_id": 1, "email": "a@test.com", "name": "A"}
+    user_repository.get_by_id(1)
+
+    cursor.fetchall.return_value = [
+        {"user_id": 2, "email": "b@test.com", "name": "B"},
+        {"user_id": 3, "email": "c@test.com", "name": "C"},
+    ]
+    users = user_repository.get_many([1, 2, 3, 2])
+
+    assert set(users) == {1, 2, 3}
+    sql, params = cursor.execute.call_args[0]
+    assert sql == user_repository.sql_registry.get("user.many_by_id").sql
+    assert params == ([2, 3],)
+
+
+def test_iter_users_streams_in_batches(mock_db, mocker):
+    factory, cursor = mock_db
+    cursor.fetchmany.side_effect = [
+        [{"user_id": 1}, {"user_id": 2}],
+        [{"user_id": 3}],
+        [],
+    ]
+
+    ids = [u["user_id"] for u in user_repository.iter_users(batch_size=2)]
+
+    assert ids == [1, 2, 3]
+    factory.return_value.cursor.assert_called_once_with(user_repository.pymysql.cursors.SSDictCursor)
+    cursor.fetchmany.assert_called_with(2)
\ No newline at end of file
@@ -0,0 +1,227 @@
+import datetime
+import json
+import os
+import shutil
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pymysql
+from utils import sql_registry
+from utils.db_connection import get_connection
+
+SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", "snapshots")
+EXPORT_BATCH_SIZE = int(os.getenv("ANALYTICS_EXPORT_BATCH_SIZE", "10000"))
+WATERMARK_FILE = "_watermarks.json"
+
+# table -> (primary key, column used for the month=YYYY-MM partition, arrow schema)
+SNAPSHOT_TABLES = {
+    "rides": ("ride_id", "start_time", pa.schema([
+        ("ride_id", pa.int64()),
+        ("offer_id", pa.int64()),
+        ("passenger_id", pa.int64()),
+        ("driver_id", pa.int64()),
+        ("seats_booked", pa.int32()),
+        ("total_fare", pa.float64()),
+        ("start_time", pa.timestamp("s")),
+        ("end_time", pa.timestamp("s")),
+        ("status", pa.string()),
+    ])),
+    "ride_offers": ("offer_id", "created_at", pa.schema([
+        ("offer_id", pa.int64()),
+        ("driver_id", pa.int64()),
+        ("vehicle_no", pa.string()),
+        ("route_id", pa.int64()),
+        ("request_id", pa.int64()),
+        ("available_seats", pa.int32()),
+        ("price_per_km", pa.float64()),
+        ("estimated_fare", pa.float64()),
+        ("status", pa.string()),
+        ("created_at", pa.timestamp("s")),
+    ])),
+    "ride_requests": ("request_id", "created_at", pa.schema([
+        ("request_id", pa.int64()),
+        ("passenger_id", pa.int64()),
+        ("from_city", pa.string()),
+        ("to_city", pa.string()),
+        ("date_time", pa.timestamp("s")),
+        ("passengers_count", pa.int32()),
+        ("status", pa.string()),
+        ("created_at", pa.timestamp("s")),
+    ])),
+    "ratings": ("rating_id", "created_at", pa.schema([
+        ("rating_id", pa.int64()),
+        ("ride_id", pa.int64()),
+        ("rated_by", pa.int64()),
+        ("rated_user", pa.int64()),
+        ("rating", pa.float64()),
+        ("created_at", pa.timestamp("s")),
+    ])),
+    "ride_incidents": ("incident_id", "created_at", pa.schema([
+        ("incident_id", pa.int64()),
+        ("ride_id", pa.int64()),
+        ("reported_by", pa.int64()),
+        ("incident_type", pa.string()),
+        ("severity", pa.string()),
+        ("created_at", pa.timestamp("s")),
+    ])),
+}
+
+for _table, (_pk, _, _schema) in SNAPSHOT_TABLES.items():
+    sql_registry.statement(f"snapshot.export[{_table}]",
+                           f"SELECT {', '.join(_schema.names)} FROM {_table} WHERE {_pk} > %s ORDER BY {_pk}")
+
+PARTITIONING = ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+
+
+def load_watermarks(snapshot_dir=SNAPSHOT_DIR):
+    path = os.path.join(snapshot_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_watermarks(watermarks, snapshot_dir=SNAPSHOT_DIR):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = os.path.join(snapshot_dir, WATERMARK_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _record_batches(cursor, schema, time_index, batch_size, progress):
+    """Turn fetchmany() tuples into RecordBatches column by column, adding the month partition key."""
+    out_schema = schema.append(pa.field("month", pa.string()))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        months = [t.strftime("%Y-%m") if t else "unknown" for t in columns[time_index]]
+        arrays = [pa.array(col, type=field.type) for col, field in zip(columns, schema)]
+        progress["rows"] += len(rows)
+        progress["last_pk"] = rows[-1][0]
+        yield pa.RecordBatch.from_arrays(arrays + [pa.array(months, pa.string())], schema=out_schema)
+
+
+def export_table(conn, table, snapshot_dir=SNAPSHOT_DIR, after=0, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Stream rows with primary key > `after` through a server-side cursor into
+    <snapshot_dir>/<table>/month=YYYY-MM/part-<after>-<n>.parquet.
+    Returns (rows written, new watermark).
+    """
+    pk, time_column, schema = SNAPSHOT_TABLES[table]
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    progress = {"rows": 0, "last_pk": after}
+    try:
+        sql_registry.execute(cursor, f"snapshot.export[{table}]", (after,))
+        batches = _record_batches(cursor, schema, schema.names.index(time_column), batch_size, progress)
+        ds.write_dataset(
+            batches,
+            os.path.join(snapshot_dir, table),
+            schema=schema.append(pa.field("month", pa.string())),
+            format="parquet",
+            partitioning=PARTITIONING,
+            basename_template=f"part-{after}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            max_rows_per_group=batch_size * 4,
+        )
+    finally:
+        cursor.close()
+    return progress["rows"], progress["last_pk"]
+
+
+def export_snapshot(tables=None, snapshot_dir=SNAPSHOT_DIR, full=False, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Incrementally export each table past its saved watermark. The watermark only
+    tracks new rows, so status changes on already-exported rides/offers/requests
+    are picked up by a periodic full=True re-export of that table.
+    Returns {table: rows exported}.
+    """
+    tables = tables or list(SNAPSHOT_TABLES)
+    watermarks = load_watermarks(snapshot_dir)
+    exported = {}
+    conn = get_connection()
+    try:
+        for table in tables:
+            if full:
+                shutil.rmtree(os.path.join(snapshot_dir, table), ignore_errors=True)
+                watermarks.pop(table, None)
+            rows, last_pk = export_table(conn, table, snapshot_dir, watermarks.get(table, 0), batch_size)
+            watermarks[table] = last_pk
+            save_watermarks(watermarks, snapshot_dir)
+            exported[table] = rows
+        return exported
+    finally:
+        conn.close()
+
+
+def dataset(table, snapshot_dir=SNAPSHOT_DIR):
+    path = os.path.join(snapshot_dir, table)
+    schema = SNAPSHOT_TABLES[table][2].append(pa.field("month", pa.string()))
+    if not os.path.isdir(path):
+        return ds.dataset([], schema=schema)
+    return ds.dataset(path, schema=schema, format="parquet", partitioning=PARTITIONING)
+
+
+def _period_filter(column, date_from=None, date_to=None):
+    """
+    Row filter on `column` plus the equivalent month-partition bounds so the scan
+    skips whole directories. date_to is inclusive, as in the ride history filters.
+    """
+    expr = ds.field(column).is_valid()
+    if date_from:
+        start = datetime.datetime.combine(date_from, datetime.time())
+        expr &= (ds.field(column) >= pa.scalar(start, pa.timestamp("s"))) & (ds.field("month") >= start.strftime("%Y-%m"))
+    if date_to:
+        end = datetime.datetime.combine(date_to, datetime.time()) + datetime.timedelta(days=1)
+        expr &= (ds.field(column) < pa.scalar(end, pa.timestamp("s"))) & (ds.field("month") <= date_to.strftime("%Y-%m"))
+    return expr
+
+
+def demand_report(date_from=None, date_to=None, snapshot_dir=SNAPSHOT_DIR):
+    """Ride requests and seats asked for per route, busiest first."""
+    table = dataset("ride_requests", snapshot_dir).to_table(
+        columns=["from_city", "to_city", "passengers_count", "status"],
+        filter=_period_filter("created_at", date_from, date_to),
+    )
+    matched = pc.cast(pc.equal(table["status"], "matched"), pa.int64())
+    table = table.append_column("matched", matched)
+    report = table.group_by(["from_city", "to_city"]).aggregate([
+        ([], "count_all"),
+        ("passengers_count", "sum"),
+        ("matched", "sum"),
+    ]).rename_columns(["from_city", "to_city", "requests", "seats_requested", "matched"])
+    return report.sort_by([("requests", "descending")])
+
+
+def revenue_report(date_from=None, date_to=None, by="day", snapshot_dir=SNAPSHOT_DIR):
+    """Completed-ride revenue grouped by day, month or driver_id."""
+    if by not in ("day", "month", "driver_id"):
+        raise ValueError(f"Cannot group revenue by {by!r}")
+    table = dataset("rides", snapshot_dir).to_table(
+        columns=["driver_id", "total_fare", "start_time", "month"],
+        filter=_period_filter("start_time", date_from, date_to) & (ds.field("status") == "completed"),
+    )
+    if by == "day":
+        table = table.append_column("day", pc.cast(table["start_time"], pa.date32()))
+    report = table.group_by([by]).aggregate([
+        ([], "count_all"),
+        ("total_fare", "sum"),
+    ]).rename_columns([by, "rides", "revenue"])
+    return report.sort_by([("revenue", "descending")] if by == "driver_id" else [(by, "ascending")])
+
+
+def incident_report(date_from=None, date_to=None, severity=None, snapshot_dir=SNAPSHOT_DIR):
+    """Incident counts per type and severity, optionally limited to some severities."""
+    expr = _period_filter("created_at", date_from, date_to)
+    if severity:
+        expr &= ds.field("severity").isin(list(severity) if not isinstance(severity, str) else [severity])
+    table = dataset("ride_incidents", snapshot_dir).to_table(
+        columns=["incident_type", "severity", "ride_id"], filter=expr,
+    )
+    report = table.group_by(["incident_type", "severity"]).aggregate([
+        ([], "count_all"),
+        ("ride_id", "count_distinct"),
+    ]).rename_columns(["incident_type", "severity", "incidents", "rides"])
+    return report.sort_by([("incidents", "descending")])
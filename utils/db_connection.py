@@ -1,30 +1,318 @@
 import pymysql
+from pymysql.constants import CLIENT
 from pymysql.cursors import DictCursor
+import contextlib
+import contextvars
+import functools
+import itertools
+import json
 import os
+import threading
+import time
+import pyarrow as pa
 from dotenv import load_dotenv
+from utils import instrumentation, sql_registry
  
 load_dotenv()
  
-def get_connection():
+# "host" or "host:port", comma separated; empty means every read goes to DB_HOST
+DB_REPLICA_HOSTS = [h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(",") if h.strip()]
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "10"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+STREAM_BATCH_SIZE = int(os.getenv("DB_STREAM_BATCH_SIZE", "1000"))
+ 
+_read_only = contextvars.ContextVar("read_only", default=False)
+_force_primary = contextvars.ContextVar("force_primary", default=False)
+_query_listener = contextvars.ContextVar("query_listener", default=None)
+_lock = threading.Lock()
+_last_write = {}
+_replica_health = {}
+_replica_cycle = itertools.count()
+ 
+ 
+def _session_key():
+    """The Streamlit session running this code, so one user's writes only pin that user's reads."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except Exception:
+        ctx = None
+    return ctx.session_id if ctx else "process"
+ 
+ 
+def note_write(session=None):
+    """Pin this session's reads to the primary for READ_YOUR_WRITES_SECONDS."""
+    now = time.monotonic()
+    with _lock:
+        _last_write[session or _session_key()] = now
+        if len(_last_write) > 10000:
+            for key in [k for k, t in _last_write.items() if now - t > READ_YOUR_WRITES_SECONDS]:
+                del _last_write[key]
+ 
+ 
+def pinned_to_primary(session=None) -> bool:
+    with _lock:
+        wrote = _last_write.get(session or _session_key())
+    return wrote is not None and time.monotonic() - wrote < READ_YOUR_WRITES_SECONDS
+ 
+ 
+class ObservedConnection(pymysql.connections.Connection):
+    """Reports each query's wall time to the listener set by listen_queries(); a plain query otherwise."""
+
+    def query(self, sql, unbuffered=False):
+        listener = _query_listener.get()
+        if listener is None:
+            return super().query(sql, unbuffered)
+        start = time.perf_counter()
+        try:
+            return super().query(sql, unbuffered)
+        finally:
+            listener(time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def listen_queries(listener):
+    """Call listener(seconds) after every query this context runs (e.g. while profiling one rerun)."""
+    token = _query_listener.set(listener)
+    try:
+        yield
+    finally:
+        _query_listener.reset(token)
+
+
+class PrimaryConnection(ObservedConnection):
+    """Connection to DB_HOST that notes every write statement for read-your-writes pinning."""
+ 
+    def query(self, sql, unbuffered=False):
+        if isinstance(sql, str) and sql.lstrip()[:7].upper().startswith(WRITE_VERBS):
+            note_write()
+        return super().query(sql, unbuffered)
+ 
+ 
+def _connect(host, connection_class=PrimaryConnection, client_flag=0):
+    host, _, port = host.partition(":")
+    return connection_class(
+        host=host,
+        port=int(port or 3306),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        cursorclass=DictCursor,
+        autocommit=True,
+        client_flag=client_flag,
+    )
+ 
+ 
+def _replica_lag(conn):
+    """Seconds behind the source, or None when replication is not running."""
+    with conn.cursor(DictCursor) as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except pymysql.MySQLError:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL < 8.0.22 / MariaDB
+        row = cursor.fetchone()
+    if not row:
+        return None
+    lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return float(lag) if lag is not None else None
+ 
+ 
+def _replica_connection():
+    """
+    A connection to the next healthy replica in round-robin order, or None when
+    none is. A replica's lag is re-checked at most every REPLICA_CHECK_INTERVAL
+    seconds; one lagging more than REPLICA_MAX_LAG, not replicating or not
+    reachable is skipped until a later check finds it healthy again.
+    """
+    start = next(_replica_cycle)
+    for i in range(len(DB_REPLICA_HOSTS)):
+        host = DB_REPLICA_HOSTS[(start + i) % len(DB_REPLICA_HOSTS)]
+        with _lock:
+            health = _replica_health.get(host)
+        due = health is None or time.monotonic() - health["checked"] >= REPLICA_CHECK_INTERVAL
+        if health and not health["healthy"] and not due:
+            continue
+        conn = None
+        try:
+            conn = _connect(host, ObservedConnection)
+            if not due:
+                return conn
+            lag = _replica_lag(conn)
+            healthy = lag is not None and lag <= REPLICA_MAX_LAG
+            error = None if healthy else ("replication stopped" if lag is None else f"lagging {lag:.0f}s")
+        except pymysql.MySQLError as e:
+            lag, healthy, error = None, False, str(e)
+        with _lock:
+            _replica_health[host] = {"healthy": healthy, "lag": lag, "error": error, "checked": time.monotonic()}
+        if healthy:
+            return conn
+        if conn is not None:
+            conn.close()
+        print(f"Skipping replica {host}: {error}")
+    return None
+ 
+ 
+def replica_status():
+    """Last health check of every configured replica, for the admin dashboard."""
+    with _lock:
+        return [dict(host=host, **_replica_health.get(host, {"healthy": None, "lag": None, "error": "not checked yet"}))
+                for host in DB_REPLICA_HOSTS]
+ 
+ 
+def get_connection(read_only=None, multi_statements=False):
+    """
+    Connection to the primary, or to a healthy read replica when the caller is
+    read-only (read_only=True, or inside a @read_only function), replicas are
+    configured, and this session has not written within READ_YOUR_WRITES_SECONDS.
+    multi_statements=True lets a primary connection run a sql_registry.Batch.
+    """
+    if read_only is None:
+        read_only = _read_only.get()
+    sample = instrumentation.sampled()
+    start = time.perf_counter()
+    if read_only and DB_REPLICA_HOSTS and not _force_primary.get() and not pinned_to_primary():
+        conn = _replica_connection()
+        if conn is not None:
+            if sample:
+                instrumentation.observe("db_connect_seconds", time.perf_counter() - start, target="replica")
+            return conn
     try:
-        connection = pymysql.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME"),
-            cursorclass=DictCursor,
-            autocommit=True
-        )
+        connection = _connect(os.getenv("DB_HOST"), client_flag=CLIENT.MULTI_STATEMENTS if multi_statements else 0)
         print("Database connection established successfully.")
         return connection
     except pymysql.MySQLError as e:
         print("Error connecting to MySQL:", e)
         return None
-    
-def run_query(query, params=None):
-    conn = get_connection()
-    with conn.cursor() as cursor:
+    finally:
+        if sample:
+            instrumentation.observe("db_connect_seconds", time.perf_counter() - start, target="primary")
+ 
+ 
+def read_only(fn):
+    """Mark a function as safe to serve from a replica: every get_connection() it makes may go to one."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+ 
+ 
+@contextlib.contextmanager
+def use_primary():
+    """Force reads to the primary inside the block, even from @read_only functions."""
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+ 
+ 
+def _adhoc_name(query):
+    # unregistered SQL is labelled by shape, so one series per call site rather than per parameter set
+    return "adhoc:" + sql_registry.fingerprint(query)
+
+
+def run_query(query, params=None, read_only=False):
+    conn = get_connection(read_only)
+    with conn.cursor() as cursor, instrumentation.timed("db_query_seconds", statement=_adhoc_name(query)):
         cursor.execute(query, params or ())
         result = cursor.fetchall()
     conn.close()
+    return result
+ 
+def iter_query(query, params=None, batch_size=STREAM_BATCH_SIZE, adapter=None, dict_rows=True, read_only=None):
+    """
+    Lazily yield a query's rows through an unbuffered server-side cursor
+    (SSDictCursor, or SSCursor tuples with dict_rows=False), batch_size rows per
+    fetch, so memory stays flat however large the result. `query` is SQL or a
+    registered sql_registry.Statement, which runs (and is timed) under its name.
+    `adapter` maps each row (see row_adapter). The connection stays open until the generator is
+    exhausted or closed; don't run other queries on it meanwhile.
+    """
+    if read_only is None:
+        read_only = _read_only.get()  # resolved now: the generator body runs after a @read_only caller returns
+    return _stream(query, params, batch_size, adapter, dict_rows, read_only)
+ 
+ 
+def _stream(query, params, batch_size, adapter, dict_rows, read_only):
+    conn = get_connection(read_only)
+    if conn is None:
+        return
+    cursor = conn.cursor(pymysql.cursors.SSDictCursor if dict_rows else pymysql.cursors.SSCursor)
+    exhausted = False
+    try:
+        if isinstance(query, sql_registry.Statement):
+            sql_registry.execute(cursor, query.name, params or ())
+        else:
+            cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                exhausted = True
+                break
+            if adapter is None:
+                yield from rows
+            else:
+                for row in rows:
+                    yield adapter(row)
+    finally:
+        # closing an unbuffered cursor early would read the rest of the result; drop the connection instead
+        if exhausted:
+            cursor.close()
+        conn.close()
+ 
+ 
+def json_value(value):
+    """Decode a JSON column that PyMySQL hands back as str/bytes; other values pass through."""
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode()
+    return json.loads(value) if isinstance(value, str) else value
+ 
+ 
+def row_adapter(converters=None, factory=None):
+    """
+    Row adapter for iter_query: apply converters per column to non-NULL values
+    (e.g. {"total_fare": float, "coordinates": json_value}) and optionally build
+    factory(**row) from the result.
+    """
+    converters = converters or {}
+ 
+    def adapt(row):
+        for column, convert in converters.items():
+            if row.get(column) is not None:
+                row[column] = convert(row[column])
+        return factory(**row) if factory else row
+    return adapt
+ 
+ 
+def arrow_table(cursor, types=None):
+    """
+    Build a pyarrow Table column by column from an executed tuple cursor.
+    `types` maps column names to Arrow types (e.g. pa.timestamp("s"), pa.float64()
+    for DECIMAL) so columns stay typed even when a page is empty or all NULL.
+    """
+    types = types or {}
+    names = [d[0] for d in cursor.description or ()]
+    rows = cursor.fetchall()
+    columns = zip(*rows) if rows else [()] * len(names)
+    arrays = []
+    for name, values in zip(names, columns):
+        array = pa.array(values)
+        if name in types:
+            array = array.cast(types[name])
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, names=names)
+ 
+def run_query_arrow(query, params=None, types=None, read_only=False):
+    """run_query for tables and charts: a pyarrow Table instead of a list of dicts."""
+    conn = get_connection(read_only)
+    with conn.cursor(pymysql.cursors.Cursor) as cursor, instrumentation.timed("db_query_seconds", statement=_adhoc_name(query)):
+        cursor.execute(query, params or ())
+        result = arrow_table(cursor, types)
+    conn.close()
     return result
\ No newline at end of file
@@ -0,0 +1,236 @@
+import bisect
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "1") != "0"
+# fraction of operations timed; lower it in production to keep the overhead to a random() call
+INSTRUMENTATION_SAMPLE_RATE = float(os.getenv("INSTRUMENTATION_SAMPLE_RATE", "1.0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_SNAPSHOT_PATH = os.getenv("METRICS_SNAPSHOT_PATH", "")
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "60"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+METRICS = {
+    "db_connect_seconds": ("Time to acquire a database connection", LATENCY_BUCKETS),
+    "db_query_seconds": ("Query latency per named statement", LATENCY_BUCKETS),
+    "db_query_rows": ("Rows returned or affected per named statement", ROW_BUCKETS),
+    "page_render_seconds": ("Streamlit page script run time", LATENCY_BUCKETS),
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_server = None
+_snapshot_thread = None
+# _server after a failed bind: reruns return None instead of retrying and reporting it again
+_BIND_FAILED = object()
+
+
+class Histogram:
+    """Prometheus-style histogram: per-bucket counts (non-cumulative here), sum and count."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, n in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += n
+            yield bound, total
+
+
+def sampled() -> bool:
+    if not INSTRUMENTATION_ENABLED:
+        return False
+    return INSTRUMENTATION_SAMPLE_RATE >= 1 or random.random() < INSTRUMENTATION_SAMPLE_RATE
+
+
+def observe(metric, value, **labels):
+    """Record one observation; callers decide sampling (see sampled() / timed())."""
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram(METRICS[metric][1])
+        hist.observe(value)
+
+
+@contextlib.contextmanager
+def timed(metric, **labels):
+    """Time the block into `metric` (seconds) when this call is sampled; exceptions are timed too."""
+    if not sampled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(metric, time.perf_counter() - start, **labels)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _cache_rows():
+    from utils.query_cache import cache_stats
+    return {name: row for name, row in cache_stats().items() if name != "total"}
+
+
+def render_prometheus():
+    """Every histogram plus the query cache counters in Prometheus text exposition format."""
+    with _lock:
+        items = sorted((key, hist.buckets, list(hist.counts), hist.sum, hist.count)
+                       for key, hist in _histograms.items())
+    lines = [
+        "# HELP instrumentation_sample_rate Fraction of operations timed",
+        "# TYPE instrumentation_sample_rate gauge",
+        f"instrumentation_sample_rate {INSTRUMENTATION_SAMPLE_RATE if INSTRUMENTATION_ENABLED else 0}",
+    ]
+    for metric, (help_text, _) in METRICS.items():
+        rows = [item for item in items if item[0][0] == metric]
+        if not rows:
+            continue
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for (_, labels), buckets, counts, total, count in rows:
+            hist = Histogram(buckets)
+            hist.counts = counts
+            for bound, n in hist.cumulative():
+                lines.append(f"{metric}_bucket{_label_text(labels, [('le', bound)])} {n}")
+            lines.append(f"{metric}_sum{_label_text(labels)} {total:.6f}")
+            lines.append(f"{metric}_count{_label_text(labels)} {count}")
+
+    cache = _cache_rows()
+    for name, kind, field in (("query_cache_hits_total", "counter", "hits"),
+                              ("query_cache_misses_total", "counter", "misses"),
+                              ("query_cache_hit_ratio", "gauge", "hit_ratio")):
+        lines.append(f"# TYPE {name} {kind}")
+        for cache_name, row in sorted(cache.items()):
+            lines.append(f"{name}{_label_text([('cache', cache_name)])} {row[field]}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """JSON-friendly view: count, sum, mean and approximate p50/p95/p99 (bucket upper bounds) per series."""
+    with _lock:
+        items = [(key, hist.buckets, list(hist.counts), hist.sum, hist.count) for key, hist in _histograms.items()]
+    series = []
+    for (metric, labels), buckets, counts, total, count in sorted(items):
+        hist = Histogram(buckets)
+        hist.counts = counts
+        cumulative = list(hist.cumulative())
+        row = dict(metric=metric, labels=dict(labels), count=count, sum=round(total, 6),
+                   mean=round(total / count, 6) if count else 0.0)
+        for q in (50, 95, 99):
+            row[f"p{q}"] = next((bound for bound, n in cumulative if n >= count * q / 100), None)
+        series.append(row)
+    return {"taken_at": time.time(), "sample_rate": INSTRUMENTATION_SAMPLE_RATE,
+            "series": series, "query_cache": _cache_rows()}
+
+
+def write_snapshot(path=METRICS_SNAPSHOT_PATH):
+    """Write snapshot() to `path` atomically, so readers never see a half-written file."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot(), f, default=str)
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot(), default=str).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    Serve /metrics (Prometheus text) and /metrics.json from a daemon thread.
+    Idempotent across Streamlit reruns; returns the server, or None when the port
+    is taken (reported once, not retried for the life of the process).
+    """
+    global _server
+    with _lock:
+        if _server is _BIND_FAILED:
+            return None
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            _server = _BIND_FAILED
+            print(f"Metrics endpoint not started on {host}:{port}:", e)
+            return None
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+
+def start_snapshots(path=METRICS_SNAPSHOT_PATH, interval=METRICS_SNAPSHOT_INTERVAL):
+    """Write a JSON snapshot to `path` every `interval` seconds from a daemon thread (once per process)."""
+    global _snapshot_thread
+    with _lock:
+        if _snapshot_thread is not None:
+            return _snapshot_thread
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    write_snapshot(path)
+                except OSError as e:
+                    print("Metrics snapshot failed:", e)
+
+        _snapshot_thread = threading.Thread(target=loop, name="metrics-snapshot", daemon=True)
+    _snapshot_thread.start()
+    return _snapshot_thread
+
+
+def start():
+    """Start whatever exporters the environment asks for (METRICS_PORT, METRICS_SNAPSHOT_PATH)."""
+    if METRICS_PORT:
+        start_http_server()
+    if METRICS_SNAPSHOT_PATH:
+        start_snapshots()
\ No newline at end of file
@@ -0,0 +1,288 @@
+import json
+import os
+import socket
+import time
+from dataclasses import dataclass
+import pymysql
+from utils import sql_registry
+from utils.db_connection import get_connection, read_only
+from utils.metrics_rollup import record_metrics
+
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "10"))
+BACKOFF_CAP = float(os.getenv("JOB_BACKOFF_CAP", "3600"))
+# a running job whose worker has not finished it after this long is presumed dead and requeued
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "900"))
+MAINTENANCE_INTERVAL = 30
+
+
+@dataclass(frozen=True)
+class JobType:
+    name: str
+    handler: object
+    concurrency: int = 0  # max running jobs of this type across all workers; 0 = unlimited
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+
+
+_handlers = {}
+
+
+def job(name, concurrency=0, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register `handler(payload)` as the code run for jobs of type `name`; raising marks the attempt failed."""
+    def decorator(fn):
+        _handlers[name] = JobType(name, fn, concurrency, max_attempts)
+        return fn
+    return decorator
+
+
+def registered_types():
+    return dict(_handlers)
+
+
+def backoff_seconds(attempts):
+    """Delay before retry number `attempts`: BACKOFF_BASE doubled per attempt, capped."""
+    return min(BACKOFF_CAP, BACKOFF_BASE * 2 ** max(0, attempts - 1))
+
+
+def enqueue(job_type, payload=None, priority=0, delay=0, run_at=None, max_attempts=None, cursor=None):
+    """
+    Queue a job and return its id. Higher priority runs first; `delay` seconds or
+    an explicit `run_at` defer it. Pass the caller's cursor to enqueue inside its
+    transaction so the job only exists if that write commits.
+    """
+    if max_attempts is None:
+        max_attempts = _handlers[job_type].max_attempts if job_type in _handlers else DEFAULT_MAX_ATTEMPTS
+    params = (job_type, json.dumps(payload), priority, max_attempts, run_at, delay)
+    if cursor is not None:
+        sql_registry.execute(cursor, "job.insert", params)
+        return cursor.lastrowid
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        sql_registry.execute(cur, "job.insert", params)
+        conn.commit()
+        return cur.lastrowid
+    except Exception as e:
+        conn.rollback()
+        print("Error enqueueing job:", e)
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+
+def claim_jobs(conn, worker_id, limit=10, job_types=None):
+    """
+    Claim up to `limit` due jobs for this worker, highest priority first.
+    FOR UPDATE SKIP LOCKED lets any number of workers claim at once without
+    blocking on or double-claiming each other's rows. Per-type concurrency is
+    checked against the running count at claim time, so it is a soft limit:
+    two workers claiming in the same instant can overshoot it by one batch.
+    """
+    types = [t for t in (job_types or _handlers) if t in _handlers]
+    if not types:
+        return []
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        conn.begin()
+        sql_registry.execute(cursor, "job.running_by_type", (types,))
+        running = {row["job_type"]: row["running"] for row in cursor.fetchall()}
+        slots = {}
+        for t in types:
+            limit_for_type = _handlers[t].concurrency
+            slots[t] = limit_for_type - running.get(t, 0) if limit_for_type else limit
+        eligible = [t for t in types if slots[t] > 0]
+        if not eligible:
+            conn.commit()
+            return []
+
+        sql_registry.execute(cursor, "job.claimable", (eligible, limit))
+        claimed = []
+        for row in cursor.fetchall():
+            if slots[row["job_type"]] > 0:
+                slots[row["job_type"]] -= 1
+                claimed.append(row)
+        if claimed:
+            sql_registry.execute(cursor, "job.mark_running", (worker_id, [row["job_id"] for row in claimed]))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    for row in claimed:
+        row["attempts"] += 1
+        row["payload"] = json.loads(row["payload"]) if row["payload"] else None
+    return claimed
+
+
+def finish_job(conn, job_row, error=None):
+    """Mark a claimed job done, or schedule its retry with backoff / fail it for good once out of attempts."""
+    cursor = conn.cursor()
+    try:
+        conn.begin()
+        if error is None:
+            sql_registry.execute(cursor, "job.mark_done", (job_row["job_id"],))
+            outcome = "jobs_done"
+        elif job_row["attempts"] >= job_row["max_attempts"]:
+            sql_registry.execute(cursor, "job.mark_failed", (error, job_row["job_id"]))
+            outcome = "jobs_failed"
+        else:
+            sql_registry.execute(cursor, "job.retry", (error, backoff_seconds(job_row["attempts"]), job_row["job_id"]))
+            outcome = "jobs_retried"
+        record_metrics(cursor, [(outcome, job_row["job_type"], 1)])
+        conn.commit()
+        return outcome
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def run_job(conn, job_row):
+    """Run one claimed job's handler and record the outcome; returns "jobs_done" / "jobs_retried" / "jobs_failed"."""
+    try:
+        _handlers[job_row["job_type"]].handler(job_row["payload"])
+    except Exception as e:
+        return finish_job(conn, job_row, error=f"{type(e).__name__}: {e}"[:2000])
+    return finish_job(conn, job_row)
+
+
+def requeue_stale(conn, timeout=JOB_TIMEOUT):
+    """Hand jobs held by a worker that died mid-run back to the queue (or fail them if that was their last attempt)."""
+    cursor = conn.cursor()
+    try:
+        sql_registry.execute(cursor, "job.requeue_stale", (timeout,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def schedule(name, job_type, every_seconds, payload=None, priority=0):
+    """Create or update a recurring job; the first run is due immediately, later ones every `every_seconds`."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        sql_registry.execute(cursor, "job_schedule.upsert", (name, job_type, json.dumps(payload), priority, every_seconds))
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print("Error saving job schedule:", e)
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def enqueue_due(conn):
+    """
+    Queue one job per recurring schedule that is due and push its next_run_at
+    forward, in one transaction. SKIP LOCKED keeps two workers from firing the
+    same schedule twice.
+    """
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        conn.begin()
+        sql_registry.execute(cursor, "job_schedule.lock_due")
+        due = cursor.fetchall()
+        if due:
+            rows = []
+            for row in due:
+                job_type = row["job_type"]
+                attempts = _handlers[job_type].max_attempts if job_type in _handlers else DEFAULT_MAX_ATTEMPTS
+                rows.append((job_type, row["payload"], row["priority"], attempts))
+            sql_registry.execute_many(cursor, "job.insert_many", rows)
+            sql_registry.execute(cursor, "job_schedule.advance", ([row["name"] for row in due],))
+        conn.commit()
+        return len(due)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def purge_finished(conn, days=14, batch_size=1000):
+    """Delete done/failed jobs older than `days` in small batches so the purge never holds long locks."""
+    cursor = conn.cursor()
+    deleted = 0
+    try:
+        while True:
+            sql_registry.execute(cursor, "job.purge_finished", (days, batch_size))
+            conn.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return deleted
+    finally:
+        cursor.close()
+
+
+@read_only
+def queue_stats():
+    """Per job type: queued/running/done/failed counts, how overdue the oldest queued job is, and average run latency."""
+    conn = get_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        sql_registry.execute(cursor, "job.queue_stats")
+        return cursor.fetchall()
+    except Exception as e:
+        print("Error fetching job queue stats:", e)
+        return []
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_worker(worker_id=None, job_types=None, batch_size=10, poll_interval=1.0, once=False,
+               report_every=60, max_jobs=None):
+    """
+    Claim and run jobs until interrupted (or after one pass with once=True / after
+    `max_jobs`). A pass runs up to `batch_size` jobs, each claimed just before it
+    runs: a job claimed early and left waiting behind slow ones would pass
+    JOB_TIMEOUT and be requeued by requeue_stale() while still ours. Every
+    MAINTENANCE_INTERVAL seconds the worker also fires due schedules and requeues
+    jobs abandoned by dead workers. Scale out by starting more worker processes.
+    Returns {"jobs_done", "jobs_retried", "jobs_failed", "elapsed"}.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    counts = {"jobs_done": 0, "jobs_retried": 0, "jobs_failed": 0}
+    started = last_report = time.monotonic()
+    last_maintenance = None
+    conn = get_connection()
+    try:
+        while True:
+            conn.ping(reconnect=True)
+            now = time.monotonic()
+            if last_maintenance is None or now - last_maintenance >= MAINTENANCE_INTERVAL:
+                enqueue_due(conn)
+                requeue_stale(conn)
+                last_maintenance = now
+
+            claimed = 0
+            while claimed < batch_size:
+                job_rows = claim_jobs(conn, worker_id, 1, job_types)
+                if not job_rows:
+                    break
+                counts[run_job(conn, job_rows[0])] += 1
+                claimed += 1
+
+            now = time.monotonic()
+            if report_every and now - last_report >= report_every:
+                handled = sum(counts.values())
+                print(f"[{worker_id}] {handled} jobs in {now - started:.0f}s "
+                      f"({handled / (now - started):.1f}/s) done={counts['jobs_done']} "
+                      f"retried={counts['jobs_retried']} failed={counts['jobs_failed']}")
+                last_report = now
+
+            if once or (max_jobs and sum(counts.values()) >= max_jobs):
+                break
+            if not claimed:
+                time.sleep(poll_interval)
+    finally:
+        conn.close()
+    return dict(counts, elapsed=time.monotonic() - started)
\ No newline at end of file
@@ -0,0 +1,82 @@
+import datetime
+from utils import sql_registry
+from utils.analytics import export_snapshot
+from utils.db_connection import get_connection
+from utils.job_queue import job, purge_finished, schedule
+from utils.metrics_rollup import rebuild_metrics
+from utils.query_cache import invalidate
+from utils.ride_utils import backfill_ride_history, rebuild_rating_aggregates
+
+NOTIFICATION_BATCH = 500
+
+# name -> (job type, interval seconds, payload); installed by `scripts/worker.py --install-schedules`
+DEFAULT_SCHEDULES = {
+    "nightly_rating_reconcile": ("rebuild_ratings", 24 * 3600, None),
+    "nightly_metrics_rebuild": ("rebuild_metrics", 24 * 3600, None),
+    "hourly_analytics_snapshot": ("export_snapshot", 3600, None),
+    "daily_retention_purge": ("purge_retention", 24 * 3600, {"notification_days": 90, "job_days": 14}),
+}
+
+
+@job("rebuild_ratings", concurrency=1)
+def rebuild_ratings_job(payload):
+    if rebuild_rating_aggregates() is None:
+        raise RuntimeError("rating reconciliation failed")
+
+
+@job("rebuild_metrics", concurrency=1)
+def rebuild_metrics_job(payload):
+    if not rebuild_metrics():
+        raise RuntimeError("metrics rebuild failed")
+
+
+@job("backfill_ride_history", concurrency=1)
+def backfill_ride_history_job(payload):
+    if backfill_ride_history(**(payload or {})) is None:
+        raise RuntimeError("ride history backfill failed")
+
+
+@job("export_snapshot", concurrency=1)
+def export_snapshot_job(payload):
+    export_snapshot(**(payload or {}))
+
+
+@job("notify_users", concurrency=4)
+def notify_users_job(payload):
+    """payload: {"user_ids": [...], "message": str}; one multi-row INSERT per NOTIFICATION_BATCH users."""
+    user_ids, message = payload["user_ids"], payload["message"]
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(user_ids), NOTIFICATION_BATCH):
+            batch = user_ids[start:start + NOTIFICATION_BATCH]
+            now = datetime.datetime.now()
+            sql_registry.execute_many(cursor, "notification.insert_many",
+                                      [(user_id, message, 0, now) for user_id in batch])
+            conn.commit()
+            invalidate(*(f"notifications:{user_id}" for user_id in batch))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@job("purge_retention", concurrency=1)
+def purge_retention_job(payload):
+    """Drop read notifications and finished jobs past their retention window, in batches."""
+    payload = payload or {}
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        while True:
+            sql_registry.execute(cursor, "notification.purge_read", (payload.get("notification_days", 90), 1000))
+            conn.commit()
+            if cursor.rowcount < 1000:
+                break
+        purge_finished(conn, days=payload.get("job_days", 14))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def install_default_schedules():
+    return all(schedule(name, job_type, every, payload) for name, (job_type, every, payload) in DEFAULT_SCHEDULES.items())
\ No newline at end of file
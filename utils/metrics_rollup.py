@@ -0,0 +1,336 @@
+import datetime
+from collections import defaultdict
+import pyarrow as pa
+import pymysql
+from utils import sql_registry
+from utils.db_connection import arrow_table, get_connection, read_only
+
+# execute_many: PyMySQL sends each batch of events as one multi-row upsert
+for _table in ("metrics_hourly", "metrics_daily"):
+    sql_registry.statement(f"{_table}.add", f"""
+        INSERT INTO {_table} (bucket, metric, dimension, value) VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE value = value + VALUES(value)
+    """)
+sql_registry.statement("metrics_totals.add", """
+    INSERT INTO metrics_totals (metric, dimension, value) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE value = value + VALUES(value)
+""")
+
+
+def _buckets(at):
+    return ("metrics_hourly", at.replace(minute=0, second=0, microsecond=0)), ("metrics_daily", at.date())
+
+
+def record_metrics(cursor, events, at=None):
+    """
+    Add `events` — (metric, dimension, delta) tuples — to the hourly and daily
+    rollups and the running totals. Runs on the caller's cursor so the rollups
+    commit or roll back with the write that produced them; three statements no
+    matter how many events.
+    """
+    events = [(metric, str(dimension or ""), float(delta)) for metric, dimension, delta in events]
+    if not events:
+        return
+    for table, bucket in _buckets(at or datetime.datetime.now()):
+        sql_registry.execute_many(cursor, f"{table}.add", [(bucket, *event) for event in events])
+    sql_registry.execute_many(cursor, "metrics_totals.add", events)
+
+
+# Each rebuilt series has one timestamp, which the incremental path records
+# under too: rides and route_volume by rides.start_time (set when the ride is
+# created, moved when it is started), revenue and driver_daily_stats by
+# _FINISHED_AT (end_time, written on completion and cancellation; start_time
+# only for rows older than that).
+_FINISHED_AT = "COALESCE(r.end_time, r.start_time)"
+
+
+def ride_created_events(status, route_id):
+    """Record with at= the ride's start_time."""
+    return [
+        ("rides", "", 1),
+        ("rides_by_status", status, 1),
+        ("route_volume", route_id, 1),
+    ]
+
+
+def record_ride_start(cursor, route_id, old_start, new_start):
+    """
+    Move a ride's rides/route_volume counts from the bucket of its old
+    start_time to that of the new one, as rebuild_metrics() would place them.
+    Totals are unchanged.
+    """
+    moves = [(new_start, 1)] if old_start is None else [(old_start, -1), (new_start, 1)]
+    rows = defaultdict(list)
+    for at, delta in moves:
+        for table, bucket in _buckets(at):
+            rows[table] += [(bucket, "rides", "", delta), (bucket, "route_volume", str(route_id), delta)]
+    for table, table_rows in rows.items():
+        sql_registry.execute_many(cursor, f"{table}.add", table_rows)
+
+
+def ride_status_events(old_status, new_status, total_fare=None):
+    events = [
+        ("rides_by_status", old_status, -1),
+        ("rides_by_status", new_status, 1),
+        ("ride_transitions", new_status, 1),
+    ]
+    if new_status == "completed" and total_fare:
+        events.append(("revenue", "", total_fare))
+    return events
+
+
+sql_registry.statement("driver_stats.record_ride", f"""
+    INSERT INTO driver_daily_stats (driver_id, day, earnings, completed_rides, cancelled_rides, seats_filled, km_driven)
+    SELECT r.driver_id, DATE({_FINISHED_AT}), r.total_fare * %s, %s, %s, r.seats_booked * %s, rt.distance_km * %s
+    FROM rides r
+    JOIN ride_offers ro ON r.offer_id = ro.offer_id
+    JOIN routes rt ON ro.route_id = rt.route_id
+    WHERE r.ride_id = %s
+    ON DUPLICATE KEY UPDATE
+        earnings = earnings + VALUES(earnings),
+        completed_rides = completed_rides + VALUES(completed_rides),
+        cancelled_rides = cancelled_rides + VALUES(cancelled_rides),
+        seats_filled = seats_filled + VALUES(seats_filled),
+        km_driven = km_driven + VALUES(km_driven)
+""")
+sql_registry.statement("driver.count_completed_ride", """
+    UPDATE drivers d JOIN rides r ON r.driver_id = d.driver_id
+    SET d.total_rides = d.total_rides + 1
+    WHERE r.ride_id = %s
+""")
+
+
+def record_driver_ride(cursor, ride_id, old_status, new_status):
+    """
+    Roll a ride that just reached completed/cancelled into its driver's row for
+    the day it finished and keep drivers.total_rides (completed rides) in step.
+    Runs after the transition's UPDATE, so end_time is already set.
+    """
+    if new_status not in ("completed", "cancelled") or old_status in ("completed", "cancelled"):
+        return
+    done = 1 if new_status == "completed" else 0
+    sql_registry.execute(cursor, "driver_stats.record_ride", (done, done, 1 - done, done, done, ride_id))
+    if done:
+        sql_registry.execute(cursor, "driver.count_completed_ride", (ride_id,))
+
+
+DRIVER_STAT_COLUMNS = ["earnings", "completed_rides", "cancelled_rides", "seats_filled", "km_driven"]
+DRIVER_STAT_TYPES = {"day": pa.date32(), "earnings": pa.float64(), "km_driven": pa.float64()}
+
+# "all time" is passed as the earliest date, so every period is the same statement
+sql_registry.statement("driver_stats.totals", f"""
+    SELECT {", ".join(f"COALESCE(SUM({c}), 0) AS {c}" for c in DRIVER_STAT_COLUMNS)}
+    FROM driver_daily_stats WHERE driver_id = %s AND day >= %s
+""")
+sql_registry.statement("driver_stats.daily", f"""
+    SELECT day, {", ".join(DRIVER_STAT_COLUMNS)}
+    FROM driver_daily_stats
+    WHERE driver_id = %s AND day >= %s
+    ORDER BY day
+""")
+for _column in DRIVER_STAT_COLUMNS:
+    sql_registry.statement(f"driver_stats.leaderboard[{_column}]", f"""
+        SELECT s.driver_id, u.name AS driver_name, d.avg_rating,
+               {", ".join(f"SUM(s.{c}) AS {c}" for c in DRIVER_STAT_COLUMNS)}
+        FROM driver_daily_stats s
+        JOIN drivers d ON s.driver_id = d.driver_id
+        JOIN users u ON d.user_id = u.user_id
+        WHERE s.day >= %s
+        GROUP BY s.driver_id, u.name, d.avg_rating
+        ORDER BY {_column} DESC
+        LIMIT %s
+    """)
+
+
+def _since(days):
+    return datetime.date.today() - datetime.timedelta(days=days) if days else datetime.date.min
+
+
+@read_only
+def get_driver_stats(driver_id, days=None):
+    """Lifetime (or last `days` days) totals for one driver, summed from their daily rows."""
+    conn = get_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        sql_registry.execute(cursor, "driver_stats.totals", (driver_id, _since(days)))
+        row = cursor.fetchone() or {}
+        return {c: float(row.get(c) or 0) for c in DRIVER_STAT_COLUMNS}
+    except Exception as e:
+        print("Error fetching driver stats:", e)
+        return {c: 0.0 for c in DRIVER_STAT_COLUMNS}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@read_only
+def get_driver_daily_stats(driver_id, days=30):
+    """One driver's daily rows for the last `days` days as a pyarrow Table (DECIMALs as float64)."""
+    conn = get_connection()
+    cursor = conn.cursor(pymysql.cursors.Cursor)
+    try:
+        sql_registry.execute(cursor, "driver_stats.daily", (driver_id, _since(days)))
+        return arrow_table(cursor, DRIVER_STAT_TYPES)
+    except Exception as e:
+        print("Error fetching driver daily stats:", e)
+        return pa.table({"day": pa.array([], pa.date32())})
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@read_only
+def get_driver_leaderboard(order_by="earnings", days=30, limit=20):
+    """Top drivers over the last `days` days (all time when falsy), ranked by one rollup column."""
+    if order_by not in DRIVER_STAT_COLUMNS:
+        raise ValueError(f"Cannot rank drivers by {order_by!r}")
+    conn = get_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        sql_registry.execute(cursor, f"driver_stats.leaderboard[{order_by}]", (_since(days), limit))
+        return cursor.fetchall()
+    except Exception as e:
+        print("Error fetching driver leaderboard:", e)
+        return []
+    finally:
+        cursor.close()
+        conn.close()
+
+
+sql_registry.statement("metrics_totals.all", "SELECT metric, dimension, value FROM metrics_totals")
+for _table in ("metrics_hourly", "metrics_daily"):
+    sql_registry.statement(f"{_table}.series", f"""
+        SELECT bucket, metric, dimension, value
+        FROM {_table}
+        WHERE metric IN %s AND bucket >= %s
+        ORDER BY bucket
+    """)
+
+
+@read_only
+def get_totals():
+    """{metric: {dimension: value}} from the running totals table."""
+    conn = get_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        sql_registry.execute(cursor, "metrics_totals.all")
+        totals = {}
+        for row in cursor.fetchall():
+            totals.setdefault(row["metric"], {})[row["dimension"]] = float(row["value"])
+        return totals
+    except Exception as e:
+        print("Error fetching metric totals:", e)
+        return {}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@read_only
+def get_series(metrics, days=30, granularity="daily"):
+    """Rows of (bucket, metric, dimension, value) for the last `days` days from the hourly or daily rollup."""
+    table = "metrics_hourly" if granularity == "hourly" else "metrics_daily"
+    since = datetime.datetime.now() - datetime.timedelta(days=days)
+    if table == "metrics_daily":
+        since = since.date()
+    conn = get_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        sql_registry.execute(cursor, f"{table}.series", (list(metrics), since))
+        return [dict(row, value=float(row["value"])) for row in cursor.fetchall()]
+    except Exception as e:
+        print("Error fetching metric series:", e)
+        return []
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# what rebuild_metrics() recomputes from the fact tables, per table; every other
+# metric (ride_transitions, jobs_*, users/rides_by_status series) is event-only
+# history that the rebuild must leave alone
+REBUILT_SERIES = ("rides", "route_volume", "revenue", "signups")
+REBUILT_TOTALS = ("users", "signups", "rides", "rides_by_status", "revenue", "route_volume")
+
+for _table in ("metrics_hourly", "metrics_daily", "metrics_totals"):
+    sql_registry.statement(f"{_table}.clear_rebuilt", f"DELETE FROM {_table} WHERE metric IN %s")
+for _table, _bucket in (("metrics_hourly", "DATE_FORMAT({col}, '%Y-%m-%d %H:00:00')"),
+                        ("metrics_daily", "DATE({col})")):
+    _ride_bucket = _bucket.format(col="r.start_time")
+    sql_registry.statement(f"{_table}.rebuild", f"""
+        INSERT INTO {_table} (bucket, metric, dimension, value)
+        SELECT {_ride_bucket}, 'rides', '', COUNT(*) FROM rides r
+        WHERE r.start_time IS NOT NULL GROUP BY 1
+        UNION ALL
+        SELECT {_ride_bucket}, 'route_volume', ro.route_id, COUNT(*)
+        FROM rides r JOIN ride_offers ro ON r.offer_id = ro.offer_id
+        WHERE r.start_time IS NOT NULL GROUP BY 1, 3
+        UNION ALL
+        SELECT {_bucket.format(col=_FINISHED_AT)}, 'revenue', '', SUM(r.total_fare)
+        FROM rides r WHERE r.status = 'completed' AND {_FINISHED_AT} IS NOT NULL GROUP BY 1
+        UNION ALL
+        SELECT {_bucket.format(col="u.created_at")}, 'signups', u.role, COUNT(*) FROM users u GROUP BY 1, 3
+    """)
+sql_registry.statement("driver_stats.clear", "DELETE FROM driver_daily_stats")
+sql_registry.statement("driver_stats.rebuild", f"""
+    INSERT INTO driver_daily_stats (driver_id, day, earnings, completed_rides, cancelled_rides, seats_filled, km_driven)
+    SELECT r.driver_id, DATE({_FINISHED_AT}),
+           SUM(IF(r.status = 'completed', r.total_fare, 0)),
+           SUM(r.status = 'completed'),
+           SUM(r.status = 'cancelled'),
+           SUM(IF(r.status = 'completed', r.seats_booked, 0)),
+           SUM(IF(r.status = 'completed', rt.distance_km, 0))
+    FROM rides r
+    JOIN ride_offers ro ON r.offer_id = ro.offer_id
+    JOIN routes rt ON ro.route_id = rt.route_id
+    WHERE r.status IN ('completed', 'cancelled') AND {_FINISHED_AT} IS NOT NULL
+    GROUP BY r.driver_id, DATE({_FINISHED_AT})
+""")
+sql_registry.statement("driver.resync_total_rides", """
+    UPDATE drivers d
+    LEFT JOIN (SELECT driver_id, COUNT(*) AS n FROM rides WHERE status = 'completed' GROUP BY driver_id) c
+        ON c.driver_id = d.driver_id
+    SET d.total_rides = COALESCE(c.n, 0)
+""")
+sql_registry.statement("metrics_totals.rebuild", """
+    INSERT INTO metrics_totals (metric, dimension, value)
+    SELECT 'users', '', COUNT(*) FROM users
+    UNION ALL SELECT 'signups', role, COUNT(*) FROM users GROUP BY role
+    UNION ALL SELECT 'rides', '', COUNT(*) FROM rides
+    UNION ALL SELECT 'rides_by_status', status, COUNT(*) FROM rides GROUP BY status
+    UNION ALL SELECT 'revenue', '', COALESCE(SUM(total_fare), 0) FROM rides WHERE status = 'completed'
+    UNION ALL SELECT 'route_volume', ro.route_id, COUNT(*)
+              FROM rides r JOIN ride_offers ro ON r.offer_id = ro.offer_id GROUP BY ro.route_id
+""")
+
+
+def rebuild_metrics():
+    """
+    Backfill/reconcile every rollup, driver_daily_stats and drivers.total_rides
+    from the fact tables in one transaction.
+    Rides are bucketed by start_time, revenue by _FINISHED_AT and signups by
+    created_at, the same timestamps the incremental path records under.
+    Only the REBUILT_SERIES / REBUILT_TOTALS metrics are deleted and recomputed.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        conn.begin()
+        for table, metrics in (("metrics_hourly", REBUILT_SERIES), ("metrics_daily", REBUILT_SERIES),
+                               ("metrics_totals", REBUILT_TOTALS)):
+            sql_registry.execute(cursor, f"{table}.clear_rebuilt", (metrics,))
+        for table in ("metrics_hourly", "metrics_daily"):
+            sql_registry.execute(cursor, f"{table}.rebuild")
+        sql_registry.execute(cursor, "driver_stats.clear")
+        sql_registry.execute(cursor, "driver_stats.rebuild")
+        sql_registry.execute(cursor, "driver.resync_total_rides")
+        sql_registry.execute(cursor, "metrics_totals.rebuild")
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print("Error rebuilding metrics:", e)
+        return False
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,127 @@
+import cProfile
+import contextlib
+import datetime
+import os
+import pstats
+import re
+import sys
+from collections import defaultdict
+import streamlit as st
+from utils.db_connection import listen_queries
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "15"))
+PROFILE_FLAG = "_profile_next_rerun"
+PROFILE_REPORT = "_profile_report"
+
+# frames skipped when attributing a query to the code that asked for it
+_PLUMBING = ("pymysql", "utils.db_connection", "utils.sql_registry", "utils.query_cache", "contextlib", "functools")
+
+
+def request_profile(session=None):
+    """Profile this session's next rerun (the admin toggle on the profile page)."""
+    session = st.session_state if session is None else session
+    session[PROFILE_FLAG] = True
+
+
+def _requested(session, params):
+    if session.pop(PROFILE_FLAG, False):
+        return True
+    if params.get("profile") != "1":
+        return False
+    from auth.identity import current_identity
+    identity = current_identity(session)
+    return bool(identity and "admin" in identity.roles)
+
+
+def _query_owner():
+    """The ride_utils function behind the running query, else the first non-plumbing caller."""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module == "utils.ride_utils":
+            return frame.f_code.co_name
+        if fallback is None and not module.startswith(_PLUMBING):
+            fallback = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return fallback or "(unknown)"
+
+
+@contextlib.contextmanager
+def profile_rerun(page, session=None, params=None):
+    """
+    Run the block under cProfile when this rerun was asked to be profiled
+    (request_profile(), or ?profile=1 for an admin) and keep the report in the
+    session for show_report(). Otherwise the block runs untouched.
+    """
+    session = st.session_state if session is None else session
+    params = st.query_params if params is None else params
+    if not _requested(session, params):
+        yield
+        return
+
+    db_time = defaultdict(lambda: [0, 0.0])
+
+    def on_query(seconds):
+        row = db_time[_query_owner()]
+        row[0] += 1
+        row[1] += seconds
+
+    profiler = cProfile.Profile()
+    with listen_queries(on_query):
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            session[PROFILE_REPORT] = save_report(profiler, page, db_time)
+
+
+def save_report(profiler, page, db_time, directory=None, top_n=None):
+    """
+    Dump the raw stats to <directory>/<timestamp>-<page>.pstats (readable by
+    pstats, snakeviz, or flameprof for a flame graph) and return a summary:
+    the top_n functions by own time and query count/time per caller.
+    """
+    directory = directory or PROFILE_DIR
+    top_n = top_n or PROFILE_TOP_N
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r"\W+", "-", str(page)).strip("-").lower() or "page"
+    path = os.path.join(directory, f"{datetime.datetime.now():%Y%m%d-%H%M%S-%f}-{slug}.pstats")
+    profiler.dump_stats(path)
+
+    stats = pstats.Stats(profiler)
+    hot = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top_n]
+    return {
+        "page": page,
+        "path": path,
+        "total_s": round(stats.total_tt, 4),
+        "top": [
+            dict(function=f"{os.path.basename(filename)}:{line}({name})", calls=nc,
+                 own_s=round(tt, 4), cumulative_s=round(ct, 4))
+            for (filename, line, name), (cc, nc, tt, ct, callers) in hot
+        ],
+        "db": sorted(
+            (dict(function=name, queries=calls, db_s=round(seconds, 4)) for name, (calls, seconds) in db_time.items()),
+            key=lambda row: row["db_s"], reverse=True,
+        ),
+    }
+
+
+def show_report(session=None):
+    """Sidebar summary of this session's last profiled rerun, until dismissed."""
+    session = st.session_state if session is None else session
+    report = session.get(PROFILE_REPORT)
+    if not report:
+        return
+    with st.sidebar.expander(f"Profile: {report['page']} ({report['total_s']:.2f}s)", expanded=True):
+        st.caption(f"Saved to `{report['path']}`")
+        st.markdown("**Hot functions (own time)**")
+        st.dataframe(report["top"], hide_index=True, use_container_width=True)
+        if report["db"]:
+            st.markdown("**DB time by caller**")
+            st.dataframe(report["db"], hide_index=True, use_container_width=True)
+        if st.button("Dismiss profile", key="profile_dismiss"):
+            session.pop(PROFILE_REPORT, None)
+            st.rerun()
\ No newline at end of file
@@ -0,0 +1,168 @@
+import contextlib
+import os
+import sys
+from collections import Counter
+import streamlit as st
+from utils.sql_registry import fingerprint
+
+# dev servers only: count every rerun's queries and flag N+1 patterns in the sidebar
+QUERY_BUDGET_DEV = os.getenv("QUERY_BUDGET_DEV", "0") == "1"
+QUERY_BUDGET_REPEAT_THRESHOLD = int(os.getenv("QUERY_BUDGET_REPEAT_THRESHOLD", "3"))
+APP_PACKAGES = ("utils", "pages", "auth", "components", "model")
+RERUN_REPORT = "_query_budget_report"
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryLog:
+    """Statements and connections seen inside record_queries()."""
+
+    def __init__(self):
+        self.queries = []
+        self.connections = 0
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=2):
+        """[(example_sql, times)] for statements run `threshold`+ times differing only in parameters."""
+        counts = Counter()
+        examples = {}
+        for sql, _ in self.queries:
+            fp = fingerprint(sql)
+            counts[fp] += 1
+            examples.setdefault(fp, sql)
+        return [(examples[fp], n) for fp, n in counts.most_common() if n >= threshold]
+
+    def report(self):
+        lines = [f"{self.count} queries on {self.connections} connections"]
+        for sql, n in self.repeated():
+            lines.append(f"  {n}x  {' '.join(sql.split())[:160]}")
+        return "\n".join(lines)
+
+
+class _CountingCursor:
+    def __init__(self, cursor, log):
+        self._cursor = cursor
+        self._log = log
+
+    def execute(self, query, *args, **kwargs):
+        self._log.queries.append((query, args[0] if args else kwargs.get("args")))
+        return self._cursor.execute(query, *args, **kwargs)
+
+    def executemany(self, query, *args, **kwargs):
+        # PyMySQL batches INSERT ... VALUES into one statement; count it as one round trip
+        self._log.queries.append((query, None))
+        return self._cursor.executemany(query, *args, **kwargs)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CountingConnection:
+    def __init__(self, conn, log):
+        self._conn = conn
+        self._log = log
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs), self._log)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _counting(factory, log):
+    def get_connection(*args, **kwargs):
+        conn = factory(*args, **kwargs)
+        if conn is None:
+            return None
+        log.connections += 1
+        return _CountingConnection(conn, log)
+    return get_connection
+
+
+@contextlib.contextmanager
+def record_queries(packages=APP_PACKAGES):
+    """
+    Count every connection and statement the app makes inside the block.
+    Each loaded module under `packages` has its `get_connection` (the real one
+    or a test's mock) swapped for a counting wrapper and restored afterwards.
+    Process-wide: meant for tests and single-user dev servers.
+    """
+    log = QueryLog()
+    patched = []
+    for name, module in list(sys.modules.items()):
+        if module is None or name.split(".")[0] not in packages:
+            continue
+        factory = vars(module).get("get_connection")
+        if callable(factory):
+            module.get_connection = _counting(factory, log)
+            patched.append((module, factory))
+    try:
+        yield log
+    finally:
+        for module, factory in reversed(patched):
+            module.get_connection = factory
+
+
+@contextlib.contextmanager
+def assert_query_budget(max_queries=None, max_connections=None, max_repeats=None):
+    """
+    Fail with QueryBudgetExceeded when the block runs more than max_queries
+    statements, opens more than max_connections connections, or runs any
+    statement more than max_repeats times with different parameters (N+1).
+    """
+    with record_queries() as log:
+        yield log
+    problems = []
+    if max_queries is not None and log.count > max_queries:
+        problems.append(f"{log.count} queries, budget {max_queries}")
+    if max_connections is not None and log.connections > max_connections:
+        problems.append(f"{log.connections} connections, budget {max_connections}")
+    if max_repeats is not None:
+        for sql, n in log.repeated(max_repeats + 1):
+            problems.append(f"N+1 suspect ran {n} times: {' '.join(sql.split())[:120]}")
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems) + "\n" + log.report())
+
+
+@contextlib.contextmanager
+def watch_rerun(page, session=None):
+    """With QUERY_BUDGET_DEV=1, record the rerun's queries for show_rerun_report(); a no-op otherwise."""
+    if not QUERY_BUDGET_DEV:
+        yield
+        return
+    session = st.session_state if session is None else session
+    with record_queries() as log:
+        try:
+            yield
+        finally:
+            session[RERUN_REPORT] = dict(
+                page=page, queries=log.count, connections=log.connections,
+                repeated=log.repeated(QUERY_BUDGET_REPEAT_THRESHOLD),
+            )
+
+
+def show_rerun_report(session=None):
+    """Sidebar query count of the last rerun, with statements that look like N+1 loops."""
+    session = st.session_state if session is None else session
+    report = session.get(RERUN_REPORT)
+    if not report:
+        return
+    st.sidebar.caption(f"Last rerun ({report['page']}): {report['queries']} queries, "
+                       f"{report['connections']} connections")
+    for sql, n in report["repeated"]:
+        st.sidebar.warning(f"N+1 suspect, ran {n}x: `{' '.join(sql.split())[:120]}`")
\ No newline at end of file
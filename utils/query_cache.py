@@ -0,0 +1,360 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from cachetools import TTLCache
+from cachetools.keys import hashkey
+
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "1") != "0"
+QUERY_CACHE_BACKEND = os.getenv("QUERY_CACHE_BACKEND", "memory")
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", os.path.join("cache", "query_cache.sqlite3"))
+QUERY_CACHE_URL = os.getenv("QUERY_CACHE_URL", "redis://localhost:6379/0")
+
+
+class MemoryBackend:
+    """
+    Per-process TTL/LRU caches; the default for a single Streamlit server.
+    A tag's version is forgotten once no entry can outlive it: after the
+    longest registered TTL has passed since its last bump, every entry
+    computed before that bump has expired. Versions come from one counter
+    that never goes back, so a forgotten tag cannot revive an old entry.
+    """
+
+    def __init__(self, timer=time.monotonic):
+        self._lock = threading.RLock()
+        self._timer = timer
+        self._caches = {}
+        self._limits = {}
+        self._versions = OrderedDict()
+        self._counter = 0
+
+    def register(self, name, ttl, maxsize):
+        with self._lock:
+            self._limits[name] = (ttl, maxsize)
+            self._caches[name] = TTLCache(maxsize=maxsize, ttl=ttl, timer=self._timer)
+
+    def get(self, name, key):
+        with self._lock:
+            return self._caches[name].get(key)
+
+    def set(self, name, key, entry):
+        with self._lock:
+            self._caches[name][key] = entry
+
+    def delete(self, name, key):
+        with self._lock:
+            self._caches[name].pop(key, None)
+
+    def versions(self, tags):
+        with self._lock:
+            return {tag: self._versions[tag][0] if tag in self._versions else 0 for tag in tags}
+
+    def bump(self, tags):
+        with self._lock:
+            now = self._timer()
+            for tag in tags:
+                self._counter += 1
+                self._versions[tag] = (self._counter, now)
+                self._versions.move_to_end(tag)
+            self._expire(now)
+
+    def _expire(self, now):
+        horizon = now - max((ttl for ttl, _ in self._limits.values()), default=0)
+        while self._versions:
+            tag, (_, bumped_at) = next(iter(self._versions.items()))
+            if bumped_at >= horizon:
+                break
+            del self._versions[tag]
+
+    def size(self, name):
+        with self._lock:
+            return len(self._caches[name])
+
+    def clear(self):
+        with self._lock:
+            for cache in self._caches.values():
+                cache.clear()
+            self._versions.clear()
+
+
+class SQLiteBackend:
+    """
+    Cache shared by every server process on one host through a WAL-mode SQLite
+    file. Tag versions live in the same file, so an invalidate() in any process
+    is seen by the next read in all of them; entries carry the tag versions
+    they were computed under and are discarded once any of those moves on.
+    """
+
+    PRUNE_EVERY = 200
+
+    def __init__(self, path=QUERY_CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._limits = {}
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                name TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (name, key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_expiry ON entries (name, expires_at);
+            CREATE TABLE IF NOT EXISTS tag_versions (
+                tag TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, name, ttl, maxsize):
+        self._limits[name] = (ttl, maxsize)
+
+    def get(self, name, key):
+        row = self._conn().execute(
+            "SELECT value FROM entries WHERE name = ? AND key = ? AND expires_at > ?",
+            (name, repr(key), time.time()),
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, name, key, entry):
+        ttl, maxsize = self._limits[name]
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (name, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (name, repr(key), pickle.dumps(entry, pickle.HIGHEST_PROTOCOL), time.time() + ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune(conn, name, maxsize)
+
+    def _prune(self, conn, name, maxsize):
+        # expired rows everywhere, then the soonest-to-expire rows of this function beyond maxsize
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        conn.execute("""
+            DELETE FROM entries WHERE name = ? AND key IN (
+                SELECT key FROM entries WHERE name = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (name, name, maxsize))
+
+    def delete(self, name, key):
+        self._conn().execute("DELETE FROM entries WHERE name = ? AND key = ?", (name, repr(key)))
+
+    def versions(self, tags):
+        tags = list(tags)
+        if not tags:
+            return {}
+        rows = self._conn().execute(
+            f"SELECT tag, version FROM tag_versions WHERE tag IN ({', '.join('?' * len(tags))})", tags
+        ).fetchall()
+        found = dict(rows)
+        return {tag: found.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("""
+                INSERT INTO tag_versions (tag, version) VALUES (?, 1)
+                ON CONFLICT(tag) DO UPDATE SET version = version + 1
+            """, [(tag,) for tag in tags])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def size(self, name):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM entries WHERE name = ? AND expires_at > ?", (name, time.time())
+        ).fetchone()[0]
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM tag_versions")
+
+
+class RedisBackend:
+    """
+    Same contract on a Redis-compatible server for replicas on several hosts.
+    Needs the optional `redis` package; tag versions are INCR counters,
+    entries expire with SET ... EX, and every bump is also published on
+    <prefix>invalidate for processes that keep their own local copies.
+    """
+
+    def __init__(self, url=QUERY_CACHE_URL, prefix="qc:"):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._limits = {}
+
+    def _key(self, name, key):
+        return f"{self._prefix}e:{name}:{key!r}"
+
+    def register(self, name, ttl, maxsize):
+        # maxsize is left to the server's maxmemory eviction policy
+        self._limits[name] = (ttl, maxsize)
+
+    def get(self, name, key):
+        raw = self._redis.get(self._key(name, key))
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, name, key, entry):
+        ttl, _ = self._limits[name]
+        self._redis.set(self._key(name, key), pickle.dumps(entry, pickle.HIGHEST_PROTOCOL), ex=max(1, int(ttl)))
+
+    def delete(self, name, key):
+        self._redis.delete(self._key(name, key))
+
+    def versions(self, tags):
+        tags = list(tags)
+        if not tags:
+            return {}
+        values = self._redis.mget([f"{self._prefix}t:{tag}" for tag in tags])
+        return {tag: int(v) if v is not None else 0 for tag, v in zip(tags, values)}
+
+    def bump(self, tags):
+        pipe = self._redis.pipeline()
+        for tag in tags:
+            pipe.incr(f"{self._prefix}t:{tag}")
+        pipe.publish(f"{self._prefix}invalidate", "\n".join(tags))
+        pipe.execute()
+
+    def size(self, name):
+        return sum(1 for _ in self._redis.scan_iter(f"{self._prefix}e:{name}:*"))
+
+    def clear(self):
+        for key in self._redis.scan_iter(f"{self._prefix}*"):
+            self._redis.delete(key)
+
+
+BACKENDS = {"memory": MemoryBackend, "sqlite": SQLiteBackend, "redis": RedisBackend}
+
+_lock = threading.RLock()
+_registry = {}
+_stats = defaultdict(lambda: {"hits": 0, "misses": 0, "stale": 0})
+_backend = BACKENDS[QUERY_CACHE_BACKEND]()
+
+
+def set_backend(backend):
+    """Swap the store behind every @cached function (e.g. SQLiteBackend(path) in each server process)."""
+    global _backend
+    with _lock:
+        for name, (ttl, maxsize) in _registry.items():
+            backend.register(name, ttl, maxsize)
+        _backend = backend
+        _stats.clear()
+    return backend
+
+
+def get_backend():
+    return _backend
+
+
+def _resolve_tags(tags, args, kwargs):
+    """`tags` is a list of fixed tags or a callable taking the cached function's arguments."""
+    if callable(tags):
+        tags = tags(*args, **kwargs)
+    return tuple(tags or ())
+
+
+def _copy(value):
+    # rows are dicts that pages sometimes decorate in place; hand out copies
+    if isinstance(value, list):
+        return [dict(row) if isinstance(row, dict) else row for row in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def _count(name, outcome):
+    with _lock:
+        _stats[name][outcome] += 1
+
+
+def cached(ttl=60, maxsize=256, tags=()):
+    """
+    Cache a read function's result per argument tuple for `ttl` seconds in an
+    LRU of `maxsize` entries. Entries remember the version of each tag they
+    depend on (e.g. "ride_offers", "user:42"); invalidate(tag) bumps the version,
+    so every dependent entry misses on its next read. None results are not cached.
+    """
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+        with _lock:
+            _registry[name] = (ttl, maxsize)
+            _backend.register(name, ttl, maxsize)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not QUERY_CACHE_ENABLED:
+                return fn(*args, **kwargs)
+            backend = _backend
+            key = hashkey(*args, **kwargs)
+            entry = backend.get(name, key)
+            if entry is not None:
+                value, versions = entry
+                if backend.versions(tag for tag, _ in versions) == dict(versions):
+                    _count(name, "hits")
+                    return _copy(value)
+                _count(name, "stale")
+                backend.delete(name, key)
+            _count(name, "misses")
+            versions = backend.versions(_resolve_tags(tags, args, kwargs))
+
+            value = fn(*args, **kwargs)
+            # a write that invalidated one of our tags while we queried makes this result stale already
+            if value is not None and backend.versions(versions) == versions:
+                backend.set(name, key, (value, tuple(versions.items())))
+            return _copy(value)
+
+        wrapper.uncached = fn
+        wrapper.cache_name = name
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags):
+    """Mark every cached result that depends on any of `tags` as stale, in every process sharing the backend."""
+    if tags:
+        _backend.bump(tags)
+
+
+def clear():
+    """Drop every cached entry and reset the counters."""
+    with _lock:
+        _backend.clear()
+        _stats.clear()
+
+
+def cache_stats():
+    """{function: {hits, misses, stale, size, hit_ratio}} plus a "total" row."""
+    with _lock:
+        report = {}
+        total = {"hits": 0, "misses": 0, "stale": 0, "size": 0}
+        for name in _registry:
+            row = dict(_stats[name], size=_backend.size(name))
+            lookups = row["hits"] + row["misses"]
+            row["hit_ratio"] = round(row["hits"] / lookups, 3) if lookups else 0.0
+            report[name] = row
+            for k in total:
+                total[k] += row[k]
+        lookups = total["hits"] + total["misses"]
+        total["hit_ratio"] = round(total["hits"] / lookups, 3) if lookups else 0.0
+        report["total"] = total
+        return report
@@ -0,0 +1,120 @@
+import datetime
+import functools
+import pymysql
+from utils import sql_registry
+from utils.db_connection import get_connection, note_write
+from utils.metrics_rollup import record_driver_ride, record_metrics, record_ride_start, ride_status_events
+from utils.query_cache import invalidate
+from utils.ride_utils import sync_ride_history
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def _metrics_hook(batch, ride, old_status, new_status):
+    record_metrics(batch, ride_status_events(old_status, new_status, ride["total_fare"]), at=ride["changed_at"])
+    if new_status == "active":
+        record_ride_start(batch, ride["route_id"], ride["start_time"], ride["changed_at"])
+
+
+def _driver_stats_hook(batch, ride, old_status, new_status):
+    record_driver_ride(batch, ride["ride_id"], old_status, new_status)
+
+
+def _history_hook(batch, ride, old_status, new_status):
+    sync_ride_history(batch, ride["ride_id"])
+
+
+class RideStateMachine:
+    """
+    Single place that moves a ride between statuses. One transition is one
+    transaction on one connection and four round trips:
+
+      1. BEGIN
+      2. one batch: lock and read the ride with both parties' user ids, then one
+         UPDATE over rides, ride_offers and the linked ride_request guarded by
+         `r.status IN <statuses allowed to reach new_status>`; an UPDATE that
+         matched nothing means the locked status was not one of them
+      3. one batch with every side effect: the notifications' multi-row INSERT,
+         the incident, and the hooks' statements (metrics rollups, driver
+         stats, ride_history read model), which the hooks queue on the batch
+      4. COMMIT
+    """
+
+    TRANSITIONS = {
+        "booked": {"active", "completed", "cancelled"},
+        "active": {"completed", "cancelled"},
+        "completed": set(),
+        "cancelled": set(),
+    }
+
+    def __init__(self, connection_factory=None, hooks=None):
+        self.connection_factory = connection_factory or functools.partial(get_connection, multi_statements=True)
+        self.hooks = list(hooks) if hooks is not None else [_metrics_hook, _driver_stats_hook, _history_hook]
+
+    def can_transition(self, old_status, new_status) -> bool:
+        return new_status in self.TRANSITIONS.get(old_status, set())
+
+    def sources(self, new_status):
+        """Statuses a ride may move to `new_status` from."""
+        return [old for old, targets in self.TRANSITIONS.items() if new_status in targets]
+
+    def transition(self, ride_id, new_status, notify=None, incident=None):
+        """
+        Move `ride_id` to `new_status`.
+        notify:   {"driver" | "passenger": message}; "{ride_id}" in a message is filled in.
+        incident: {"reported_by": "driver" | "passenger", "incident_type", "description", "severity"}.
+        Hooks are called as hook(batch, ride, old_status, new_status) and queue
+        their statements on the sql_registry.Batch; `ride` is the row as locked
+        plus changed_at, the start_time/end_time the UPDATE wrote.
+        Returns the ride row with old_status/new_status; raises InvalidTransition
+        or the database error after rolling back.
+        """
+        sources = self.sources(new_status)
+        if not sources:
+            raise InvalidTransition(f"No ride can move to {new_status}")
+        conn = self.connection_factory()
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        try:
+            conn.begin()
+            now = datetime.datetime.now()
+            batch = sql_registry.Batch(cursor)
+            sql_registry.execute(batch, "ride.transition_context", (ride_id,))
+            sql_registry.execute(batch, "ride.transition",
+                                 (new_status, new_status, new_status, new_status, now, new_status, now, ride_id, sources))
+            (_, rides), (updated, _) = batch.flush()
+            if not rides:
+                raise InvalidTransition(f"Ride {ride_id} not found")
+            ride = dict(rides[0], changed_at=now)
+            old_status = ride["status"]
+            if not updated:
+                raise InvalidTransition(f"Ride {ride_id} cannot go from {old_status} to {new_status}")
+
+            recipients = self._notifications(batch, ride, notify)
+            if incident:
+                sql_registry.execute(batch, "incident.insert", (
+                    ride_id, ride[f"{incident['reported_by']}_user_id"], incident["incident_type"],
+                    incident.get("description", ""), incident.get("severity", "low")))
+            for hook in self.hooks:
+                hook(batch, ride, old_status, new_status)
+            batch.flush()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+        # the batches start with a SELECT or may be empty, so the connection cannot spot this write itself
+        note_write()
+        invalidate("rides", "ride_offers", "ride_requests", *(f"notifications:{uid}" for uid in recipients))
+        return dict(ride, old_status=old_status, new_status=new_status)
+
+    def _notifications(self, batch, ride, notify):
+        rows = [(ride[f"{party}_user_id"], message.format(ride_id=ride["ride_id"]), 0, ride["changed_at"])
+                for party, message in (notify or {}).items()]
+        if rows:
+            sql_registry.execute_many(batch, "notification.insert_many", rows)
+        return [row[0] for row in rows]
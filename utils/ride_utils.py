@@ -1,15 +1,32 @@
 import datetime
 import json
+import pyarrow as pa
 import pymysql
 import streamlit as st
-from utils.db_connection import get_connection
+from utils.db_connection import STREAM_BATCH_SIZE, arrow_table, get_connection, json_value, read_only
+from utils.metrics_rollup import record_metrics, ride_created_events
+from utils.query_cache import cached, invalidate
+from utils import sql_registry
+from model.records import Notification, RecordBatch, Ride, RideOffer, RideRequest, Route, columns, iter_records
+
+# statements built from a record's field list, so tuple rows map onto it by position
+sql_registry.statement("route.list", f"SELECT {columns(Route)} FROM routes ORDER BY created_at DESC")
+OPEN_RIDE_REQUESTS = sql_registry.statement(
+    "ride_request.open_list",
+    f"SELECT {columns(RideRequest)} FROM ride_requests WHERE status = 'pending' ORDER BY created_at DESC",
+)
+sql_registry.statement(
+    "notification.list_for_user",
+    f"SELECT {columns(Notification)} FROM notifications WHERE user_id = %s ORDER BY created_at DESC",
+)
 
  
+@cached(ttl=600, maxsize=4096, tags=lambda user_id: [f"user:{user_id}"])
 def get_driver_id(user_id):
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        cursor.execute("SELECT driver_id FROM drivers WHERE user_id = %s", (user_id,))
+        sql_registry.execute(cursor, "driver.id_by_user", (user_id,))
         result = cursor.fetchone()
         return result["driver_id"] if result else None
     except Exception as e:
@@ -20,13 +37,15 @@ def get_driver_id(user_id):
         conn.close()
  
  
+@cached(ttl=600, maxsize=1, tags=["routes"])
+@read_only
 def fetch_routes():
+    """Every route as a Route record, newest first."""
     conn = get_connection()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    cursor = conn.cursor(pymysql.cursors.Cursor)
     try:
-        query = "SELECT route_id, from_city, to_city, distance_km, duration_min FROM routes ORDER BY created_at DESC"
-        cursor.execute(query)
-        return cursor.fetchall()
+        sql_registry.execute(cursor, "route.list")
+        return list(map(Route._make, cursor.fetchall()))
     except Exception as e:
         print("Error fetching routes:", e)
         return []
@@ -34,14 +53,16 @@ def fetch_routes():
         cursor.close()
         conn.close()
 
+@cached(ttl=600, maxsize=1, tags=["routes"])
+@read_only
 def fetch_route_cities():
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        cursor.execute("SELECT DISTINCT from_city FROM routes ORDER BY from_city ASC;")
+        sql_registry.execute(cursor, "route.from_cities")
         from_cities = [row["from_city"] for row in cursor.fetchall()]
  
-        cursor.execute("SELECT DISTINCT to_city FROM routes ORDER BY to_city ASC;")
+        sql_registry.execute(cursor, "route.to_cities")
         to_cities = [row["to_city"] for row in cursor.fetchall()]
  
         return from_cities, to_cities
@@ -53,11 +74,13 @@ def fetch_route_cities():
         conn.close()
 
  
+@cached(ttl=3600, maxsize=1024, tags=["routes"])
+@read_only
 def get_route_coordinates(route_id):
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
  
-    cursor.execute("SELECT coordinates FROM routes WHERE route_id=%s", (route_id,))
+    sql_registry.execute(cursor, "route.coordinates", (route_id,))
     row = cursor.fetchone()
  
     cursor.close()
@@ -66,40 +89,39 @@ def get_route_coordinates(route_id):
     if not row or not row["coordinates"]:
         return []
  
-    coords = row["coordinates"]
+    return list(iter_route_points(json_value(row["coordinates"])))
  
-    if isinstance(coords, str):
-        coords = json.loads(coords)
  
-    formatted = []
-    for pair in coords:
-        if isinstance(pair, list) and len(pair) == 2:
-            lon, lat = pair
-            formatted.append({"lat": float(lat), "lon": float(lon)})
+def iter_route_points(coords):
+    """
+    Yield {'lon', 'lat'} floats from a decoded routes.coordinates list, whose
+    points are [lon, lat] pairs or objects with lon/lng/longitude and
+    lat/latitude keys; malformed points are skipped.
+    """
+    for pt in coords or ():
+        try:
+            if isinstance(pt, dict):
+                lon = lat = None
+                for k, v in pt.items():
+                    if k.lower() in ('lon', 'lng', 'longitude'):
+                        lon = v
+                    if k.lower() in ('lat', 'latitude'):
+                        lat = v
+                yield {'lon': float(lon), 'lat': float(lat)}
+            elif isinstance(pt, (list, tuple)) and len(pt) >= 2:
+                yield {'lon': float(pt[0]), 'lat': float(pt[1])}
+        except (TypeError, ValueError):
+            continue
  
-    return formatted
  
 def create_ride_request(passenger_id, from_city, to_city, date_time, passengers_count, preferences):
+    """passenger_id is passengers.passenger_id (Identity.passenger_id), not a user_id."""
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
  
     try:
-        cursor.execute("SELECT passenger_id FROM passengers WHERE user_id = %s", (passenger_id,))
-        passenger = cursor.fetchone()
- 
-        if not passenger:
-            print("No matching passenger found for user_id:", passenger_id)
-            return False
- 
-        actual_passenger_id = passenger["passenger_id"]
- 
-        query = """
-            INSERT INTO ride_requests
-            (passenger_id, from_city, to_city, date_time, passengers_count, preferences, status, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, 'pending', %s)
-        """
-        cursor.execute(query, (
-            actual_passenger_id,
+        sql_registry.execute(cursor, "ride_request.insert", (
+            passenger_id,
             from_city,
             to_city,
             date_time,
@@ -108,6 +130,7 @@ def create_ride_request(passenger_id, from_city, to_city, date_time, passengers_
             datetime.datetime.now()
         ))
         conn.commit()
+        invalidate("ride_requests")
         return True
  
     except Exception as e:
@@ -123,14 +146,11 @@ def create_ride_offer(driver_id, vehicle_no, route_id, available_seats, price_pe
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        query = """
-            INSERT INTO ride_offers (driver_id, vehicle_no, route_id, available_seats, price_per_km, estimated_fare, status, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, 'open', NOW())
-        """
-        cursor.execute(query, (
+        sql_registry.execute(cursor, "ride_offer.insert", (
             driver_id, vehicle_no, route_id, available_seats, price_per_km, estimated_fare
         ))
         conn.commit()
+        invalidate("ride_offers")
         return True
     except Exception as e:
         print("Error creating ride offer:", e)
@@ -141,57 +161,47 @@ def create_ride_offer(driver_id, vehicle_no, route_id, available_seats, price_pe
         conn.close()
  
  
+@read_only
+def iter_open_ride_requests(batch_size=STREAM_BATCH_SIZE):
+    """
+    Stream pending ride requests as RideRequest records, newest first, without loading
+    the whole backlog. For exports and batch jobs; pages render get_open_ride_requests().
+    """
+    return iter_records(RideRequest, OPEN_RIDE_REQUESTS, batch_size=batch_size)
+ 
+ 
+@cached(ttl=30, maxsize=1, tags=["ride_requests"])
 def get_open_ride_requests():
-    conn = get_connection()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        cursor.execute("SELECT * FROM ride_requests WHERE status = 'pending' ORDER BY created_at DESC")
-        return cursor.fetchall()
+        return list(iter_open_ride_requests())
     except Exception as e:
         print("Error fetching open ride requests:", e)
         return []
-    finally:
-        cursor.close()
-        conn.close()
  
  
+@cached(ttl=30, maxsize=1, tags=["ride_offers"])
+@read_only
 def get_open_ride_offers():
+    """Open offers with their route's cities, newest first, as a RecordBatch of RideOffer records."""
     conn = get_connection()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    cursor = conn.cursor(pymysql.cursors.Cursor)
     try:
-        query = """
-            SELECT ro.offer_id, ro.driver_id, ro.vehicle_no, ro.available_seats, ro.price_per_km, ro.estimated_fare, ro.status,
-                   r.from_city, r.to_city
-            FROM ride_offers ro
-            JOIN routes r ON ro.route_id = r.route_id
-            WHERE ro.status = 'open'
-            ORDER BY ro.created_at DESC
-        """
-        cursor.execute(query)
-        return cursor.fetchall()
+        sql_registry.execute(cursor, "ride_offer.open_list")
+        return RecordBatch.from_rows(RideOffer, cursor.fetchall())
     except Exception as e:
         print("Error fetching open ride offers:", e)
-        return []
+        return RecordBatch.from_rows(RideOffer, [])
     finally:
         cursor.close()
         conn.close()
  
  
+@cached(ttl=30, maxsize=1024, tags=lambda request_id: [f"ride_request:{request_id}", "ride_offers"])
 def get_matched_ride_details(request_id):
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        query = """
-            SELECT rr.request_id, rr.from_city, rr.to_city, rr.date_time,
-                   ro.offer_id, ro.vehicle_no, ro.price_per_km, ro.estimated_fare,
-                   ro.available_seats, u.name AS driver_name, d.avg_rating, d.total_rides
-            FROM ride_requests rr
-            JOIN ride_offers ro ON rr.request_id = ro.request_id
-            JOIN drivers d ON ro.driver_id = d.driver_id
-            JOIN users u ON d.user_id = u.user_id
-            WHERE rr.request_id = %s
-        """
-        cursor.execute(query, (request_id,))
+        sql_registry.execute(cursor, "ride_request.matched_details", (request_id,))
         return cursor.fetchone()
     except Exception as e:
         print("Error fetching matched ride details:", e)
@@ -205,14 +215,14 @@ def accept_ride_request(driver_id, request_id):
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        cursor.execute("SELECT * FROM ride_requests WHERE request_id = %s", (request_id,))
+        conn.begin()
+        sql_registry.execute(cursor, "ride_request.by_id", (request_id,))
         req = cursor.fetchone()
         if not req:
             st.error("Ride request not found.")
             return False
  
-        cursor.execute("SELECT route_id, distance_km FROM routes WHERE from_city = %s AND to_city = %s",
-                       (req["from_city"], req["to_city"]))
+        sql_registry.execute(cursor, "route.by_cities", (req["from_city"], req["to_city"]))
         route = cursor.fetchone()
         if not route:
             st.error("No matching route found for this request.")
@@ -222,20 +232,23 @@ def accept_ride_request(driver_id, request_id):
         price_per_km = 10.0
         estimated_fare = round(distance_km * price_per_km, 2)
  
-        cursor.execute("""
-            INSERT INTO ride_offers (driver_id, vehicle_no, route_id, request_id, available_seats, price_per_km, estimated_fare, status, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, 'booked', NOW())
-        """, (driver_id, f"DRV{driver_id}-REQ{request_id}", route["route_id"], request_id,
-              req["passengers_count"], price_per_km, estimated_fare))
+        sql_registry.execute(cursor, "ride_offer.insert_for_request", (
+            driver_id, f"DRV{driver_id}-REQ{request_id}", route["route_id"], request_id,
+            req["passengers_count"], price_per_km, estimated_fare,
+        ))
         offer_id = cursor.lastrowid
  
-        cursor.execute("""
-            INSERT INTO rides (offer_id, passenger_id, driver_id, seats_booked, total_fare, start_time, status)
-            VALUES (%s, %s, %s, %s, %s, NOW(), 'active')
-        """, (offer_id, req["passenger_id"], driver_id, req["passengers_count"], estimated_fare))
+        now = datetime.datetime.now()
+        sql_registry.execute(cursor, "ride.insert", (
+            offer_id, req["passenger_id"], driver_id, req["passengers_count"], estimated_fare, now, "active",
+        ))
+        ride_id = cursor.lastrowid
  
-        cursor.execute("UPDATE ride_requests SET status = 'matched' WHERE request_id = %s", (request_id,))
+        sql_registry.execute(cursor, "ride_request.mark_matched", (request_id,))
+        record_metrics(cursor, ride_created_events("active", route["route_id"]), at=now)
+        sync_ride_history(cursor, ride_id)
         conn.commit()
+        invalidate("ride_requests", f"ride_request:{request_id}", "ride_offers", "rides")
         return True
     except Exception as e:
         conn.rollback()
@@ -246,67 +259,33 @@ def accept_ride_request(driver_id, request_id):
         conn.close()
 
 def get_driver_assigned_rides(driver_id):
-    """Fetch all active or booked rides assigned to the driver."""
+    """Fetch all active or booked rides assigned to the driver, as a RecordBatch of Ride records."""
     conn = get_connection()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    cursor = conn.cursor(pymysql.cursors.Cursor)
     try:
-        query = """
-        SELECT r.ride_id, r.offer_id, r.passenger_id, r.status, r.start_time, r.end_time,
-               rr.from_city, rr.to_city, u.name AS passenger_name
-        FROM rides r
-        JOIN ride_offers ro ON r.offer_id = ro.offer_id
-        JOIN ride_requests rr ON ro.request_id = rr.request_id
-        JOIN users u ON rr.passenger_id = u.user_id
-        WHERE r.driver_id = %s AND r.status IN ('active', 'booked')
-        ORDER BY r.start_time DESC
-        """
-        cursor.execute(query, (driver_id,))
-        return cursor.fetchall()
+        sql_registry.execute(cursor, "ride.assigned_to_driver", (driver_id,))
+        return RecordBatch.from_rows(Ride, cursor.fetchall())
     except Exception as e:
         print("Error fetching assigned rides:", e)
-        return []
+        return RecordBatch.from_rows(Ride, [])
     finally:
         cursor.close()
         conn.close()
  
  
-def update_ride_status(ride_id, new_status):
-    """Update ride and offer status simultaneously."""
-    conn = get_connection()
-    cursor = conn.cursor()
+def update_ride_status(ride_id, new_status, notify=None, incident=None):
+    """
+    Move a ride to `new_status` through the RideStateMachine: ride, offer,
+    request, notifications and incident change in one transaction.
+    """
+    from utils.ride_state import RideStateMachine
     try:
-        if new_status == "active":
-            cursor.execute("""
-                UPDATE rides r
-                JOIN ride_offers ro ON r.offer_id = ro.offer_id
-                SET r.status = 'active', ro.status = 'active', r.start_time = NOW()
-                WHERE r.ride_id = %s
-            """, (ride_id,))
-        elif new_status == "completed":
-            cursor.execute("""
-                UPDATE rides r
-                JOIN ride_offers ro ON r.offer_id = ro.offer_id
-                SET r.status = 'completed', ro.status = 'completed', r.end_time = NOW()
-                WHERE r.ride_id = %s
-            """, (ride_id,))
-        elif new_status == "cancelled":
-            cursor.execute("""
-                UPDATE rides r
-                JOIN ride_offers ro ON r.offer_id = ro.offer_id
-                SET r.status = 'cancelled', ro.status = 'cancelled'
-                WHERE r.ride_id = %s
-            """, (ride_id,))
-        else:
-            raise ValueError("Invalid ride status")
-        conn.commit()
+        machine = RideStateMachine(connection_factory=lambda: get_connection(multi_statements=True))
+        machine.transition(ride_id, new_status, notify, incident)
         return True
     except Exception as e:
-        conn.rollback()
         print("Error updating ride status:", e)
         return False
-    finally:
-        cursor.close()
-        conn.close()
 
 def get_available_rides(from_city, to_city, date_time, passengers_count):
     """
@@ -315,18 +294,7 @@ def get_available_rides(from_city, to_city, date_time, passengers_count):
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     
-    query = """
-        SELECT r.*, d.name AS driver_name, d.avg_rating, d.total_rides
-        FROM ride_offers r
-        JOIN drivers d ON r.driver_id = d.user_id
-        JOIN routes rt ON r.route_id = rt.route_id
-        WHERE rt.from_city = %s AND rt.to_city = %s
-        AND r.status IN ('open', 'booked')
-        AND r.available_seats >= %s
-        AND DATE(r.accepted_at) = %s
-        ORDER BY r.accepted_at ASC
-    """
-    cursor.execute(query, (from_city, to_city, passengers_count, date_time.date()))
+    sql_registry.execute(cursor, "ride_offer.available", (from_city, to_city, passengers_count, date_time.date()))
     rides = cursor.fetchall()
     cursor.close()
     conn.close()
@@ -337,19 +305,7 @@ def find_matching_offers(from_city, to_city, date_time, passengers_count):
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        query = """
-        SELECT ro.offer_id, ro.driver_id, ro.vehicle_no, ro.available_seats, ro.price_per_km, ro.estimated_fare,
-               r.from_city, r.to_city, u.name AS driver_name
-        FROM ride_offers ro
-        JOIN routes r ON ro.route_id = r.route_id
-        JOIN users u ON ro.driver_id = u.user_id
-        WHERE r.from_city = %s AND r.to_city = %s
-          AND ro.status IN ('open', 'booked')
-          AND ro.available_seats >= %s
-          AND DATE(ro.created_at) = DATE(%s)
-        ORDER BY ro.estimated_fare ASC
-        """
-        cursor.execute(query, (from_city, to_city, passengers_count, date_time))
+        sql_registry.execute(cursor, "ride_offer.matching", (from_city, to_city, passengers_count, date_time))
         return cursor.fetchall()
     except Exception as e:
         print("Error finding matching offers:", e)
@@ -363,29 +319,31 @@ def book_ride(offer_id, passenger_id, seats_requested):
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        cursor.execute("SELECT available_seats, estimated_fare, driver_id FROM ride_offers WHERE offer_id=%s", (offer_id,))
+        conn.begin()
+        sql_registry.execute(cursor, "ride_offer.lock_for_booking", (offer_id,))
         offer = cursor.fetchone()
         if not offer or offer["available_seats"] < seats_requested:
+            conn.rollback()
             return False
  
         new_seats = offer["available_seats"] - seats_requested
         new_status = "booked" if new_seats > 0 else "full"
  
-        cursor.execute("UPDATE ride_offers SET available_seats=%s, status=%s WHERE offer_id=%s",
-                       (new_seats, new_status, offer_id))
+        sql_registry.execute(cursor, "ride_offer.set_seats", (new_seats, new_status, offer_id))
  
         total_fare = offer["estimated_fare"]
-        cursor.execute("""
-            INSERT INTO rides (offer_id, passenger_id, driver_id, seats_booked, total_fare, start_time, status)
-            VALUES (%s, %s, %s, %s, %s, NOW(), 'booked')
-        """, (offer_id, passenger_id, offer["driver_id"], seats_requested, total_fare))
+        now = datetime.datetime.now()
+        sql_registry.execute(cursor, "ride.insert", (
+            offer_id, passenger_id, offer["driver_id"], seats_requested, total_fare, now, "booked",
+        ))
+        ride_id = cursor.lastrowid
  
-        cursor.execute("""
-            UPDATE ride_requests SET status='matched'
-            WHERE passenger_id=%s AND status='pending'
-        """, (passenger_id,))
+        sql_registry.execute(cursor, "ride_request.match_pending_for_passenger", (passenger_id,))
  
+        record_metrics(cursor, ride_created_events("booked", offer["route_id"]), at=now)
+        sync_ride_history(cursor, ride_id)
         conn.commit()
+        invalidate("ride_offers", "ride_requests", "rides")
         return True
     except Exception as e:
         conn.rollback()
@@ -395,12 +353,13 @@ def book_ride(offer_id, passenger_id, seats_requested):
         cursor.close()
         conn.close()
 
+@cached(ttl=600, maxsize=4096, tags=lambda user_id: [f"user:{user_id}"])
 def get_passenger_id_by_user(user_id: int):
     """Map users.user_id -> passengers.passenger_id"""
     conn = get_connection()
     cur = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        cur.execute("SELECT passenger_id FROM passengers WHERE user_id=%s", (user_id,))
+        sql_registry.execute(cur, "passenger.id_by_user", (user_id,))
         row = cur.fetchone()
         return row["passenger_id"] if row else None
     finally:
@@ -408,21 +367,30 @@ def get_passenger_id_by_user(user_id: int):
         conn.close()
  
  
-def has_user_already_rated(ride_id: int, rated_by_user_id: int) -> bool:
-    """Check ratings table to avoid duplicate rating by same user for the same ride."""
+def get_rated_ride_ids(rated_by_user_id: int, ride_ids=None) -> set:
+    """ride_ids (optionally limited to the given ones) that this user has already rated, in one query."""
+    if ride_ids is not None and not ride_ids:
+        return set()
     conn = get_connection()
     cur = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        cur.execute(
-            "SELECT rating_id FROM ratings WHERE ride_id=%s AND rated_by=%s LIMIT 1",
-            (ride_id, rated_by_user_id),
-        )
-        return cur.fetchone() is not None
+        if ride_ids is None:
+            sql_registry.execute(cur, "rating.rated_ride_ids", (rated_by_user_id,))
+        else:
+            sql_registry.execute(cur, "rating.rated_ride_ids_in", (rated_by_user_id, list(ride_ids)))
+        return {row["ride_id"] for row in cur.fetchall()}
     finally:
         cur.close()
         conn.close()
  
  
+def _apply_rating(cur, rated_user_id, role, rating_value):
+    """O(1) update of the running aggregate for (user, role) and the avg_rating shown on profiles."""
+    star = min(5, max(1, int(round(rating_value))))
+    sql_registry.execute(cur, f"rating_aggregate.add[{star}]", (rated_user_id, role, rating_value))
+    sql_registry.execute(cur, f"{role}.sync_avg_rating", (role, rated_user_id))
+
+
 def save_rating_and_update_averages(
     ride_id: int,
     rated_by_user_id: int,
@@ -433,35 +401,18 @@ def save_rating_and_update_averages(
     conn = get_connection()
     cur = conn.cursor(pymysql.cursors.DictCursor)
     try:
-        cur.execute(
-            """
-            INSERT INTO ratings (ride_id, rated_by, rated_user, rating, feedback, created_at)
-            VALUES (%s, %s, %s, %s, %s, NOW())
-            """,
-            (ride_id, rated_by_user_id, rated_user_id, rating_value, feedback_text),
-        )
- 
-        cur.execute(
-            "SELECT AVG(rating) AS avg_rating, COUNT(*) AS total FROM ratings WHERE rated_user=%s",
-            (rated_user_id,)
-        )
-        agg = cur.fetchone() or {"avg_rating": None, "total": 0}
-        new_avg = float(agg["avg_rating"]) if agg["avg_rating"] is not None else 0.0
-        total_count = int(agg["total"])
- 
-        cur.execute("SELECT driver_id FROM drivers WHERE user_id=%s", (rated_user_id,))
-        driver_row = cur.fetchone()
- 
-        if driver_row:
-            cur.execute(
-                "UPDATE drivers SET avg_rating=%s, total_rides=%s WHERE user_id=%s",
-                (new_avg, total_count, rated_user_id),
-            )
-        else:
-            cur.execute(
-                "UPDATE passengers SET avg_rating=%s, total_rides=%s WHERE user_id=%s",
-                (new_avg, total_count, rated_user_id),
-            )
+        conn.begin()
+        sql_registry.execute(cur, "rating.insert",
+                             (ride_id, rated_by_user_id, rated_user_id, rating_value, feedback_text))
+ 
+        sql_registry.execute(cur, "ride.driver_user_id", (ride_id,))
+        ride_row = cur.fetchone()
+        if not ride_row:
+            # same rule as rebuild_rating_aggregates' inner join: a rating needs a resolvable ride
+            raise ValueError(f"Ride {ride_id} not found")
+        role = "driver" if ride_row["driver_user_id"] == rated_user_id else "passenger"
+ 
+        _apply_rating(cur, rated_user_id, role, rating_value)
  
         conn.commit()
         return True
@@ -474,144 +425,325 @@ def save_rating_and_update_averages(
         conn.close()
 
 
-def get_rides_for_driver(driver_id):
+def rebuild_rating_aggregates():
+    """
+    Reconciliation job: recompute rating_aggregates from the ratings table in bulk
+    and resync drivers/passengers.avg_rating. A rating counts towards the driver
+    role when the rated user drove that ride, otherwise towards the passenger role;
+    ratings whose ride no longer resolves are skipped, as save_rating_and_update_averages rejects them.
+    """
     conn = get_connection()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
-    query = """
-        SELECT r.ride_id, r.status, r.seats_booked, r.total_fare,
-               r.start_time, r.end_time,
-               rr.from_city, rr.to_city, rr.date_time AS ride_date,
-               u.name AS passenger_name, u.user_id AS passenger_user_id,
-               ro.vehicle_no
-        FROM rides r
-        JOIN ride_offers ro ON r.offer_id = ro.offer_id
-        JOIN ride_requests rr ON ro.request_id = rr.request_id
-        JOIN users u ON rr.passenger_id = u.user_id
-        WHERE r.driver_id = %s
-        ORDER BY r.start_time DESC;
+    cur = conn.cursor()
+    try:
+        conn.begin()
+        sql_registry.execute(cur, "rating_aggregate.clear")
+        sql_registry.execute(cur, "rating_aggregate.rebuild")
+        rebuilt = cur.rowcount
+        for role in ("driver", "passenger"):
+            sql_registry.execute(cur, f"{role}.resync_avg_ratings", (role,))
+        conn.commit()
+        return rebuilt
+    except Exception as e:
+        conn.rollback()
+        print("Error rebuilding rating aggregates:", e)
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+
+RIDE_HISTORY_PAGE_SIZE = 20
+ 
+ 
+RIDE_HISTORY_COLUMNS = """
+    user_id, ride_id, role, status, from_city, to_city, ride_date, start_time, end_time,
+    seats_booked, total_fare, vehicle_no, counterpart_user_id, counterpart_name
+"""
+ 
+_RIDE_HISTORY_SELECT = """
+    SELECT {user}.user_id AS user_id, r.ride_id, '{role}' AS role, r.status, rt.from_city, rt.to_city,
+           COALESCE(rr.date_time, r.start_time) AS ride_date, r.start_time, r.end_time,
+           r.seats_booked, r.total_fare, ro.vehicle_no,
+           {other}.user_id AS counterpart_user_id, {other}.name AS counterpart_name
+    FROM rides r
+    JOIN ride_offers ro ON r.offer_id = ro.offer_id
+    JOIN routes rt ON ro.route_id = rt.route_id
+    LEFT JOIN ride_requests rr ON ro.request_id = rr.request_id
+    JOIN drivers d ON r.driver_id = d.driver_id
+    JOIN users du ON d.user_id = du.user_id
+    JOIN passengers p ON r.passenger_id = p.passenger_id
+    JOIN users pu ON p.user_id = pu.user_id
+    WHERE {where}
+"""
+ 
+ 
+def _ride_history_upsert(where):
     """
-    cursor.execute(query, (driver_id,))
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return data
+    INSERT ... SELECT rebuilding the ride_history read-model rows (one per
+    participant) for the rides matching `where`; its params are where's, twice.
+    """
+    driver_rows = _RIDE_HISTORY_SELECT.format(user="du", role="driver", other="pu", where=where)
+    passenger_rows = _RIDE_HISTORY_SELECT.format(user="pu", role="passenger", other="du", where=where)
+    return f"""
+        INSERT INTO ride_history ({RIDE_HISTORY_COLUMNS})
+        SELECT {RIDE_HISTORY_COLUMNS} FROM (
+            {driver_rows}
+            UNION ALL
+            {passenger_rows}
+        ) AS h
+        ON DUPLICATE KEY UPDATE
+            status = VALUES(status), from_city = VALUES(from_city), to_city = VALUES(to_city),
+            ride_date = VALUES(ride_date), start_time = VALUES(start_time), end_time = VALUES(end_time),
+            seats_booked = VALUES(seats_booked), total_fare = VALUES(total_fare), vehicle_no = VALUES(vehicle_no),
+            counterpart_user_id = VALUES(counterpart_user_id), counterpart_name = VALUES(counterpart_name)
+    """
+ 
+ 
+sql_registry.statement("ride_history.sync", _ride_history_upsert("r.ride_id = %s"))
+sql_registry.statement("ride_history.backfill_range", _ride_history_upsert("r.ride_id BETWEEN %s AND %s"))
+ 
+ 
+def sync_ride_history(cursor, ride_id):
+    """Refresh one ride's ride_history rows on the caller's cursor, so they commit or roll back with the change that triggered it."""
+    sql_registry.execute(cursor, "ride_history.sync", [ride_id] * 2)
+ 
+ 
+def backfill_ride_history(batch_size=1000):
+    """Build ride_history for every ride in ride_id ranges of batch_size, one transaction per batch."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        sql_registry.execute(cursor, "ride.id_range")
+        low, high = cursor.fetchone()
+        if low is None:
+            return 0
+        batches = 0
+        for start in range(low, high + 1, batch_size):
+            conn.begin()
+            sql_registry.execute(cursor, "ride_history.backfill_range", [start, start + batch_size - 1] * 2)
+            conn.commit()
+            batches += 1
+        return batches
+    except Exception as e:
+        conn.rollback()
+        print("Error backfilling ride history:", e)
+        return None
+    finally:
+        cursor.close()
+        conn.close()
  
  
-def get_rides_for_passenger(passenger_id):
+RIDE_HISTORY_ARROW_TYPES = {
+    "ride_date": pa.timestamp("s"),
+    "start_time": pa.timestamp("s"),
+    "end_time": pa.timestamp("s"),
+    "total_fare": pa.float64(),
+}
+ 
+ 
+# MySQL's documented "no limit" for LIMIT, used when a caller wants every row
+_NO_LIMIT = 18446744073709551615
+ 
+# one statement for every filter combination: an unused filter is passed as NULL,
+# and as PyMySQL inlines the values MySQL folds `NULL IS NULL OR ...` away before
+# planning, so each combination still gets a range scan on the index.
+# MySQL sorts NULL below every value, so rides without a start_time come last in
+# this DESC order; the keyset clause follows that: after a dated cursor come the
+# earlier rides and then all undated ones, after an undated cursor only the
+# undated rides with a lower ride_id (<=> is NULL-safe equality)
+sql_registry.statement("ride_history.page", f"""
+    SELECT {RIDE_HISTORY_COLUMNS}
+    FROM ride_history h
+    WHERE h.user_id = %s AND h.role = %s
+      AND (%s IS NULL OR h.status = %s)
+      AND (%s IS NULL OR h.start_time >= %s)
+      AND (%s IS NULL OR h.start_time < %s)
+      AND (%s IS NULL
+           OR (h.start_time <=> %s AND h.ride_id < %s)
+           OR (%s IS NOT NULL AND (h.start_time < %s OR h.start_time IS NULL)))
+    ORDER BY h.start_time DESC, h.ride_id DESC
+    LIMIT %s
+""")
+ 
+ 
+def _ride_history_params(user_id, role, limit=None, after=None, status=None, date_from=None, date_to=None):
+    """
+    Parameters for ride_history.page: keyset pagination on (start_time, ride_id)
+    DESC, where `after` is the (start_time, ride_id) of the last row on the previous
+    page; its start_time may be None.
+    """
+    status = status or None
+    date_from = date_from or None
+    date_to = date_to + datetime.timedelta(days=1) if date_to else None
+    start_time, ride_id = after or (None, None)
+    return [user_id, role, status, status, date_from, date_from, date_to, date_to,
+            ride_id, start_time, ride_id, start_time, start_time, limit or _NO_LIMIT]
+ 
+ 
+@read_only
+def get_ride_history_page(user_id, role, limit=None, after=None, status=None, date_from=None, date_to=None):
+    """A user's ride history from the ride_history read model: one range scan on (user_id, role, start_time, ride_id)."""
+    params = _ride_history_params(user_id, role, limit=limit, after=after, status=status,
+                                  date_from=date_from, date_to=date_to)
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
-    query = """
-        SELECT r.ride_id, r.status, r.seats_booked, r.total_fare,
-               r.start_time, r.end_time,
-               rr.from_city, rr.to_city, rr.date_time AS ride_date,
-               ud.name AS driver_name, ud.user_id AS driver_user_id,
-               ro.vehicle_no
-        FROM rides r
-        JOIN ride_offers ro ON r.offer_id = ro.offer_id
-        JOIN drivers d ON r.driver_id = d.driver_id
-        JOIN users ud ON d.user_id = ud.user_id
-        JOIN ride_requests rr ON r.passenger_id = rr.passenger_id
-        WHERE r.passenger_id = %s
-        ORDER BY r.start_time DESC;
+    try:
+        sql_registry.execute(cursor, "ride_history.page", params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+ 
+ 
+@read_only
+def get_ride_history_table(user_id, role, columns=None, **page):
     """
-    cursor.execute(query, (passenger_id,))
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return data
+    Same page as get_ride_history_page as a pyarrow Table with typed timestamp
+    columns, for st.dataframe/charts. `columns` narrows the table (the query
+    stays the one registered statement); ride_id and start_time are always kept
+    so the result still works with ride_page_cursor.
+    """
+    conn = get_connection()
+    cursor = conn.cursor(pymysql.cursors.Cursor)
+    try:
+        sql_registry.execute(cursor, "ride_history.page", _ride_history_params(user_id, role, **page))
+        table = arrow_table(cursor, RIDE_HISTORY_ARROW_TYPES)
+        if columns:
+            table = table.select(list(dict.fromkeys(["ride_id", "start_time"] + list(columns))))
+        return table
+    finally:
+        cursor.close()
+        conn.close()
+ 
+ 
+def ride_page_cursor(rides):
+    """Keyset cursor to pass as `after` to fetch the page following these rides (list of dicts or Arrow table)."""
+    if not len(rides):
+        return None
+    if isinstance(rides, pa.Table):
+        last = rides.select(["start_time", "ride_id"]).slice(len(rides) - 1).to_pylist()[0]
+    else:
+        last = rides[-1]
+    return (last["start_time"], last["ride_id"])
+
+
+@read_only
+def get_ride_history(user_id, role, **page):
+    """
+    Ride history for the My Rides page from the ride_history read model with the
+    already_rated flag attached: one query for the rides, one for the ratings.
+    `page` takes the limit/after/status/date_from/date_to keyset arguments.
+    """
+    role = "driver" if role == "driver" else "passenger"
+    rides = get_ride_history_page(user_id, role, **page)
+ 
+    completed = [r["ride_id"] for r in rides if r["status"] == "completed"]
+    rated = get_rated_ride_ids(user_id, completed)
+    for ride in rides:
+        ride["already_rated"] = ride["ride_id"] in rated
+    return rides
 
 
 def update_ride_position(ride_id, new_index):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("UPDATE rides SET current_position_index=%s WHERE ride_id=%s", (new_index, ride_id))
+    sql_registry.execute(cursor, "ride.set_position_index", (new_index, ride_id))
     conn.commit()
     cursor.close()
     conn.close()
  
  
-def get_active_ride(user_id):
+def get_active_ride(identity):
+    """The active ride for an Identity, matched on its driver/passenger ids."""
+    if not identity.is_driver and not identity.is_passenger:
+        return None
+
     conn = get_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
  
-    cursor.execute("""
-        SELECT r.ride_id, r.current_position_index, ro.route_id
-        FROM rides r
-        JOIN ride_offers ro ON r.offer_id = ro.offer_id
-        WHERE (r.passenger_id=%s OR r.driver_id=(SELECT driver_id FROM drivers WHERE user_id=%s))
-        AND r.status='active'
-        LIMIT 1
-    """, (user_id, user_id))
+    sql_registry.execute(cursor, "ride.active_for_party", (identity.driver_id, identity.passenger_id))
  
     ride = cursor.fetchone()
     cursor.close()
     conn.close()
     return ride
 
+@read_only
+def get_notifications(user_id):
+    """A user's notifications, newest first, as a columnar RecordBatch of Notification records."""
+    conn = get_connection()
+    cursor = conn.cursor(pymysql.cursors.Cursor)
+    try:
+        sql_registry.execute(cursor, "notification.list_for_user", (user_id,))
+        return RecordBatch.from_rows(Notification, cursor.fetchall())
+    except Exception as e:
+        print("Error fetching notifications:", e)
+        return RecordBatch.from_rows(Notification, [])
+    finally:
+        cursor.close()
+        conn.close()
+ 
+ 
 def notify_user(user_id, message):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO notifications (user_id, message)
-        VALUES (%s, %s)
-    """, (user_id, message))
+    sql_registry.execute(cursor, "notification.insert", (user_id, message))
     conn.commit()
+    invalidate(f"notifications:{user_id}")
     cursor.close()
     conn.close()
 
+@cached(ttl=15, maxsize=4096, tags=lambda user_id: [f"notifications:{user_id}"])
+@read_only
 def get_unread_notification_count(user_id):
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT COUNT(*) AS unread_count FROM notifications WHERE user_id=%s AND is_read=0",
-        (user_id,)
-    )
-    row = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    cursor = conn.cursor(pymysql.cursors.Cursor)
+    try:
+        sql_registry.execute(cursor, "notification.unread_count", (user_id,))
+        row = cursor.fetchone()
+    except Exception as e:
+        print("Error fetching unread notification count:", e)
+        return 0
+    finally:
+        cursor.close()
+        conn.close()
  
     if not row:
         return 0
  
     count = row[0]
-    return count if count is not None else 0
+    return int(count) if count is not None else 0
 
+ACTIVE_RIDES = sql_registry.statement("ride.active_list", """
+    SELECT r.ride_id, r.offer_id, r.passenger_id, r.driver_id, r.start_time, r.end_time,
+           r.current_position_index, r.status,
+           rr.from_city, rr.to_city, u.name AS passenger_name,
+           du.name AS driver_name, du.user_id AS driver_user_id, p.user_id AS passenger_user_id
+    FROM rides r
+    LEFT JOIN ride_offers ro ON r.offer_id = ro.offer_id
+    LEFT JOIN ride_requests rr ON ro.request_id = rr.request_id
+    LEFT JOIN passengers p ON r.passenger_id = p.passenger_id
+    LEFT JOIN users u ON p.user_id = u.user_id
+    LEFT JOIN drivers dr ON r.driver_id = dr.driver_id
+    LEFT JOIN users du ON dr.user_id = du.user_id
+    WHERE r.status IN ('booked','active')
+    ORDER BY r.start_time DESC
+""")
+ 
+ 
+@read_only
+def iter_active_rides(batch_size=STREAM_BATCH_SIZE):
+    """Stream booked/active rides as Ride records (both parties' names included), newest first."""
+    return iter_records(Ride, ACTIVE_RIDES, batch_size=batch_size)
+ 
+ 
 def fetch_active_rides():
     """Return list of active rides (status 'active' or 'booked' if you consider those active)."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    query = """
-        SELECT r.ride_id, r.offer_id, r.passenger_id, r.driver_id, r.start_time, r.end_time,
-               r.current_position_index, r.status,
-               rr.from_city, rr.to_city, u.name AS passenger_name, d.user_id as driver_user_id
-        FROM rides r
-        LEFT JOIN ride_offers ro ON r.offer_id = ro.offer_id
-        LEFT JOIN ride_requests rr ON ro.request_id = rr.request_id
-        LEFT JOIN passengers p ON r.passenger_id = p.passenger_id
-        LEFT JOIN users u ON p.user_id = u.user_id
-        LEFT JOIN drivers dr ON r.driver_id = dr.driver_id
-        LEFT JOIN users d ON dr.user_id = d.user_id
-        WHERE r.status IN ('booked','active')
-        ORDER BY r.start_time DESC
-    """
-    cursor.execute(query)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    results = []
-    for r in rows:
-        if isinstance(r, dict):
-            results.append(r)
-        else:
-            pass
-    if not results and rows:
-        conn = get_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        cursor.execute(query)
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-    return results
+    try:
+        return list(iter_active_rides())
+    except Exception as e:
+        print("Error fetching active rides:", e)
+        return []
  
 def get_route_coordinates_for_ride(ride):
     """
@@ -621,62 +753,24 @@ def get_route_coordinates_for_ride(ride):
     """
     conn = get_connection()
     cursor = conn.cursor()
-    query = """
-        SELECT rt.coordinates
-        FROM rides r
-        JOIN ride_offers ro ON r.offer_id = ro.offer_id
-        JOIN routes rt ON ro.route_id = rt.route_id
-        WHERE r.ride_id = %s
-        LIMIT 1
-    """
-    cursor.execute(query, (ride['ride_id'],))
+    sql_registry.execute(cursor, "route.coordinates_for_ride", (ride.ride_id,))
     row = cursor.fetchone()
     cursor.close()
     conn.close()
     if not row:
         return None
-    coords_raw = row[0] if isinstance(row, tuple) else row.get('coordinates') or row.get('coordinates'.encode())
-    if not coords_raw:
+    try:
+        coords = json_value(row[0] if isinstance(row, tuple) else row.get('coordinates'))
+    except ValueError:
         return None
-    if isinstance(coords_raw, (bytes, bytearray)):
-        coords_raw = coords_raw.decode()
-    if isinstance(coords_raw, str):
-        try:
-            coords = json.loads(coords_raw)
-        except Exception:
-            return None
-    else:
-        coords = coords_raw
-    normalized = []
-    for pt in coords:
-        try:
-            if isinstance(pt, dict):
-                lon = pt.get('lon') or pt.get('lng') or pt.get('longitude')
-                lat = pt.get('lat') or pt.get('latitude')
-                if lon is None or lat is None:
-                    for k, v in pt.items():
-                        if k.lower() in ('lon','lng','longitude'):
-                            lon = v
-                        if k.lower() in ('lat','latitude'):
-                            lat = v
-                lon_f = float(lon)
-                lat_f = float(lat)
-                normalized.append({'lon': lon_f, 'lat': lat_f})
-            elif isinstance(pt, (list, tuple)):
-                lon_f = float(pt[0])
-                lat_f = float(pt[1])
-                normalized.append({'lon': lon_f, 'lat': lat_f})
-            else:
-                continue
-        except Exception:
-            continue
+    normalized = list(iter_route_points(coords))
     return normalized if normalized else None
  
 def update_ride_position_index(ride_id, new_index):
     conn = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE rides SET current_position_index=%s WHERE ride_id=%s", (new_index, ride_id))
+        sql_registry.execute(cursor, "ride.set_position_index", (new_index, ride_id))
         conn.commit()
         success = True
     except Exception as e:
@@ -692,8 +786,9 @@ def create_notification(user_id, message):
     conn = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO notifications (user_id, message, is_read, created_at) VALUES (%s, %s, 0, NOW())", (user_id, message))
+        sql_registry.execute(cursor, "notification.insert", (user_id, message))
         conn.commit()
+        invalidate(f"notifications:{user_id}")
     except Exception as e:
         print("create_notification error:", e)
         conn.rollback()
@@ -705,11 +800,7 @@ def log_incident(ride_id, user_id, incident_type, description, severity="low"):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("""
-            INSERT INTO ride_incidents
-            (ride_id, reported_by, incident_type, description, severity, created_at)
-            VALUES (%s, %s, %s, %s, %s, NOW())
-        """, (ride_id, user_id, incident_type, description, severity))
+        sql_registry.execute(cur, "incident.insert", (ride_id, user_id, incident_type, description, severity))
         conn.commit()
     except Exception as e:
         print("log_incident error:", e)
@@ -723,11 +814,7 @@ def create_user_report(reported_by, reported_user, ride_id, category, descriptio
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("""
-            INSERT INTO user_reports
-            (reported_by, reported_user, ride_id, category, description, status, created_at)
-            VALUES (%s, %s, %s, %s, %s, 'open', NOW())
-        """, (reported_by, reported_user, ride_id, category, description))
+        sql_registry.execute(cur, "user_report.insert", (reported_by, reported_user, ride_id, category, description))
         conn.commit()
     except Exception as e:
         print("create_user_report error:", e)
@@ -0,0 +1,517 @@
+import functools
+import hashlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pymysql.cursors import RE_INSERT_VALUES
+from utils import instrumentation
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+_lock = threading.Lock()
+_statements = {}
+_stats = {}
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    Stable id for a statement's shape: comments, literals, placeholders and
+    IN-lists are normalised away and whitespace/case ignored before hashing.
+    """
+    text = re.sub(r"--[^\n]*|/\*.*?\*/", " ", sql, flags=re.S)
+    text = re.sub(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"", "?", text)
+    text = re.sub(r"%s|%\(\w+\)s|\b\d+(?:\.\d+)?\b", "?", text)
+    text = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?+)", text)
+    text = " ".join(text.lower().split())
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class Statement:
+    name: str
+    sql: str
+    fingerprint: str = field(default="", compare=False)
+
+
+def statement(name, sql):
+    """Register a named, parameterised statement and return it. Re-registering a name with different SQL is an error."""
+    stmt = Statement(name, sql, fingerprint(sql))
+    with _lock:
+        existing = _statements.get(name)
+        if existing and existing.sql != sql:
+            raise ValueError(f"SQL statement {name!r} is already registered with different SQL")
+        _statements[name] = stmt
+    return stmt
+
+
+def get(name):
+    return _statements[name]
+
+
+def registered():
+    with _lock:
+        return dict(_statements)
+
+
+def _record(stmt, elapsed_ms):
+    with _lock:
+        row = _stats.get(stmt.name)
+        if row is None:
+            row = _stats[stmt.name] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0}
+        row["calls"] += 1
+        row["total_ms"] += elapsed_ms
+        row["max_ms"] = max(row["max_ms"], elapsed_ms)
+        if elapsed_ms >= SLOW_QUERY_MS:
+            row["slow"] += 1
+    if elapsed_ms >= SLOW_QUERY_MS:
+        print(f"Slow query {stmt.name} [{stmt.fingerprint}]: {elapsed_ms:.0f} ms")
+
+
+def execute(cursor, name, params=None):
+    """Run registered statement `name` on `cursor`, timing it under its name; returns cursor.execute's result."""
+    if isinstance(cursor, Batch):
+        return cursor.add(name, params)
+    if params is None:
+        return _run(cursor, name, lambda sql: cursor.execute(sql))
+    return _run(cursor, name, lambda sql: cursor.execute(sql, params))
+
+
+def execute_many(cursor, name, rows):
+    """
+    cursor.executemany for registered statement `name`. PyMySQL sends an
+    `INSERT ... VALUES (%s, ...) [ON DUPLICATE KEY UPDATE ...]` as one multi-row
+    INSERT, so a batch of any size stays one named statement and one round trip.
+    """
+    if isinstance(cursor, Batch):
+        return cursor.add_many(name, rows)
+    return _run(cursor, name, lambda sql: cursor.executemany(sql, rows))
+
+
+def _run(cursor, name, run):
+    stmt = _statements[name]
+    sample = instrumentation.sampled()
+    start = time.perf_counter()
+    try:
+        return run(stmt.sql)
+    finally:
+        elapsed = time.perf_counter() - start
+        _record(stmt, elapsed * 1000)
+        if sample:
+            instrumentation.observe("db_query_seconds", elapsed, statement=name)
+            if isinstance(cursor.rowcount, int) and cursor.rowcount >= 0:
+                instrumentation.observe("db_query_rows", cursor.rowcount, statement=name)
+
+
+class Batch:
+    """
+    Registered statements rendered client-side (as PyMySQL does anyway) and sent
+    by flush() as one multi-statement query: one round trip however many there
+    are. Pass it as the cursor to execute()/execute_many() to queue a statement.
+    Needs a connection from get_connection(multi_statements=True).
+    """
+
+    rowcount = -1
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self._queued = []
+
+    def add(self, name, params=None):
+        self._queued.append((name, self.cursor.mogrify(_statements[name].sql, params)))
+
+    def add_many(self, name, rows):
+        sql = _statements[name].sql
+        m = RE_INSERT_VALUES.match(sql)
+        if not m:
+            for row in rows:
+                self.add(name, row)
+            return
+        values = m.group(2).rstrip()
+        self._queued.append((name, m.group(1) % () + ",".join(self.cursor.mogrify(values, row) for row in rows)
+                             + (m.group(3) or "")))
+
+    def flush(self):
+        """
+        Send the queued statements; returns (rowcount, rows) per statement, in
+        order. A failing statement stops the rest and raises here. Each statement
+        is recorded in query_stats with an equal share of the round trip.
+        """
+        queued, self._queued = self._queued, []
+        if not queued:
+            return []
+        start = time.perf_counter()
+        try:
+            self.cursor.execute(";\n".join(sql for _, sql in queued))
+            results = [(self.cursor.rowcount, self.cursor.fetchall())]
+            while self.cursor.nextset():
+                results.append((self.cursor.rowcount, self.cursor.fetchall()))
+            return results
+        finally:
+            share = (time.perf_counter() - start) * 1000 / len(queued)
+            for name, _ in queued:
+                _record(_statements[name], share)
+
+
+def explain(cursor, name, params=None):
+    """EXPLAIN rows for a registered statement, to compare plans across releases by name."""
+    stmt = _statements[name]
+    cursor.execute("EXPLAIN " + stmt.sql, params)
+    return cursor.fetchall()
+
+
+def query_stats():
+    """Per statement name: fingerprint, calls, total/avg/max ms and slow count, most total time first."""
+    with _lock:
+        rows = []
+        for name, row in _stats.items():
+            stmt = _statements[name]
+            rows.append(dict(
+                name=name,
+                fingerprint=stmt.fingerprint,
+                calls=row["calls"],
+                total_ms=round(row["total_ms"], 2),
+                avg_ms=round(row["total_ms"] / row["calls"], 2),
+                max_ms=round(row["max_ms"], 2),
+                slow=row["slow"],
+            ))
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+# ---------------------------------------------------------------- auth
+statement("auth.login_lookup", """
+    SELECT u.user_id, u.name, u.email, u.password, u.role, d.driver_id, p.passenger_id
+    FROM users u
+    LEFT JOIN drivers d ON d.user_id = u.user_id
+    LEFT JOIN passengers p ON p.user_id = u.user_id
+    WHERE u.email = %s AND u.is_active = TRUE
+    LIMIT 1
+""")
+statement("auth.stamp_login", "UPDATE users SET updated_at = %s WHERE user_id = %s")
+statement("auth.stamp_login_rehash", "UPDATE users SET updated_at = %s, password = %s WHERE user_id = %s")
+statement("auth.insert_user", """
+    INSERT INTO users (name, email, password, role, created_at, updated_at, is_active)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+""")
+statement("auth.insert_driver", "INSERT INTO drivers (user_id, avg_rating, total_rides) VALUES (%s, 0, 0)")
+statement("auth.insert_passenger", "INSERT INTO passengers (user_id, avg_rating, total_rides) VALUES (%s, 0, 0)")
+
+# ---------------------------------------------------------------- users (auth.user_repository)
+# profiles carry the driver/passenger ids, so an Identity needs no other query
+_USER_PROFILE = """
+    SELECT u.user_id, u.name, u.email, u.role, u.is_active, u.created_at, d.driver_id, p.passenger_id
+    FROM users u
+    LEFT JOIN drivers d ON d.user_id = u.user_id
+    LEFT JOIN passengers p ON p.user_id = u.user_id
+"""
+statement("user.by_id", _USER_PROFILE + "WHERE u.user_id = %s LIMIT 1")
+statement("user.by_email", _USER_PROFILE + "WHERE u.email = %s LIMIT 1")
+# PyMySQL expands a list parameter into a parenthesised, escaped value list
+statement("user.many_by_id", _USER_PROFILE + "WHERE u.user_id IN %s")
+statement("user.all", _USER_PROFILE + "ORDER BY u.user_id")
+statement("user.all_active", _USER_PROFILE + "WHERE u.is_active = TRUE ORDER BY u.user_id")
+
+# ---------------------------------------------------------------- identity lookups
+statement("driver.id_by_user", "SELECT driver_id FROM drivers WHERE user_id = %s")
+statement("passenger.id_by_user", "SELECT passenger_id FROM passengers WHERE user_id = %s")
+
+# ---------------------------------------------------------------- ride state
+# sent together in one round trip: the locking read returns the status the
+# guarded UPDATE then sees, so the UPDATE needs no separate read first
+statement("ride.transition_context", """
+    SELECT r.ride_id, r.status, r.total_fare, r.driver_id, r.passenger_id, r.start_time, ro.route_id,
+           d.user_id AS driver_user_id, p.user_id AS passenger_user_id
+    FROM rides r
+    JOIN ride_offers ro ON r.offer_id = ro.offer_id
+    JOIN drivers d ON r.driver_id = d.driver_id
+    JOIN passengers p ON r.passenger_id = p.passenger_id
+    WHERE r.ride_id = %s
+    FOR UPDATE
+""")
+statement("ride.transition", """
+    UPDATE rides r
+    JOIN ride_offers ro ON r.offer_id = ro.offer_id
+    LEFT JOIN ride_requests rr ON ro.request_id = rr.request_id
+    SET r.status = %s,
+        ro.status = %s,
+        rr.status = %s,
+        r.start_time = IF(%s = 'active', %s, r.start_time),
+        r.end_time = IF(%s IN ('completed', 'cancelled'), %s, r.end_time)
+    WHERE r.ride_id = %s AND r.status IN %s
+""")
+statement("ride.set_position_index", "UPDATE rides SET current_position_index = %s WHERE ride_id = %s")
+
+# ---------------------------------------------------------------- notifications / incidents
+statement("notification.insert", "INSERT INTO notifications (user_id, message, is_read, created_at) VALUES (%s, %s, 0, NOW())")
+# execute_many: every placeholder a %s, so PyMySQL folds the rows into one INSERT
+statement("notification.insert_many",
+          "INSERT INTO notifications (user_id, message, is_read, created_at) VALUES (%s, %s, %s, %s)")
+statement("notification.purge_read", """
+    DELETE FROM notifications
+    WHERE is_read = 1 AND created_at < NOW() - INTERVAL %s DAY
+    LIMIT %s
+""")
+statement("notification.unread_count", "SELECT COUNT(*) FROM notifications WHERE user_id = %s AND is_read = 0")
+statement("notification.mark_all_read", "UPDATE notifications SET is_read = 1 WHERE user_id = %s")
+statement("incident.insert", """
+    INSERT INTO ride_incidents (ride_id, reported_by, incident_type, description, severity, created_at)
+    VALUES (%s, %s, %s, %s, %s, NOW())
+""")
+statement("user_report.insert", """
+    INSERT INTO user_reports (reported_by, reported_user, ride_id, category, description, status, created_at)
+    VALUES (%s, %s, %s, %s, %s, 'open', NOW())
+""")
+
+# ---------------------------------------------------------------- routes
+statement("route.coordinates", "SELECT coordinates FROM routes WHERE route_id = %s")
+statement("route.coordinates_for_ride", """
+    SELECT rt.coordinates
+    FROM rides r
+    JOIN ride_offers ro ON r.offer_id = ro.offer_id
+    JOIN routes rt ON ro.route_id = rt.route_id
+    WHERE r.ride_id = %s
+    LIMIT 1
+""")
+statement("route.by_cities", "SELECT route_id, distance_km FROM routes WHERE from_city = %s AND to_city = %s")
+statement("route.from_cities", "SELECT DISTINCT from_city FROM routes ORDER BY from_city ASC")
+statement("route.to_cities", "SELECT DISTINCT to_city FROM routes ORDER BY to_city ASC")
+
+# ---------------------------------------------------------------- ride requests
+statement("ride_request.insert", """
+    INSERT INTO ride_requests
+    (passenger_id, from_city, to_city, date_time, passengers_count, preferences, status, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, 'pending', %s)
+""")
+statement("ride_request.by_id", "SELECT * FROM ride_requests WHERE request_id = %s")
+# polled every few seconds by the request page while a passenger waits for a match
+statement("ride_request.latest_for_passenger", """
+    SELECT request_id, status
+    FROM ride_requests
+    WHERE passenger_id = %s
+    ORDER BY created_at DESC LIMIT 1
+""")
+statement("ride_request.matched_details", """
+    SELECT rr.request_id, rr.from_city, rr.to_city, rr.date_time,
+           ro.offer_id, ro.vehicle_no, ro.price_per_km, ro.estimated_fare,
+           ro.available_seats, u.name AS driver_name, d.avg_rating, d.total_rides
+    FROM ride_requests rr
+    JOIN ride_offers ro ON rr.request_id = ro.request_id
+    JOIN drivers d ON ro.driver_id = d.driver_id
+    JOIN users u ON d.user_id = u.user_id
+    WHERE rr.request_id = %s
+""")
+statement("ride_request.mark_matched", "UPDATE ride_requests SET status = 'matched' WHERE request_id = %s")
+statement("ride_request.match_pending_for_passenger",
+          "UPDATE ride_requests SET status = 'matched' WHERE passenger_id = %s AND status = 'pending'")
+
+# ---------------------------------------------------------------- ride offers
+statement("ride_offer.insert", """
+    INSERT INTO ride_offers (driver_id, vehicle_no, route_id, available_seats, price_per_km, estimated_fare, status, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, 'open', NOW())
+""")
+statement("ride_offer.insert_for_request", """
+    INSERT INTO ride_offers (driver_id, vehicle_no, route_id, request_id, available_seats, price_per_km, estimated_fare, status, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, 'booked', NOW())
+""")
+statement("ride_offer.open_list", """
+    SELECT ro.offer_id, ro.driver_id, ro.vehicle_no, ro.available_seats, ro.price_per_km, ro.estimated_fare, ro.status,
+           r.from_city, r.to_city
+    FROM ride_offers ro
+    JOIN routes r ON ro.route_id = r.route_id
+    WHERE ro.status = 'open'
+    ORDER BY ro.created_at DESC
+""")
+statement("ride_offer.matching", """
+    SELECT ro.offer_id, ro.driver_id, ro.vehicle_no, ro.available_seats, ro.price_per_km, ro.estimated_fare,
+           r.from_city, r.to_city, u.name AS driver_name
+    FROM ride_offers ro
+    JOIN routes r ON ro.route_id = r.route_id
+    JOIN users u ON ro.driver_id = u.user_id
+    WHERE r.from_city = %s AND r.to_city = %s
+      AND ro.status IN ('open', 'booked')
+      AND ro.available_seats >= %s
+      AND DATE(ro.created_at) = DATE(%s)
+    ORDER BY ro.estimated_fare ASC
+""")
+statement("ride_offer.available", """
+    SELECT r.*, d.name AS driver_name, d.avg_rating, d.total_rides
+    FROM ride_offers r
+    JOIN drivers d ON r.driver_id = d.user_id
+    JOIN routes rt ON r.route_id = rt.route_id
+    WHERE rt.from_city = %s AND rt.to_city = %s
+    AND r.status IN ('open', 'booked')
+    AND r.available_seats >= %s
+    AND DATE(r.accepted_at) = %s
+    ORDER BY r.accepted_at ASC
+""")
+statement("ride_offer.lock_for_booking",
+          "SELECT available_seats, estimated_fare, driver_id, route_id FROM ride_offers WHERE offer_id = %s FOR UPDATE")
+statement("ride_offer.set_seats", "UPDATE ride_offers SET available_seats = %s, status = %s WHERE offer_id = %s")
+
+# ---------------------------------------------------------------- rides
+statement("ride.insert", """
+    INSERT INTO rides (offer_id, passenger_id, driver_id, seats_booked, total_fare, start_time, status)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+""")
+statement("ride.assigned_to_driver", """
+    SELECT r.ride_id, r.offer_id, r.passenger_id, r.driver_id, r.start_time, r.end_time,
+           r.current_position_index, r.status,
+           rr.from_city, rr.to_city, u.name AS passenger_name,
+           du.name AS driver_name, du.user_id AS driver_user_id, u.user_id AS passenger_user_id
+    FROM rides r
+    JOIN ride_offers ro ON r.offer_id = ro.offer_id
+    JOIN ride_requests rr ON ro.request_id = rr.request_id
+    JOIN users u ON rr.passenger_id = u.user_id
+    JOIN drivers dr ON r.driver_id = dr.driver_id
+    JOIN users du ON dr.user_id = du.user_id
+    WHERE r.driver_id = %s AND r.status IN ('active', 'booked')
+    ORDER BY r.start_time DESC
+""")
+statement("ride.id_range", "SELECT MIN(ride_id), MAX(ride_id) FROM rides")
+statement("ride.driver_user_id", """
+    SELECT d.user_id AS driver_user_id
+    FROM rides r
+    JOIN drivers d ON r.driver_id = d.driver_id
+    WHERE r.ride_id = %s
+""")
+# a missing driver_id/passenger_id is passed as NULL, which matches nothing
+statement("ride.active_for_party", """
+    SELECT r.ride_id, r.current_position_index, ro.route_id
+    FROM rides r
+    JOIN ride_offers ro ON r.offer_id = ro.offer_id
+    WHERE (r.driver_id = %s OR r.passenger_id = %s)
+    AND r.status = 'active'
+    LIMIT 1
+""")
+
+# ---------------------------------------------------------------- ratings
+statement("rating.insert", """
+    INSERT INTO ratings (ride_id, rated_by, rated_user, rating, feedback, created_at)
+    VALUES (%s, %s, %s, %s, %s, NOW())
+""")
+statement("rating.rated_ride_ids", "SELECT DISTINCT ride_id FROM ratings WHERE rated_by = %s")
+statement("rating.rated_ride_ids_in", "SELECT DISTINCT ride_id FROM ratings WHERE rated_by = %s AND ride_id IN %s")
+# one upsert per star column, so the running aggregate stays a fixed statement
+for _star in range(1, 6):
+    statement(f"rating_aggregate.add[{_star}]", f"""
+        INSERT INTO rating_aggregates (user_id, role, rating_sum, rating_count, stars_{_star})
+        VALUES (%s, %s, %s, 1, 1)
+        ON DUPLICATE KEY UPDATE
+            rating_sum = rating_sum + VALUES(rating_sum),
+            rating_count = rating_count + 1,
+            stars_{_star} = stars_{_star} + 1
+    """)
+_STAR = "LEAST(5, GREATEST(1, ROUND(ra.rating)))"
+statement("rating_aggregate.clear", "DELETE FROM rating_aggregates")
+statement("rating_aggregate.rebuild", f"""
+    INSERT INTO rating_aggregates
+        (user_id, role, rating_sum, rating_count, stars_1, stars_2, stars_3, stars_4, stars_5)
+    SELECT ra.rated_user,
+           CASE WHEN d.user_id = ra.rated_user THEN 'driver' ELSE 'passenger' END AS agg_role,
+           SUM(ra.rating), COUNT(*),
+           SUM({_STAR} = 1), SUM({_STAR} = 2), SUM({_STAR} = 3), SUM({_STAR} = 4), SUM({_STAR} = 5)
+    FROM ratings ra
+    JOIN rides r ON ra.ride_id = r.ride_id
+    JOIN drivers d ON r.driver_id = d.driver_id
+    GROUP BY ra.rated_user, agg_role
+""")
+for _table, _role in (("drivers", "driver"), ("passengers", "passenger")):
+    statement(f"{_role}.sync_avg_rating", f"""
+        UPDATE {_table} t
+        JOIN rating_aggregates a ON a.user_id = t.user_id AND a.role = %s
+        SET t.avg_rating = a.rating_sum / a.rating_count
+        WHERE t.user_id = %s
+    """)
+    statement(f"{_role}.resync_avg_ratings", f"""
+        UPDATE {_table} t
+        LEFT JOIN rating_aggregates a ON a.user_id = t.user_id AND a.role = %s
+        SET t.avg_rating = COALESCE(a.rating_sum / a.rating_count, 0)
+    """)
+
+# ---------------------------------------------------------------- profiles
+statement("passenger.profile_by_user", "SELECT * FROM passengers WHERE user_id = %s")
+statement("driver.profile_by_user", "SELECT * FROM drivers WHERE user_id = %s")
+
+# ---------------------------------------------------------------- jobs (utils.job_queue)
+statement("job.insert", """
+    INSERT INTO jobs (job_type, payload, priority, max_attempts, run_at)
+    VALUES (%s, %s, %s, %s, COALESCE(%s, NOW() + INTERVAL %s SECOND))
+""")
+statement("job.insert_many", "INSERT INTO jobs (job_type, payload, priority, max_attempts) VALUES (%s, %s, %s, %s)")
+statement("job.running_by_type", """
+    SELECT job_type, COUNT(*) AS running FROM jobs
+    WHERE status = 'running' AND job_type IN %s
+    GROUP BY job_type
+""")
+statement("job.claimable", """
+    SELECT job_id, job_type, payload, attempts, max_attempts
+    FROM jobs
+    WHERE status = 'queued' AND run_at <= NOW() AND job_type IN %s
+    ORDER BY priority DESC, run_at, job_id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+""")
+statement("job.mark_running", """
+    UPDATE jobs SET status = 'running', locked_by = %s, locked_at = NOW(), attempts = attempts + 1
+    WHERE job_id IN %s
+""")
+statement("job.mark_done", """
+    UPDATE jobs SET status = 'done', finished_at = NOW(), locked_by = NULL, last_error = NULL
+    WHERE job_id = %s
+""")
+statement("job.mark_failed", """
+    UPDATE jobs SET status = 'failed', finished_at = NOW(), locked_by = NULL, last_error = %s
+    WHERE job_id = %s
+""")
+statement("job.retry", """
+    UPDATE jobs SET status = 'queued', locked_by = NULL, last_error = %s,
+           run_at = NOW() + INTERVAL %s SECOND
+    WHERE job_id = %s
+""")
+statement("job.requeue_stale", """
+    UPDATE jobs
+    SET status = IF(attempts >= max_attempts, 'failed', 'queued'),
+        finished_at = IF(attempts >= max_attempts, NOW(), NULL),
+        last_error = 'worker timed out', locked_by = NULL, run_at = NOW()
+    WHERE status = 'running' AND locked_at < NOW() - INTERVAL %s SECOND
+""")
+statement("job.purge_finished", """
+    DELETE FROM jobs
+    WHERE status IN ('done', 'failed') AND finished_at < NOW() - INTERVAL %s DAY
+    LIMIT %s
+""")
+statement("job.queue_stats", """
+    SELECT job_type,
+           SUM(status = 'queued') AS queued,
+           SUM(status = 'running') AS running,
+           SUM(status = 'done') AS done,
+           SUM(status = 'failed') AS failed,
+           TIMESTAMPDIFF(SECOND, MIN(IF(status = 'queued' AND run_at <= NOW(), run_at, NULL)), NOW()) AS oldest_due_s,
+           AVG(IF(status = 'done', TIMESTAMPDIFF(SECOND, created_at, finished_at), NULL)) AS avg_latency_s
+    FROM jobs
+    GROUP BY job_type
+    ORDER BY job_type
+""")
+statement("job_schedule.upsert", """
+    INSERT INTO job_schedules (name, job_type, payload, priority, interval_seconds, next_run_at)
+    VALUES (%s, %s, %s, %s, %s, NOW())
+    ON DUPLICATE KEY UPDATE job_type = VALUES(job_type), payload = VALUES(payload),
+        priority = VALUES(priority), interval_seconds = VALUES(interval_seconds)
+""")
+statement("job_schedule.lock_due", """
+    SELECT name, job_type, payload, priority FROM job_schedules
+    WHERE next_run_at <= NOW()
+    FOR UPDATE SKIP LOCKED
+""")
+statement("job_schedule.advance", """
+    UPDATE job_schedules
+    SET next_run_at = NOW() + INTERVAL interval_seconds SECOND, last_enqueued_at = NOW()
+    WHERE name IN %s
+""")